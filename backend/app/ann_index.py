@@ -0,0 +1,139 @@
+import os
+import numpy as np
+from typing import Optional
+
+
+def _assign_nearest(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+    """分块计算每个向量最近（内积最大）的聚类中心，避免一次分配 N×nlist 的大矩阵"""
+    assignments = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], chunk_size):
+        block = vectors[start:start + chunk_size]
+        assignments[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """倒排文件（IVF）近似最近邻索引：球面 k-means 粗聚类 + 倒排列表
+
+    索引只保存特征库的行号，不复制特征；查询时只对 nprobe 个最近聚类中的行做精确打分。
+    输入向量必须已经归一化。
+    """
+
+    def __init__(self, dim: int, nlist: int, nprobe: int = 16):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        # 每一行所在的倒排列表，-1 表示未加入索引
+        self._assignments = np.empty(0, dtype=np.int32)
+        # 倒排列表整体替换（不原地修改），查询线程读到的总是完整的数组
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self.trained_size = 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._assignments >= 0))
+
+    @staticmethod
+    def default_nlist(size: int) -> int:
+        """聚类数默认取 sqrt(N)"""
+        return max(1, int(np.sqrt(size)))
+
+    def train(self, vectors: np.ndarray, n_iter: int = 20, max_samples_per_list: int = 64, seed: int = 0):
+        """在（采样后的）特征上训练聚类中心"""
+        rng = np.random.default_rng(seed)
+        nlist = min(self.nlist, vectors.shape[0])
+        sample_size = min(vectors.shape[0], nlist * max_samples_per_list)
+        sample = vectors[rng.choice(vectors.shape[0], sample_size, replace=False)]
+
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = _assign_nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+            # 空聚类重新随机取一个样本作为中心
+            empty = counts == 0
+            if np.any(empty):
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        self.nlist = nlist
+        self.centroids = centroids.astype(np.float32)
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self._assignments = np.empty(0, dtype=np.int32)
+        self.trained_size = vectors.shape[0]
+
+    def _ensure_rows(self, max_row: int):
+        if max_row >= self._assignments.shape[0]:
+            grown = np.full(max(max_row + 1, self._assignments.shape[0] * 2), -1, dtype=np.int32)
+            grown[:self._assignments.shape[0]] = self._assignments
+            self._assignments = grown
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        """增量加入（或重新分配）若干行：一次矩阵乘法分配聚类，按聚类分组后每个倒排列表只更新一次"""
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        if rows.size == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(rows.size, self.dim)
+        self._ensure_rows(int(rows.max()))
+        assignments = _assign_nearest(vectors, self.centroids)
+
+        # 1. 只处理分配发生变化的行
+        old = self._assignments[rows]
+        changed = old != assignments
+        rows, assignments, old = rows[changed], assignments[changed], old[changed]
+        if rows.size == 0:
+            return
+
+        # 2. 从原来的倒排列表中移除重新分配的行
+        for list_id in np.unique(old[old >= 0]):
+            members = self._lists[list_id]
+            self._lists[list_id] = members[~np.isin(members, rows[old == list_id])]
+
+        # 3. 按聚类分组追加
+        order = np.argsort(assignments, kind='stable')
+        sorted_lists = assignments[order]
+        boundaries = np.flatnonzero(np.diff(sorted_lists)) + 1
+        for list_id, group in zip(sorted_lists[np.r_[0, boundaries]], np.split(rows[order], boundaries)):
+            self._lists[list_id] = np.concatenate([self._lists[list_id], group])
+        self._assignments[rows] = assignments
+
+    def build(self, vectors: np.ndarray):
+        """训练并加入全部行（行号即 vectors 的下标）"""
+        self.train(vectors)
+        self.add(np.arange(vectors.shape[0]), vectors)
+
+    def candidates(self, probe: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """返回 nprobe 个最近聚类中所有行的行号；nprobe 越大召回率越高、速度越慢"""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ probe
+        if nprobe < self.nlist:
+            probe_lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe_lists = np.arange(self.nlist)
+        blocks = [self._lists[list_id] for list_id in probe_lists]
+        return np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int64)
+
+    def save(self, path: str):
+        """保存训练好的聚类中心（行的分配在加载时重新计算，比 k-means 训练快得多）"""
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            nprobe=np.array(self.nprobe),
+            trained_size=np.array(self.trained_size)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IVFIndex"]:
+        """加载聚类中心，返回空的索引；文件不存在时返回 None"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            centroids = data['centroids']
+            index = cls(centroids.shape[1], centroids.shape[0], int(data['nprobe']))
+            index.centroids = centroids
+            index.trained_size = int(data['trained_size'])
+        return index
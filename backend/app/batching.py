@@ -0,0 +1,80 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence
+from .diagnostics import get_logger
+
+logger = get_logger("batching")
+
+
+class MicroBatcher:
+    """动态微批处理：收集并发请求的输入，等待 max_wait_ms 或凑满 max_batch_size 后合并为一次前向推理"""
+
+    def __init__(self, name: str, batch_fn: Callable[[List[Any]], Sequence[Any]],
+                 max_batch_size: int = 16, max_wait_ms: float = 2.0):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._batches = 0
+        self._items = 0
+        self._thread = threading.Thread(target=self._loop, name=f"batcher-{name}", daemon=True)
+        self._thread.start()
+
+    def submit_async(self, item: Any) -> Future:
+        """提交一个输入，返回对应输出行的 Future"""
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def submit(self, item: Any) -> Any:
+        """提交一个输入并等待它在批次中的输出行"""
+        return self.submit_async(item).result()
+
+    def submit_many(self, items: Sequence[Any]) -> List[Any]:
+        """一次提交多个输入（例如同一帧中的多张人脸）"""
+        futures = [self.submit_async(item) for item in items]
+        return [future.result() for future in futures]
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # 超时后仍然取走已经排队的输入，不再等待
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            inputs = [item for item, _ in batch]
+            try:
+                outputs = self.batch_fn(inputs)
+                if len(outputs) != len(batch):
+                    # 输出行数不对时无法确定对应关系，整批失败，避免调用方永远等待
+                    raise ValueError(f"批量推理输出 {len(outputs)} 行，输入 {len(batch)} 行")
+                for (_, future), output in zip(batch, outputs):
+                    future.set_result(output)
+            except Exception as e:
+                logger.warning("%s 批量推理失败: %s", self.name, e)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self._batches += 1
+            self._items += len(batch)
+
+    def stats(self) -> dict:
+        return {
+            'batches': self._batches,
+            'items': self._items,
+            'avg_batch_size': self._items / self._batches if self._batches else 0.0
+        }
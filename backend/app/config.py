@@ -1,23 +1,169 @@
-from pathlib import Path
-from dotenv import load_dotenv
-import os
-
-# 加载环境变量
-load_dotenv()
-
-# 基础配置
-BASE_DIR = Path(__file__).resolve().parent.parent
-UPLOAD_DIR = BASE_DIR / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
-
-# 模型存储目录
-MODEL_DIR = BASE_DIR / "models"
-MODEL_DIR.mkdir(exist_ok=True)
-
-# 设置 DeepFace 模型存储路径（使用绝对路径更可靠）
-os.environ["DEEPFACE_HOME"] = str(MODEL_DIR.absolute())
-
-# MongoDB配置
-MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-DB_NAME = "face_recognition"
-COLLECTION_NAME = "face_embeddings"
\ No newline at end of file
+from pathlib import Path
+from dotenv import load_dotenv
+import os
+
+# 加载环境变量
+load_dotenv()
+
+# 基础配置
+BASE_DIR = Path(__file__).resolve().parent.parent
+UPLOAD_DIR = BASE_DIR / "uploads"
+UPLOAD_DIR.mkdir(exist_ok=True)
+
+# 模型存储目录
+MODEL_DIR = BASE_DIR / "models"
+MODEL_DIR.mkdir(exist_ok=True)
+
+# 用户数据和特征存储目录
+DATA_DIR = os.getenv("DATA_DIR", str(BASE_DIR / "data"))
+
+# 设置 DeepFace 模型存储路径（使用绝对路径更可靠）
+os.environ["DEEPFACE_HOME"] = str(MODEL_DIR.absolute())
+
+# MongoDB配置
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DB_NAME = "face_recognition"
+COLLECTION_NAME = "face_embeddings"
+
+# face_recognition (dlib) 的速度 / 精度配置档: fast / balanced / accurate，见 app/dlib_profiles.py
+# 控制回退检测器、图像增强、jitters 和关键点模型；请求中可以用 profile 参数覆盖
+DLIB_PROFILE_REGISTER = os.getenv("DLIB_PROFILE_REGISTER", "accurate")
+DLIB_PROFILE_RECOGNIZE = os.getenv("DLIB_PROFILE_RECOGNIZE", "fast")
+
+# 人脸检测配置
+# 检测模式: adaptive（先低分辨率粗检，未检测到人脸再升级分辨率）或 fixed（始终使用最大分辨率）
+DETECTION_MODE = os.getenv("DETECTION_MODE", "adaptive")
+# 可选的检测分辨率（正方形边长）
+DETECTION_SIZES = tuple(int(s) for s in os.getenv("DETECTION_SIZES", "320,480,640").split(","))
+# 预期最小人脸边长占图像长边的比例（近距离的门禁摄像头可以调大）
+DETECTION_MIN_FACE_RATIO = float(os.getenv("DETECTION_MIN_FACE_RATIO", "0.1"))
+# 检测器能稳定检出的最小人脸像素
+DETECTION_MIN_FACE_PX = int(os.getenv("DETECTION_MIN_FACE_PX", "24"))
+
+# 图像预处理时的最大边长，特征提取在该分辨率的图像上裁剪
+IMAGE_MAX_SIZE = int(os.getenv("IMAGE_MAX_SIZE", "1024"))
+
+# 特征提取执行引擎
+# 是否并发执行三个算法的特征提取
+PARALLEL_EXTRACTION = os.getenv("PARALLEL_EXTRACTION", "true").lower() == "true"
+# 特征提取线程池大小
+EXTRACTOR_MAX_WORKERS = int(os.getenv("EXTRACTOR_MAX_WORKERS", "6"))
+# 每个模型同时运行的最大请求数（dlib模型对象不是线程安全的，固定为1）
+MODEL_CONCURRENCY = {
+    'insightface': int(os.getenv("INSIGHTFACE_CONCURRENCY", "2")),
+    'face_recognition': 1,
+    'facenet': int(os.getenv("FACENET_CONCURRENCY", "2")),
+}
+# 多进程服务（serve.py）的工作进程数，main.py 直接运行时为 1
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+# 每个进程推理可用的CPU线程总数，默认由所有工作进程平分CPU核心
+INFERENCE_THREAD_BUDGET = int(os.getenv("INFERENCE_THREAD_BUDGET", str(max(1, (os.cpu_count() or 1) // SERVER_WORKERS))))
+
+# 推理队列（API层）
+# 执行推理的工作线程数
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+# 排队 + 执行中的最大请求数，超过后直接返回503
+INFERENCE_QUEUE_MAX_DEPTH = int(os.getenv("INFERENCE_QUEUE_MAX_DEPTH", "16"))
+# 503响应中建议客户端重试的秒数
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", "1"))
+
+# 动态微批处理（ArcFace / FaceNet）
+# 批次大小受并发请求数限制，吞吐优先时可同时调大 INFERENCE_WORKERS 和 EXTRACTOR_MAX_WORKERS
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "true").lower() == "true"
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "16"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "2"))
+
+# 批量识别流水线的并行图片数
+BATCH_PIPELINE_WORKERS = int(os.getenv("BATCH_PIPELINE_WORKERS", "4"))
+
+# 多人脸识别时每帧最多处理的人脸数
+CROWD_MAX_FACES = int(os.getenv("CROWD_MAX_FACES", "32"))
+
+# 视频流识别（WebSocket）
+# 每隔多少帧运行一次检测
+STREAM_DETECT_EVERY = int(os.getenv("STREAM_DETECT_EVERY", "1"))
+# 已识别的轨迹超过该秒数后重新识别
+STREAM_REFRESH_INTERVAL = float(os.getenv("STREAM_REFRESH_INTERVAL", "3.0"))
+# 人脸质量提升超过该值时重新识别
+STREAM_QUALITY_GAIN = float(os.getenv("STREAM_QUALITY_GAIN", "0.1"))
+# 跟踪匹配的最小IoU
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+# 轨迹连续丢失多少个检测帧后删除
+TRACK_MAX_MISSES = int(os.getenv("TRACK_MAX_MISSES", "5"))
+
+# 近似最近邻（IVF）索引
+ANN_ENABLED = os.getenv("ANN_ENABLED", "true").lower() == "true"
+# 特征库超过该规模后自动使用ANN索引，否则使用精确的暴力搜索
+ANN_MIN_GALLERY_SIZE = int(os.getenv("ANN_MIN_GALLERY_SIZE", "20000"))
+# 每次查询搜索的聚类数，越大召回率越高、速度越慢
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+
+# 特征存储（按算法分段的追加写文件，内存映射读取）
+# 每个分段文件的行数
+EMBEDDING_SEGMENT_ROWS = int(os.getenv("EMBEDDING_SEGMENT_ROWS", "65536"))
+# 每次追加后 fsync，关闭可提升批量导入速度但断电时可能丢失最近的写入
+EMBEDDING_STORE_FSYNC = os.getenv("EMBEDDING_STORE_FSYNC", "true").lower() == "true"
+
+# 级联投票：按成本从低到高运行各算法，多数结果已确定时跳过剩余（更慢的）算法
+CASCADE_VOTING = os.getenv("CASCADE_VOTING", "true").lower() == "true"
+CASCADE_ORDER = [m.strip() for m in os.getenv("CASCADE_ORDER", "insightface,facenet,face_recognition").split(",") if m.strip()]
+
+# 按图片内容缓存检测结果和特征（重复上传的相同图片不再重新计算）
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "true").lower() == "true"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "600"))
+# 更换模型文件后修改该值使旧缓存失效
+EMBEDDING_CACHE_VERSION = os.getenv("EMBEDDING_CACHE_VERSION", "1")
+
+# 轮询客户端的近重复帧抑制：与该客户端上次处理的帧几乎相同时直接返回上次结果（只对带 X-Client-Id 请求头的客户端生效）
+FRAME_DEDUP = os.getenv("FRAME_DEDUP", "true").lower() == "true"
+# 32x32 灰度缩略图的平均每像素差异阈值（0-255）
+FRAME_DEDUP_THRESHOLD = float(os.getenv("FRAME_DEDUP_THRESHOLD", "3.0"))
+# 复用结果的最长时间（秒）
+FRAME_DEDUP_MAX_AGE = float(os.getenv("FRAME_DEDUP_MAX_AGE", "5.0"))
+FRAME_DEDUP_MAX_CLIENTS = int(os.getenv("FRAME_DEDUP_MAX_CLIENTS", "1024"))
+
+# FaceNet 推理后端: eager（PyTorch）、torchscript、onnx（ONNX Runtime，不需要加载 torch）
+# torchscript / onnx 模型由 scripts/export_facenet.py 导出，文件不存在时退回 eager
+FACENET_BACKEND = os.getenv("FACENET_BACKEND", "eager")
+FACENET_ONNX_PATH = os.getenv("FACENET_ONNX_PATH", str(MODEL_DIR / "facenet" / "facenet_vggface2.onnx"))
+FACENET_TORCHSCRIPT_PATH = os.getenv("FACENET_TORCHSCRIPT_PATH", str(MODEL_DIR / "facenet" / "facenet_vggface2.pt"))
+# 本地 VGGFace2 权重（scripts/download_models.py 下载），不存在时 facenet_pytorch 会尝试联网下载
+FACENET_WEIGHTS_PATH = os.getenv("FACENET_WEIGHTS_PATH", str(MODEL_DIR / "facenet" / "vggface2_weights.pt"))
+
+# 多进程服务（serve.py）
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8001"))
+# 主进程定期输出各进程内存占用的间隔（秒），所有工作进程就绪后总会输出一次，0 表示之后不再输出
+SERVER_MEMORY_REPORT_INTERVAL = float(os.getenv("SERVER_MEMORY_REPORT_INTERVAL", "300"))
+
+# 模型加载
+# 加载后用空白输入运行一次推理，避免第一个真实请求承担初始化和内存分配的开销
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() == "true"
+
+# 推理资源（CPU线程）分配，见 app/resources.py
+# 每个模型的推理线程数，0 表示按 INFERENCE_THREAD_BUDGET、并发数自动分配
+MODEL_THREADS = {
+    'insightface': int(os.getenv("INSIGHTFACE_THREADS", "0")),
+    'face_recognition': int(os.getenv("DLIB_THREADS", "0")),
+    'facenet': int(os.getenv("FACENET_THREADS", "0")),
+}
+# ONNX Runtime 图优化级别: disable / basic / extended / all
+ORT_GRAPH_OPTIMIZATION = {
+    'insightface': os.getenv("INSIGHTFACE_GRAPH_OPTIMIZATION", "all"),
+    'facenet': os.getenv("FACENET_GRAPH_OPTIMIZATION", "all"),
+}
+# ONNX Runtime CPU内存池：开启时复用推理缓冲区，关闭可降低常驻内存
+ORT_MEMORY_ARENA = {
+    'insightface': os.getenv("INSIGHTFACE_MEMORY_ARENA", "true").lower() == "true",
+    'facenet': os.getenv("FACENET_MEMORY_ARENA", "true").lower() == "true",
+}
+# 算子间并行线程数，1 表示顺序执行（人脸模型基本是单链结构，并行收益很小）
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "1"))
+
+# 日志
+# 日志级别: DEBUG 输出每个请求的诊断信息（逐算法匹配结果、特征统计），生产环境使用 INFO（只输出启动和错误信息）
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# 指标（/metrics，Prometheus 文本格式）：各阶段耗时直方图和计数器，关闭后计时区间为空操作
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
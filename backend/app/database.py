@@ -1,88 +1,192 @@
 import json
 import os
+import sqlite3
+import threading
 import numpy as np
-from typing import Dict, Optional, Any
+from typing import Dict, Iterable, List, Optional, Any
+from .config import DATA_DIR, EMBEDDING_SEGMENT_ROWS, EMBEDDING_STORE_FSYNC
+from .embedding_store import EmbeddingStore
+from .diagnostics import get_logger
+
+logger = get_logger("database")
+
+# 旧版 {user_id}_{method}.npy 文件对应的方法，用于一次性迁移
+LEGACY_ENCODING_METHODS = ('insightface', 'face_recognition', 'facenet')
 
 class Database:
-    def __init__(self):
-        self.data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+    def __init__(self, data_dir: Optional[str] = None):
+        self.data_dir = data_dir or DATA_DIR
+        self.users_db = os.path.join(self.data_dir, 'users.db')
+        # 旧版用户文件，仅用于迁移
         self.users_file = os.path.join(self.data_dir, 'users.json')
+        # 旧版特征目录（每个用户每种方法一个 .npy 文件），仅用于迁移
         self.encodings_dir = os.path.join(self.data_dir, 'encodings')
+        self.embeddings_dir = os.path.join(self.data_dir, 'embeddings')
         
         # 创建必要的目录
         os.makedirs(self.data_dir, exist_ok=True)
-        os.makedirs(self.encodings_dir, exist_ok=True)
         
-        # 初始化用户数据
+        # 初始化用户数据（SQLite WAL 模式：追加写、按id索引、读写互不阻塞）
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "id TEXT PRIMARY KEY, name TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+        self._migrate_users_json()
+
+        # 初始化特征存储，并一次性迁移旧版 .npy 文件
+        self.store = EmbeddingStore(self.embeddings_dir, EMBEDDING_SEGMENT_ROWS, EMBEDDING_STORE_FSYNC)
+        try:
+            migrated = self.store.migrate_from_npy(self.encodings_dir, LEGACY_ENCODING_METHODS)
+            if migrated:
+                print(f"旧版特征迁移完成: {migrated} 个")
+        except Exception as e:
+            print(f"旧版特征迁移失败: {str(e)}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程一个连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.users_db, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """关闭当前线程的连接（多进程模式下在 fork 之前调用，连接不能跨进程使用）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _migrate_users_json(self):
+        """一次性导入旧版 users.json，完成后重命名为 users.json.migrated"""
         if not os.path.exists(self.users_file):
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump({}, f, ensure_ascii=False, indent=2)
+            return
+        try:
+            with open(self.users_file, 'r', encoding='utf-8') as f:
+                users = json.load(f)
+            count = self.save_users_batch(users.values())
+            os.replace(self.users_file, self.users_file + '.migrated')
+            print(f"旧版用户数据迁移完成: {count} 个")
+        except Exception as e:
+            print(f"旧版用户数据迁移失败: {str(e)}")
+
+    @staticmethod
+    def _validate_user(user_data: Dict) -> Dict:
+        # 数据验证
+        if not isinstance(user_data, dict):
+            raise ValueError("用户数据必须是字典类型")
+        
+        if 'id' not in user_data or 'name' not in user_data:
+            raise ValueError("用户数据必须包含id和name字段")
+        
+        # 确保id是字符串类型
+        user_data['id'] = str(user_data['id'])
+        return user_data
 
     def save_user(self, user_data: Dict):
         """保存用户数据"""
         try:
-            # 数据验证
-            if not isinstance(user_data, dict):
-                raise ValueError("用户数据必须是字典类型")
-            
-            if 'id' not in user_data or 'name' not in user_data:
-                raise ValueError("用户数据必须包含id和name字段")
-            
-            # 确保id是字符串类型
-            user_id = str(user_data['id'])
-            user_data['id'] = user_id
-            
-            # 读取现有用户数据
-            users = {}
-            if os.path.exists(self.users_file):
-                with open(self.users_file, 'r', encoding='utf-8') as f:
-                    users = json.load(f)
-            
-            # 更新用户数据
-            users[user_id] = user_data
-            
-            # 保存用户数据
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump(users, f, ensure_ascii=False, indent=2)
-            
-            print(f"用户数据保存成功: {user_id}")
+            user_data = self._validate_user(user_data)
+            self.save_users_batch([user_data])
+            logger.debug("用户数据保存成功: %s", user_data['id'])
             
         except Exception as e:
-            print(f"保存用户数据失败: {str(e)}")
+            logger.error("保存用户数据失败: %s", e)
             raise
 
+    def save_users_batch(self, users: Iterable[Dict]) -> int:
+        """在一个事务中批量保存（覆盖）用户数据"""
+        rows = [
+            (user['id'], str(user['name']), json.dumps(user, ensure_ascii=False))
+            for user in map(self._validate_user, users)
+        ]
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO users (id, name, data) VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    @staticmethod
+    def _normalize_encodings(encodings: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """存储中保存归一化后的 float32 特征，特征库可直接内存映射使用"""
+        vectors = {}
+        for method, encoding in encodings.items():
+            vector = np.asarray(encoding, dtype=np.float32).reshape(-1)
+            norm = np.linalg.norm(vector)
+            if norm == 0 or not np.isfinite(norm):
+                raise ValueError(f"{method}编码无效")
+            vectors[method] = vector / norm
+        return vectors
+
     def save_face_encodings_batch(self, user_id: str, encodings: Dict[str, np.ndarray]):
         """批量保存人脸编码"""
         try:
-            for method, encoding in encodings.items():
-                encoding_file = os.path.join(self.encodings_dir, f"{user_id}_{method}.npy")
-                np.save(encoding_file, encoding)
-                print(f"保存{method}编码成功: {user_id}")
+            for method, vector in self._normalize_encodings(encodings).items():
+                self.store.segments(method).append(str(user_id), vector)
+                logger.debug("保存%s编码成功: %s", method, user_id)
+            self.store.bump_version()
+                
+        except Exception as e:
+            logger.error("保存人脸编码失败: %s", e)
+            raise
+
+    def save_face_encodings_bulk(self, encodings_by_user: Dict[str, Dict[str, np.ndarray]]) -> int:
+        """批量保存多个用户的人脸编码：每个算法一次追加（一次 fsync）"""
+        try:
+            grouped: Dict[str, tuple] = {}
+            for user_id, encodings in encodings_by_user.items():
+                for method, vector in self._normalize_encodings(encodings).items():
+                    user_ids, vectors = grouped.setdefault(method, ([], []))
+                    user_ids.append(str(user_id))
+                    vectors.append(vector)
+
+            for method, (user_ids, vectors) in grouped.items():
+                self.store.segments(method).append_batch(user_ids, np.stack(vectors))
+                logger.debug("保存%s编码成功: %d 个", method, len(user_ids))
+            self.store.bump_version()
+            return len(encodings_by_user)
                 
         except Exception as e:
-            print(f"保存人脸编码失败: {str(e)}")
+            logger.error("保存人脸编码失败: %s", e)
             raise
 
     def get_users(self) -> Dict:
         """获取所有用户"""
         try:
-            if os.path.exists(self.users_file):
-                with open(self.users_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
+            rows = self._connect().execute("SELECT id, data FROM users").fetchall()
+            return {user_id: json.loads(data) for user_id, data in rows}
         except Exception as e:
-            print(f"获取用户数据失败: {str(e)}")
+            logger.error("获取用户数据失败: %s", e)
             return {}
 
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        """按id获取单个用户"""
+        try:
+            row = self._connect().execute("SELECT data FROM users WHERE id = ?", (str(user_id),)).fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            logger.error("获取用户数据失败: %s", e)
+            return None
+
+    def get_user_ids(self) -> List[str]:
+        """获取所有用户id（不解析用户数据）"""
+        return [row[0] for row in self._connect().execute("SELECT id FROM users")]
+
+    def get_user_ids_since(self, rowid: int) -> List[tuple]:
+        """增量获取 rowid 之后写入的用户 (rowid, id)，用于其他进程注册后刷新"""
+        return self._connect().execute(
+            "SELECT rowid, id FROM users WHERE rowid > ? ORDER BY rowid", (rowid,)
+        ).fetchall()
+
     def get_face_encoding(self, user_id: str, method: str) -> Optional[np.ndarray]:
         """获取人脸编码"""
         try:
-            encoding_file = os.path.join(self.encodings_dir, f"{user_id}_{method}.npy")
-            if os.path.exists(encoding_file):
-                return np.load(encoding_file)
-            return None
+            return self.store.segments(method).get(str(user_id))
         except Exception as e:
-            print(f"获取人脸编码失败: {str(e)}")
+            logger.error("获取人脸编码失败: %s", e)
             return None
 
 db = Database() 
\ No newline at end of file
@@ -0,0 +1,95 @@
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+from insightface.app.common import Face
+
+
+def to_dlib_location(bbox: np.ndarray, image_shape: Tuple[int, ...]) -> Optional[Tuple[int, int, int, int]]:
+    """检测框 (x1, y1, x2, y2) 转换为 face_recognition 的 (top, right, bottom, left)，无效框返回 None"""
+    height, width = image_shape[:2]
+    x1, y1, x2, y2 = bbox.astype(int)
+    top, right = max(0, y1), min(width, x2)
+    bottom, left = min(height, y2), max(0, x1)
+    if bottom > top and right > left:
+        return top, right, bottom, left
+    return None
+
+
+class FaceDetectionResult:
+    """单次人脸检测的结果（框、关键点、得分），由所有特征提取器共享"""
+
+    def __init__(self, image: np.ndarray, faces: List[Face], det_size: Optional[int] = None):
+        self.image = image
+        self.det_size = det_size
+        # 按检测得分从高到低排序
+        self.faces = sorted(faces, key=lambda x: x.det_score, reverse=True)
+
+    def __len__(self) -> int:
+        return len(self.faces)
+
+    @property
+    def best(self) -> Optional[Face]:
+        """得分最高的人脸"""
+        return self.faces[0] if self.faces else None
+
+    def dlib_locations(self) -> List[Tuple[int, int, int, int]]:
+        """转换为 face_recognition 使用的 (top, right, bottom, left) 格式"""
+        locations = [to_dlib_location(face.bbox, self.image.shape) for face in self.faces]
+        return [location for location in locations if location is not None]
+
+
+class AdaptiveFaceDetector:
+    """分辨率自适应的人脸检测：先低分辨率粗检，未检测到人脸时再逐级提高检测分辨率"""
+
+    def __init__(self, det_model, sizes: Sequence[int] = (320, 480, 640),
+                 min_face_ratio: float = 0.1, min_face_px: int = 24, mode: str = 'adaptive'):
+        self.det_model = det_model
+        self.sizes = sorted(sizes)
+        self.min_face_ratio = min_face_ratio
+        self.min_face_px = min_face_px
+        self.mode = mode
+
+    def plan(self, image_shape: Tuple[int, ...]) -> List[int]:
+        """根据输入尺寸和预期人脸大小确定检测分辨率的升级顺序"""
+        if self.mode != 'adaptive':
+            return [self.sizes[-1]]
+
+        long_side = max(image_shape[:2])
+        # 1. 高于原图尺寸的分辨率只是放大，没有意义
+        end = len(self.sizes)
+        for i, size in enumerate(self.sizes):
+            if size >= long_side:
+                end = i + 1
+                break
+        ladder = self.sizes[:end]
+
+        # 2. 预期最小人脸在检测输入中至少要有 min_face_px 像素
+        needed = self.min_face_px / max(self.min_face_ratio, 1e-3)
+        for i, size in enumerate(ladder):
+            if size >= needed:
+                return ladder[i:]
+        return ladder[-1:]
+
+    def detect(self, image: np.ndarray, exhaustive: bool = False) -> FaceDetectionResult:
+        """逐级检测，返回的框和关键点都已映射回原图坐标
+
+        exhaustive=True 时直接使用升级顺序中的最大分辨率（多人脸场景中找到一张大脸后不能停止，否则会漏掉远处的小脸）。
+        """
+        bboxes, kpss, det_size = None, None, None
+        plan = self.plan(image.shape)
+        if exhaustive:
+            plan = plan[-1:]
+        for det_size in plan:
+            bboxes, kpss = self.det_model.detect(
+                image, input_size=(det_size, det_size), max_num=0, metric='default'
+            )
+            if bboxes.shape[0] > 0:
+                break
+
+        faces = []
+        for i in range(bboxes.shape[0]):
+            faces.append(Face(
+                bbox=bboxes[i, 0:4],
+                kps=kpss[i] if kpss is not None else None,
+                det_score=bboxes[i, 4]
+            ))
+        return FaceDetectionResult(image, faces, det_size)
@@ -0,0 +1,37 @@
+import logging
+import sys
+import numpy as np
+from .config import LOG_LEVEL
+
+# 应用日志的根 logger：只输出消息本身（与原来的 print 输出一致），不传播到 uvicorn / root 的 handler
+_root = logging.getLogger("app")
+if not _root.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _root.addHandler(_handler)
+    _root.setLevel(LOG_LEVEL)
+    _root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """模块日志，级别由 LOG_LEVEL 控制
+
+    热路径上一律使用 %s 参数而不是 f-string：级别未启用时不会格式化字符串。
+    """
+    return logging.getLogger(f"app.{name}")
+
+
+class ArrayStats:
+    """数组统计信息的延迟求值包装：只有对应级别的日志真正输出时才计算 min / max / mean / std / norm"""
+
+    __slots__ = ('array',)
+
+    def __init__(self, array):
+        self.array = array
+
+    def __str__(self) -> str:
+        array = np.asarray(self.array)
+        if array.size == 0:
+            return f"shape={array.shape}"
+        return (f"shape={array.shape}, range=[{array.min():.4f}, {array.max():.4f}], "
+                f"mean={array.mean():.4f}, std={array.std():.4f}, norm={np.linalg.norm(array):.4f}")
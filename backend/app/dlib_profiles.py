@@ -0,0 +1,63 @@
+from typing import Dict, Optional, Tuple
+from .config import DLIB_PROFILE_REGISTER, DLIB_PROFILE_RECOGNIZE
+
+# 图像增强方式: full（整帧 CLAHE）、crop（只对人脸周围区域做 CLAHE）、none（只转换为RGB）
+ENHANCE_MODES = ('full', 'crop', 'none')
+
+
+class DlibProfile:
+    """face_recognition (dlib) 路径的速度 / 精度配置档
+
+    - fallback: 共享检测未找到人脸时依次尝试的 dlib 检测器 (model, upsample)，为空表示不回退
+    - enhance: 图像增强方式，见 ENHANCE_MODES
+    - num_jitters: 特征提取时的随机扰动次数（耗时约成正比）
+    - landmark_model: 对齐使用的关键点模型，small（5点）或 large（68点）
+    """
+
+    def __init__(self, name: str, fallback: Tuple[Tuple[str, int], ...], enhance: str,
+                 num_jitters: int, landmark_model: str):
+        if enhance not in ENHANCE_MODES:
+            raise ValueError(f"未知的图像增强方式: {enhance}")
+        self.name = name
+        self.fallback = tuple(fallback)
+        self.enhance = enhance
+        self.num_jitters = num_jitters
+        self.landmark_model = landmark_model
+
+    def cache_key(self) -> str:
+        """特征缓存中 face_recognition 特征的键：不同配置档提取的特征不能互相复用"""
+        fallback = ','.join(f"{model}{upsample}" for model, upsample in self.fallback)
+        return f"{self.name}:{fallback}:{self.enhance}:{self.num_jitters}:{self.landmark_model}"
+
+    def describe(self) -> str:
+        fallback = ', '.join(f"{model}(upsample={upsample})" for model, upsample in self.fallback) or '无'
+        return (f"{self.name}: 回退检测器={fallback}, 增强={self.enhance}, "
+                f"jitters={self.num_jitters}, 关键点模型={self.landmark_model}")
+
+
+DLIB_PROFILES: Dict[str, DlibProfile] = {
+    # 实时识别：只用共享检测结果，只增强人脸区域，单次提取，5点对齐
+    'fast': DlibProfile('fast', fallback=(), enhance='crop', num_jitters=1, landmark_model='small'),
+    'balanced': DlibProfile('balanced', fallback=(('hog', 1),), enhance='crop', num_jitters=2, landmark_model='large'),
+    # 注册：原来的完整流程（整帧增强、CNN / HOG 回退检测、5次扰动、68点对齐）
+    'accurate': DlibProfile('accurate', fallback=(('cnn', 1), ('hog', 2)), enhance='full', num_jitters=5,
+                            landmark_model='large'),
+}
+
+
+def get_profile(name: Optional[str], default: str) -> DlibProfile:
+    """按名称获取配置档，名称为空时使用 default；未知名称抛出 ValueError"""
+    profile = DLIB_PROFILES.get(name or default)
+    if profile is None:
+        raise ValueError(f"未知的配置档: {name or default}，可选: {', '.join(DLIB_PROFILES)}")
+    return profile
+
+
+def register_profile(name: Optional[str] = None) -> DlibProfile:
+    """注册（和批量导入）使用的配置档"""
+    return get_profile(name, DLIB_PROFILE_REGISTER)
+
+
+def recognize_profile(name: Optional[str] = None) -> DlibProfile:
+    """识别使用的配置档"""
+    return get_profile(name, DLIB_PROFILE_RECOGNIZE)
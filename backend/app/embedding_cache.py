@@ -0,0 +1,83 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+class ImageAnalysis:
+    """一张图片（按内容哈希）的分析结果：人脸检测结果和各算法特征，图片本身不缓存
+
+    条目锁保证同一内容的并发请求只计算一次，后到的请求等待并复用结果。
+    encodings / failed 的键是算法名；结果依赖提取参数的算法使用 (算法名, 参数) 作为键，
+    同一条目中按参数分别保存，检测结果和其他算法的特征仍然共用。
+    """
+
+    def __init__(self):
+        self.valid = True
+        self.faces: Optional[list] = None
+        self.det_size = None
+        self.encodings: Dict = {}
+        self.failed = set()
+        self.lock = threading.Lock()
+
+    def missing(self, methods: List[str]) -> List[str]:
+        """尚未计算的算法"""
+        return [m for m in methods if m not in self.encodings and m not in self.failed]
+
+
+class EmbeddingCache:
+    """按图片内容哈希 + 模型/配置版本缓存分析结果的 LRU 缓存，超过容量或 TTL 的条目被淘汰"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 600.0, version: str = ''):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = version
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def key(self, image_data: bytes) -> str:
+        return f"{self.version}:{hashlib.sha256(image_data).hexdigest()}"
+
+    def get(self, image_data: bytes) -> ImageAnalysis:
+        """获取图片对应的条目，不存在或已过期时创建一个空条目"""
+        key = self.key(image_data)
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                created_at, analysis = item
+                if now - created_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return analysis
+                self.expired += 1
+
+            self.misses += 1
+            analysis = ImageAnalysis()
+            self._entries[key] = (now, analysis)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return analysis
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'expired': self.expired
+        }
@@ -0,0 +1,391 @@
+import fcntl
+import json
+import os
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+
+class EmbeddingSegments:
+    """单个算法的追加写特征存储
+
+    - 特征以定长 float32 行写入分段文件（每段 segment_rows 行），读取时用 np.memmap 零拷贝映射
+    - ids.log 每行一个 JSON 字符串，第 N 行即第 N 个特征行对应的用户id；同一用户重复写入时以最后一行为准
+    - 追加顺序：先写特征并 fsync，再写 ids.log 并 fsync；只有写入 ids.log 的行才算提交，
+      崩溃后打开时截断未提交的数据
+    - 多进程写入通过文件锁串行化
+    """
+
+    def __init__(self, directory: str, segment_rows: int = 65536, fsync: bool = True):
+        self.directory = directory
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._meta_path = os.path.join(directory, 'meta.json')
+        self._lock_path = os.path.join(directory, 'store.lock')
+        self._lock = threading.RLock()
+
+        with self._lock, self._file_lock():
+            self.meta = self._read_meta()
+            if self.meta is None:
+                self.meta = {'dim': None, 'segment_rows': segment_rows, 'generation': 0}
+                self._write_meta(self.meta)
+            self._reset()
+            self._recover()
+            self._sync_locked()
+
+    # ---------- 文件布局 ----------
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self.meta['dim']
+
+    @property
+    def segment_rows(self) -> int:
+        return self.meta['segment_rows']
+
+    @property
+    def generation(self) -> int:
+        return self.meta['generation']
+
+    def _segment_path(self, index: int, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.directory, f"g{generation:04d}_segment_{index:05d}.f32")
+
+    def _log_path(self, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.directory, f"g{generation:04d}_ids.log")
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的写锁"""
+        with open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> Optional[Dict]:
+        if not os.path.exists(self._meta_path):
+            return None
+        with open(self._meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, meta: Dict):
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._meta_path)
+
+    def _reset(self):
+        self._ids: List[str] = []
+        self._latest: Dict[str, int] = {}
+        self._log_offset = 0
+        self._maps: Dict[int, np.memmap] = {}
+
+    # ---------- 崩溃恢复与同步 ----------
+
+    def _recover(self):
+        """截断未提交的数据并清理其他代的文件（需要持有文件锁）"""
+        log_path = self._log_path()
+        committed = 0
+        if os.path.exists(log_path):
+            with open(log_path, 'rb') as f:
+                data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                print(f"截断未完成的ids记录: {len(data) - end} 字节")
+                os.truncate(log_path, end)
+            committed = data[:end].count(b'\n')
+
+        if self.dim is not None:
+            row_bytes = self.dim * 4
+            for name in os.listdir(self.directory):
+                prefix = f"g{self.generation:04d}_segment_"
+                if not name.startswith(prefix):
+                    continue
+                index = int(name[len(prefix):-len('.f32')])
+                rows = min(max(committed - index * self.segment_rows, 0), self.segment_rows)
+                path = os.path.join(self.directory, name)
+                if rows == 0:
+                    os.remove(path)
+                elif os.path.getsize(path) > rows * row_bytes:
+                    os.truncate(path, rows * row_bytes)
+
+        # 压缩中断或压缩完成后遗留的其他代文件
+        current = f"g{self.generation:04d}_"
+        for name in os.listdir(self.directory):
+            if name.startswith('g') and name[5:6] == '_' and not name.startswith(current):
+                os.remove(os.path.join(self.directory, name))
+
+    def _sync_locked(self):
+        """读取其他写入者新提交的行；代数变化（已压缩）时整体重新加载"""
+        meta = self._read_meta()
+        if meta is not None and meta['generation'] != self.generation:
+            self.meta = meta
+            self._reset()
+        elif meta is not None:
+            self.meta = meta
+
+        log_path = self._log_path()
+        if not os.path.exists(log_path):
+            return
+        with open(log_path, 'rb') as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return
+        for line in data[:end].splitlines():
+            user_id = json.loads(line)
+            self._latest[user_id] = len(self._ids)
+            self._ids.append(user_id)
+        self._log_offset += end
+
+    def sync(self) -> int:
+        """同步其他进程写入的新行，返回总行数"""
+        with self._lock:
+            self._sync_locked()
+            return len(self._ids)
+
+    # ---------- 写入 ----------
+
+    def append_batch(self, user_ids: Sequence[str], vectors: np.ndarray) -> int:
+        """批量追加（一次 fsync），返回第一行的行号"""
+        user_ids = [str(user_id) for user_id in user_ids]
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(user_ids), -1)
+        if not user_ids:
+            return len(self._ids)
+
+        with self._lock, self._file_lock():
+            self._sync_locked()
+            if self.dim is None:
+                self.meta['dim'] = int(vectors.shape[1])
+                self._write_meta(self.meta)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"特征维度不匹配: {vectors.shape[1]} vs {self.dim}")
+
+            # 1. 写入特征行
+            start = len(self._ids)
+            row_bytes = self.dim * 4
+            written = 0
+            while written < len(user_ids):
+                row = start + written
+                index, offset = divmod(row, self.segment_rows)
+                count = min(len(user_ids) - written, self.segment_rows - offset)
+                fd = os.open(self._segment_path(index), os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    os.pwrite(fd, vectors[written:written + count].tobytes(), offset * row_bytes)
+                    if self.fsync:
+                        os.fsync(fd)
+                finally:
+                    os.close(fd)
+                written += count
+
+            # 2. 提交ids（先去掉崩溃遗留的不完整记录）
+            log_path = self._log_path()
+            if os.path.exists(log_path) and os.path.getsize(log_path) > self._log_offset:
+                os.truncate(log_path, self._log_offset)
+            with open(log_path, 'ab') as f:
+                f.write(b''.join(json.dumps(user_id).encode('utf-8') + b'\n' for user_id in user_ids))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+
+            self._sync_locked()
+            return start
+
+    def append(self, user_id: str, vector: np.ndarray) -> int:
+        return self.append_batch([user_id], np.asarray(vector)[None])
+
+    # ---------- 读取 ----------
+
+    def __len__(self) -> int:
+        """总行数（包括被覆盖的旧行）"""
+        return len(self._ids)
+
+    def live_count(self) -> int:
+        return len(self._latest)
+
+    def row_ids(self, start: int = 0, end: Optional[int] = None) -> List[str]:
+        with self._lock:
+            return self._ids[start:end]
+
+    def latest_ids(self) -> List[str]:
+        """所有用户id（每个用户只出现一次）"""
+        with self._lock:
+            return list(self._latest)
+
+    def latest_row(self, user_id: str) -> Optional[int]:
+        return self._latest.get(str(user_id))
+
+    def blocks(self) -> List[np.ndarray]:
+        """所有已提交行的只读内存映射，每段一个块；只重新映射行数变化的段"""
+        with self._lock:
+            total = len(self._ids)
+            result = []
+            for index in range((total + self.segment_rows - 1) // self.segment_rows):
+                rows = min(self.segment_rows, total - index * self.segment_rows)
+                block = self._maps.get(index)
+                if block is None or block.shape[0] != rows:
+                    block = np.memmap(self._segment_path(index), dtype=np.float32, mode='r',
+                                      shape=(rows, self.dim))
+                    self._maps[index] = block
+                result.append(block)
+            return result
+
+    def gather(self, rows: Sequence[int]) -> np.ndarray:
+        """按行号读取特征（复制）"""
+        rows = np.asarray(rows, dtype=np.int64)
+        result = np.empty((rows.size, self.dim or 0), dtype=np.float32)
+        blocks = self.blocks()
+        segments, offsets = np.divmod(rows, self.segment_rows)
+        for index in np.unique(segments):
+            mask = segments == index
+            result[mask] = blocks[index][offsets[mask]]
+        return result
+
+    def get(self, user_id: str) -> Optional[np.ndarray]:
+        row = self.latest_row(user_id)
+        if row is None:
+            return None
+        return self.gather([row])[0]
+
+    # ---------- 压缩 ----------
+
+    def dead_ratio(self) -> float:
+        return 1.0 - len(self._latest) / len(self._ids) if self._ids else 0.0
+
+    def compact(self) -> bool:
+        """只保留每个用户最新的一行，写入新一代文件后原子切换"""
+        with self._lock, self._file_lock():
+            self._sync_locked()
+            live_rows = sorted(self._latest.values())
+            if len(live_rows) == len(self._ids):
+                return False
+
+            new_generation = self.generation + 1
+            for index, start in enumerate(range(0, len(live_rows), self.segment_rows)):
+                chunk = self.gather(live_rows[start:start + self.segment_rows])
+                with open(self._segment_path(index, new_generation), 'wb') as f:
+                    f.write(chunk.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            with open(self._log_path(new_generation), 'wb') as f:
+                f.write(b''.join(json.dumps(self._ids[row]).encode('utf-8') + b'\n' for row in live_rows))
+                f.flush()
+                os.fsync(f.fileno())
+
+            # meta.json 原子替换即为切换点
+            old_generation = self.generation
+            self.meta = dict(self.meta, generation=new_generation)
+            self._write_meta(self.meta)
+
+            for name in os.listdir(self.directory):
+                if name.startswith(f"g{old_generation:04d}_"):
+                    os.remove(os.path.join(self.directory, name))
+            self._reset()
+            self._sync_locked()
+            print(f"特征存储压缩完成: {self.directory}, 保留 {len(live_rows)} 行")
+            return True
+
+
+class EmbeddingStore:
+    """按算法划分的特征存储，每个算法一个目录
+
+    根目录下的 version 文件是内存映射的 int64 计数器，每次提交新特征（或压缩）后加一，
+    其他进程只需读取它就能判断是否需要增量刷新。
+    """
+
+    def __init__(self, root: str, segment_rows: int = 65536, fsync: bool = True):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.fsync = fsync
+        os.makedirs(root, exist_ok=True)
+        self._segments: Dict[str, EmbeddingSegments] = {}
+        self._lock = threading.Lock()
+        self._version_path = os.path.join(root, 'version')
+        self._version_lock_path = os.path.join(root, 'version.lock')
+        self._version = self._open_version()
+
+    def _open_version(self) -> np.memmap:
+        fd = os.open(self._version_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 8:
+                os.ftruncate(fd, 8)
+        finally:
+            os.close(fd)
+        return np.memmap(self._version_path, dtype=np.int64, mode='r+', shape=(1,))
+
+    @property
+    def version(self) -> int:
+        """当前版本号（读取共享的内存映射，不访问磁盘）"""
+        return int(self._version[0])
+
+    def bump_version(self) -> int:
+        """提交新特征后调用，通知其他进程刷新"""
+        with self._lock, open(self._version_lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._version[0] += 1
+                return int(self._version[0])
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def segments(self, method: str) -> EmbeddingSegments:
+        with self._lock:
+            if method not in self._segments:
+                self._segments[method] = EmbeddingSegments(
+                    os.path.join(self.root, method), self.segment_rows, self.fsync
+                )
+            return self._segments[method]
+
+    def methods(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def migrate_from_npy(self, encodings_dir: str, methods: Sequence[str]) -> int:
+        """一次性迁移旧的 {user_id}_{method}.npy 文件，按文件修改时间（注册顺序）写入"""
+        marker = os.path.join(self.root, 'MIGRATED')
+        if os.path.exists(marker) or not os.path.isdir(encodings_dir):
+            return 0
+
+        # 较长的方法名优先匹配，避免后缀歧义
+        methods = sorted(methods, key=len, reverse=True)
+        grouped: Dict[str, List] = {method: [] for method in methods}
+        for name in os.listdir(encodings_dir):
+            if not name.endswith('.npy'):
+                continue
+            stem = name[:-len('.npy')]
+            for method in methods:
+                if stem.endswith('_' + method):
+                    path = os.path.join(encodings_dir, name)
+                    grouped[method].append((os.path.getmtime(path), stem[:-len(method) - 1], path))
+                    break
+
+        migrated = 0
+        for method, files in grouped.items():
+            if not files:
+                continue
+            files.sort()
+            user_ids, vectors = [], []
+            for _, user_id, path in files:
+                vector = np.load(path).astype(np.float32).reshape(-1)
+                norm = np.linalg.norm(vector)
+                if norm == 0 or not np.isfinite(norm):
+                    continue
+                user_ids.append(user_id)
+                vectors.append(vector / norm)
+            if user_ids:
+                self.segments(method).append_batch(user_ids, np.stack(vectors))
+                migrated += len(user_ids)
+                print(f"迁移{method}特征: {len(user_ids)} 个")
+
+        with open(marker, 'w', encoding='utf-8') as f:
+            json.dump({'migrated': migrated, 'source': encodings_dir}, f)
+        return migrated
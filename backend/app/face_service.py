@@ -1,24 +1,169 @@
 import numpy as np
-from typing import Optional, Dict, Union, Tuple, List
+from typing import Optional, Dict, Union, Tuple, List, Iterable, Iterator
 import cv2
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from .database import db
+from .gallery import FaceGallery
+from .detection import FaceDetectionResult, AdaptiveFaceDetector, to_dlib_location
+from .batching import MicroBatcher
+from .embedding_cache import EmbeddingCache, ImageAnalysis
+from .frame_dedup import FrameDeduplicator, frame_signature
+from .facenet_backends import FACENET_INPUT_SIZE, create_facenet_backend
+from .resources import resource_plan, rebuild_sessions
+from .tracking import FaceTracker
+from .diagnostics import get_logger, ArrayStats
+from .metrics import span, count, timed_operation, detections_total, detected_faces_total, embeddings_total
+from .dlib_profiles import DlibProfile, register_profile, recognize_profile
+from .config import (
+    DETECTION_MODE, DETECTION_SIZES,
+    DETECTION_MIN_FACE_RATIO, DETECTION_MIN_FACE_PX, IMAGE_MAX_SIZE,
+    PARALLEL_EXTRACTION, EXTRACTOR_MAX_WORKERS, MODEL_CONCURRENCY, INFERENCE_THREAD_BUDGET,
+    MICRO_BATCHING, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS,
+    BATCH_PIPELINE_WORKERS, CROWD_MAX_FACES,
+    STREAM_DETECT_EVERY, STREAM_REFRESH_INTERVAL, STREAM_QUALITY_GAIN,
+    TRACK_IOU_THRESHOLD, TRACK_MAX_MISSES, CASCADE_VOTING, CASCADE_ORDER,
+    EMBEDDING_CACHE, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL, EMBEDDING_CACHE_VERSION,
+    FRAME_DEDUP, FRAME_DEDUP_THRESHOLD, FRAME_DEDUP_MAX_AGE, FRAME_DEDUP_MAX_CLIENTS,
+    FACENET_BACKEND, FACENET_ONNX_PATH, FACENET_TORCHSCRIPT_PATH, FACENET_WEIGHTS_PATH, MODEL_WARMUP
+)
 import os
-import face_recognition
+
+# dlib 的 BLAS / OpenMP 线程数在库加载时确定
+resource_plan.apply_native_thread_limits()
+# face_recognition 导入时就会加载 dlib 模型，推迟到 _load_face_recognition() 中导入
+face_recognition = None
 import insightface
+from insightface.utils import face_align
 import onnxruntime
-from facenet_pytorch import MTCNN, InceptionResnetV1
-import torch
-from PIL import Image
-from torchvision import transforms
+
+# 每个请求的诊断信息使用 DEBUG 级别，生产环境（INFO）下不格式化字符串、不计算统计量
+logger = get_logger("face_service")
 
 class MultiFaceService:
+    METHODS = ['insightface', 'face_recognition', 'facenet']
+    # load() 中并行执行的加载步骤
+    LOAD_STEPS = METHODS + ['gallery']
+
     def __init__(self):
+        # 创建实例不加载模型，导入本模块不再阻塞；由 load() / load_in_background() 加载
+        self.model_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models')
+        self.ready = threading.Event()
+        self.load_error: Optional[str] = None
+        self.load_status = {step: 'pending' for step in self.LOAD_STEPS}
+        self.load_seconds: Dict[str, float] = {}
+        self._load_lock = threading.Lock()
+        self._loader: Optional[threading.Thread] = None
+        self._prefork = False
+
+    def load(self):
+        """并行加载各模型和特征库并预热，完成后标记就绪；已就绪时直接返回"""
+        with self._load_lock:
+            if self.ready.is_set():
+                return
+            start = time.perf_counter()
+            try:
+                print(f"\n开始加载模型... 模型根目录: {self.model_dir}")
+                print(resource_plan.describe())
+                self._run_load_steps(self.LOAD_STEPS, warmup=MODEL_WARMUP)
+
+                self._init_executor()
+                self._init_batchers()
+                self._init_cache()
+                self.load_error = None
+                self.ready.set()
+                print(f"\n✓ 所有模型初始化成功，耗时 {time.perf_counter() - start:.1f}s")
+            except Exception as e:
+                self.load_error = str(e)
+                print(f"模型初始化失败: {str(e)}")
+                raise e
+
+    def load_before_fork(self):
+        """多进程模式的主进程：只加载 fork 后可以写时复制共享的部分（dlib 模型、torch 权重、特征库）
+
+        不运行推理、不创建线程池；ONNX Runtime 会话自带线程池，fork 后不可用，在每个工作进程中加载。
+        """
+        with self._load_lock:
+            self._prefork = True
+            try:
+                self._run_load_steps([step for step in self.LOAD_STEPS if step not in self._session_steps()],
+                                     warmup=False)
+            finally:
+                self._prefork = False
+            # SQLite 连接不能跨进程使用
+            db.close()
+
+    def load_extractors(self):
+        """只加载特征提取模型，用于离线批量提取特征（批量导入的工作进程）
+
+        不加载特征库、不构建ANN索引、不启用微批处理和特征缓存；特征由调用方写入数据库。
+        """
+        with self._load_lock:
+            self._run_load_steps(self.METHODS, warmup=MODEL_WARMUP)
+            self._init_executor()
+            # 每个进程串行处理图片，合批只会增加等待；每张图片只处理一次，不需要缓存
+            self._batchers = {}
+            self.embedding_cache = None
+            self.frame_dedup = None
+
+    def after_fork(self):
+        """多进程模式的工作进程：恢复推理线程数，加载其余模型并预热"""
+        if self.load_status['facenet'] == 'ready':
+            self.facenet.set_threads(resource_plan['facenet'].threads)
+        self.load()
+
+    def _session_steps(self) -> List[str]:
+        """持有 ONNX Runtime 会话的加载步骤"""
+        return ['insightface', 'facenet'] if FACENET_BACKEND == 'onnx' else ['insightface']
+
+    def load_in_background(self) -> threading.Thread:
+        """在后台线程中加载，调用方立即返回（就绪前由接口层返回503）"""
+        if self._loader is None:
+            self._loader = threading.Thread(target=self._load_quietly, name='model-loader', daemon=True)
+            self._loader.start()
+        return self._loader
+
+    def _load_quietly(self):
+        try:
+            self.load()
+        except Exception:
+            # 错误已记录在 load_error 中，由就绪检查接口返回
+            pass
+
+    def _run_load_steps(self, steps: List[str], warmup: bool):
+        """并行执行加载步骤（文件读取、图优化、预热推理互不依赖），已加载的步骤只做预热"""
+        steps_table = {
+            'insightface': (self._load_insightface, self._warmup_insightface),
+            'face_recognition': (self._load_face_recognition, self._warmup_face_recognition),
+            'facenet': (self._load_facenet, self._warmup_facenet),
+            'gallery': (self._load_gallery, None)
+        }
+        with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix='model-loader') as pool:
+            futures = [
+                pool.submit(self._run_load_step, step, *steps_table[step], warmup)
+                for step in steps
+            ]
+        for future in futures:
+            future.result()
+
+    def _run_load_step(self, step: str, loader, warmup_fn, warmup: bool):
+        """执行一个加载步骤并记录状态和耗时"""
+        start = time.perf_counter()
         try:
-            self._init_models()
-            print("所有模型初始化成功")
+            if self.load_status[step] != 'ready':
+                self.load_status[step] = 'loading'
+                loader()
+                self.load_seconds[step] = round(time.perf_counter() - start, 3)
+                self.load_status[step] = 'ready'
+            if warmup and warmup_fn is not None:
+                warmup_fn()
         except Exception as e:
-            print(f"模型初始化失败: {str(e)}")
-            raise e
+            self.load_status[step] = 'failed'
+            print(f"✗ {step} 加载失败: {str(e)}")
+            raise
+        print(f"✓ {step} 加载完成 ({time.perf_counter() - start:.1f}s)")
 
     def _check_model_files(self, model_dir: str) -> bool:
         """检查所需的模型文件是否存在"""
@@ -40,70 +185,203 @@ class MultiFaceService:
                 print(f"✓ 文件存在: {file_path}")
         return True
 
-    def _init_models(self):
-        try:
-            print("\n开始加载模型...")
-            model_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models')
-            print(f"模型根目录: {model_dir}")
-            
-            # 1. InsightFace模型加载
-            print("\n1/3: 正在加载InsightFace模型...")
-            insightface_dir = os.path.join(model_dir, 'insightface')
-            self.insight_model = insightface.app.FaceAnalysis(
-                name='buffalo_l',
-                root=insightface_dir,
-                allowed_modules=['detection', 'recognition'],
-                providers=['CPUExecutionProvider']
+    def _load_insightface(self):
+        """加载 InsightFace 检测 + 识别模型"""
+        insightface_dir = os.path.join(self.model_dir, 'insightface')
+        self.insight_model = insightface.app.FaceAnalysis(
+            name='buffalo_l',
+            root=insightface_dir,
+            allowed_modules=['detection', 'recognition'],
+            providers=['CPUExecutionProvider']
+        )
+        rebuild_sessions(self.insight_model.models.values(), resource_plan['insightface'].session_options())
+        # 只在初始化时 prepare 一次，检测分辨率在每次调用时按需选择
+        self.insight_model.prepare(ctx_id=0, det_thresh=0.6, det_size=(max(DETECTION_SIZES),) * 2)
+        self.insight_rec_model = self.insight_model.models['recognition']
+        self.detector = AdaptiveFaceDetector(
+            self.insight_model.det_model,
+            sizes=DETECTION_SIZES,
+            min_face_ratio=DETECTION_MIN_FACE_RATIO,
+            min_face_px=DETECTION_MIN_FACE_PX,
+            mode=DETECTION_MODE
+        )
+
+    def _warmup_insightface(self):
+        # 空白图像检测不到人脸，自适应模式会依次运行所有检测分辨率
+        self.detector.detect(np.zeros((480, 640, 3), dtype=np.uint8))
+        size = self.insight_rec_model.input_size[0]
+        self.insight_rec_model.get_feat([np.zeros((size, size, 3), dtype=np.uint8)])
+
+    def _load_face_recognition(self):
+        """导入 face_recognition（导入时加载 dlib 的检测、关键点和识别模型）"""
+        global face_recognition
+        os.environ['FACE_RECOGNITION_MODELS'] = os.path.join(self.model_dir, 'face_recognition')
+        import face_recognition
+        print(f"face_recognition 配置档: 注册={register_profile().describe()}")
+        print(f"face_recognition 配置档: 识别={recognize_profile().describe()}")
+
+    def _warmup_face_recognition(self):
+        # 注册和识别的配置档可能使用不同的关键点模型
+        for landmark_model in {register_profile().landmark_model, recognize_profile().landmark_model}:
+            face_recognition.face_encodings(
+                np.zeros((150, 150, 3), dtype=np.uint8),
+                known_face_locations=[(0, 150, 150, 0)],
+                num_jitters=1,
+                model=landmark_model
             )
-            self.insight_model.prepare(ctx_id=0, det_thresh=0.6)
-            print("✓ InsightFace模型加载成功")
-            
-            # 2. face_recognition模型加载
-            print("\n2/3: 正加载face_recognition模型...")
-            face_recognition_dir = os.path.join(model_dir, 'face_recognition')
-            os.environ['FACE_RECOGNITION_MODELS'] = face_recognition_dir
-            print("✓ face_recognition模型加载成功")
-            
-            # 3. FaceNet模型加载
-            print("\n3/3: 正在加载FaceNet模型...")
-            # 初始化时就将模型转换为float类型
-            self.facenet = InceptionResnetV1(
-                pretrained='vggface2',
-                classify=False,
-                device='cpu'
-            ).float().eval()  # 添加 float()
-            print("✓ FaceNet模型加载成功")
-            
-            print("\n✓ 所有模型加载完成!")
+
+    def _load_facenet(self):
+        """加载 FaceNet 推理后端"""
+        facenet_resources = resource_plan['facenet']
+        self.facenet = create_facenet_backend(
+            FACENET_BACKEND, FACENET_ONNX_PATH, FACENET_TORCHSCRIPT_PATH,
+            # fork 之前只用单线程，避免在主进程中创建 OpenMP 线程池
+            threads=1 if self._prefork else facenet_resources.threads,
+            session_options=facenet_resources.session_options() if FACENET_BACKEND == 'onnx' else None,
+            weights_path=FACENET_WEIGHTS_PATH
+        )
+        print(f"FaceNet 推理后端: {self.facenet.name}")
+
+    def _warmup_facenet(self):
+        self.facenet.embed(np.zeros((1, 3, FACENET_INPUT_SIZE, FACENET_INPUT_SIZE), dtype=np.float32))
+
+    def _load_gallery(self):
+        """一次性加载特征库，识别时不再逐个读取磁盘文件"""
+        self.gallery = FaceGallery(self.METHODS, db.store)
+        # 主进程在 fork 之前不能启动线程：同步构建ANN索引，工作进程以写时复制方式共享
+        self.gallery.load(db, background_ann=not self._prefork)
+
+    def _init_executor(self):
+        """初始化特征提取执行引擎：有界线程池 + 每个模型的并发上限"""
+        self._extractors = {
+            'insightface': self._get_face_encoding_insightface,
+            'face_recognition': self._get_face_encoding_face_recognition,
+            'facenet': self._get_face_encoding_facenet
+        }
+        # ONNX Runtime、dlib 和 torch 在原生代码中都会释放GIL，可以用线程并发
+        self._executor = ThreadPoolExecutor(
+            max_workers=EXTRACTOR_MAX_WORKERS,
+            thread_name_prefix='face-extractor'
+        )
+        self._model_slots = {
+            method: threading.BoundedSemaphore(MODEL_CONCURRENCY.get(method, 1))
+            for method in self.METHODS
+        }
+        # 批量识别的流水线线程池（与特征提取线程池分开，避免互相等待造成死锁）
+        self._batch_executor = ThreadPoolExecutor(
+            max_workers=BATCH_PIPELINE_WORKERS,
+            thread_name_prefix='face-batch'
+        )
+        print(f"特征提取执行引擎: 并发={PARALLEL_EXTRACTION}, 线程池={EXTRACTOR_MAX_WORKERS}, "
+              f"线程预算={INFERENCE_THREAD_BUDGET}")
+
+    def _init_batchers(self):
+        """初始化 ArcFace / FaceNet 的动态微批处理"""
+        self._batchers = {}
+        if not MICRO_BATCHING:
+            return
+        self._batchers['insightface'] = MicroBatcher(
+            'arcface', self._arcface_forward, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS
+        )
+        self._batchers['facenet'] = MicroBatcher(
+            'facenet', self._facenet_forward, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS
+        )
+        print(f"微批处理已启用: 最大批次={MICRO_BATCH_MAX_SIZE}, 最长等待={MICRO_BATCH_MAX_WAIT_MS}ms")
+
+    def _arcface_forward(self, crops: List[np.ndarray]) -> np.ndarray:
+        """ArcFace 批量前向推理，输入为已对齐的人脸"""
+        return self.insight_rec_model.get_feat(crops)
+
+    def _facenet_forward(self, tensors: List[np.ndarray]) -> np.ndarray:
+        """FaceNet 批量前向推理，输入为 (3, 160, 160) 的张量"""
+        return self.facenet.embed(np.stack(tensors))
+
+    def _embed_arcface(self, image: np.ndarray, face) -> np.ndarray:
+        """对齐人脸并提取 ArcFace 特征（启用微批处理时与其他请求合批）"""
+        aligned = face_align.norm_crop(image, landmark=face.kps,
+                                       image_size=self.insight_rec_model.input_size[0])
+        if 'insightface' in self._batchers:
+            return self._batchers['insightface'].submit(aligned)
+        return self._arcface_forward([aligned])[0]
+
+    def _embed_facenet(self, face_tensor: np.ndarray) -> np.ndarray:
+        """提取 FaceNet 特征，返回 (1, 512) 的数组（启用微批处理时与其他请求合批）"""
+        if 'facenet' in self._batchers:
+            return self._batchers['facenet'].submit(face_tensor[0])[None]
+        return self._facenet_forward([face_tensor[0]])
+
+    def _run_extractor(self, method: str, image: np.ndarray, detection: FaceDetectionResult,
+                       profile: Optional[DlibProfile] = None) -> Optional[np.ndarray]:
+        """在该模型的并发上限内执行一次特征提取（耗时包含等待模型名额和合批的时间）"""
+        with span('embed', method):
+            if method in self._batchers:
+                # 合批线程本身串行执行前向推理，不需要再限制并发
+                return self._extractors[method](image, detection)
+            with self._model_slots[method]:
+                if method == 'face_recognition':
+                    return self._extractors[method](image, detection, profile)
+                return self._extractors[method](image, detection)
+
+    def _extract_encodings(self, image: np.ndarray, detection: FaceDetectionResult,
+                           methods: Optional[List[str]] = None,
+                           profile: Optional[DlibProfile] = None) -> Tuple[Dict[str, np.ndarray], List[str]]:
+        """执行所有（或指定）算法的特征提取，返回 (成功的特征, 失败的算法)"""
+        methods = methods or self.METHODS
+        if PARALLEL_EXTRACTION:
+            futures = {
+                method: self._executor.submit(self._run_extractor, method, image, detection, profile)
+                for method in methods
+            }
+        
+        encodings = {}
+        failed_methods = []
+        for method in methods:
+            try:
+                if PARALLEL_EXTRACTION:
+                    encoding = futures[method].result()
+                else:
+                    encoding = self._run_extractor(method, image, detection, profile)
+            except Exception as e:
+                logger.error("%s 特征提取错误: %s", method, e)
+                encoding = None
             
-        except Exception as e:
-            print(f"\n✗ 模型初始化失败: {str(e)}")
-            raise
+            if encoding is not None:
+                encodings[method] = encoding
+                count(embeddings_total, method, 'success')
+                logger.debug("✓ %s 特征提取成功", method)
+            else:
+                failed_methods.append(method)
+                count(embeddings_total, method, 'failure')
+                logger.debug("✗ %s 特征提取失败", method)
+        
+        return encodings, failed_methods
 
     def _process_image(self, image_data: bytes) -> np.ndarray:
         """优化图像预处理 - 减少不必要的处理"""
         try:
             # 1. 快速解码
-            nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            with span('decode'):
+                nparr = np.frombuffer(image_data, np.uint8)
+                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
             
             if image is None:
                 raise ValueError("无法解码图像数据")
             
             # 2. 只在必要时调整大小
             height, width = image.shape[:2]
-            max_size = 1024
+            max_size = IMAGE_MAX_SIZE
             if max(height, width) > max_size:
                 scale = max_size / max(height, width)
                 new_width = int(width * scale)
                 new_height = int(height * scale)
-                image = cv2.resize(image, (new_width, new_height), 
-                                 interpolation=cv2.INTER_AREA)
+                with span('resize'):
+                    image = cv2.resize(image, (new_width, new_height), 
+                                     interpolation=cv2.INTER_AREA)
             
             return image
             
         except Exception as e:
-            print(f"图像处理失败: {str(e)}")
+            logger.error("图像处理失败: %s", e)
             raise
 
     def _evaluate_face_quality_score(self, face_image: np.ndarray) -> float:
@@ -140,7 +418,7 @@ class MultiFaceService:
             return quality_score
             
         except Exception as e:
-            print(f"质量评估失败: {str(e)}")
+            logger.error("质量评估失败: %s", e)
             return 0.0
 
     def _calculate_optimized_similarity(self, method: str, encoding1: np.ndarray, encoding2: np.ndarray) -> float:
@@ -150,7 +428,7 @@ class MultiFaceService:
                 return 0.0
             
             if encoding1.shape != encoding2.shape:
-                print(f"特征维度不匹配: {encoding1.shape} vs {encoding2.shape}")
+                logger.warning("特征维度不匹配: %s vs %s", encoding1.shape, encoding2.shape)
                 return 0.0
             
             # 确保特征向量已经归一化
@@ -173,20 +451,16 @@ class MultiFaceService:
                 # 调整到 [0,1] 范围
                 similarity = (cosine_sim + 1) / 2
                 
-                print(f"""
-                FaceNet相似度计算:
-                - 余弦相似度: {cosine_sim:.4f}
-                - 最终相似度: {similarity:.4f}
-                """)
+                logger.debug("FaceNet相似度计算: 余弦相似度=%.4f, 最终相似度=%.4f", cosine_sim, similarity)
                 
             else:
-                print(f"未知的方法: {method}")
+                logger.warning("未知的方法: %s", method)
                 return 0.0
             
             return float(similarity)
             
         except Exception as e:
-            print(f"相似度计算错误: {str(e)}")
+            logger.error("相似度计算错误: %s", e)
             return 0.0
 
     def _get_method_threshold(self, method: str) -> float:
@@ -198,7 +472,76 @@ class MultiFaceService:
         }
         return thresholds.get(method, 0.6)
 
-    def register_face(self, image_data: bytes, user_data: Dict) -> Tuple[bool, str]:
+    def _init_cache(self):
+        """按图片内容缓存检测结果和特征，版本号包含影响结果的配置"""
+        self.embedding_cache = None
+        if EMBEDDING_CACHE:
+            version = f"{EMBEDDING_CACHE_VERSION}|{IMAGE_MAX_SIZE}|{DETECTION_MODE}|{DETECTION_SIZES}|" \
+                      f"{DETECTION_MIN_FACE_RATIO}|{DETECTION_MIN_FACE_PX}|{self.facenet.name}"
+            self.embedding_cache = EmbeddingCache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL, version)
+        print(f"特征缓存: {EMBEDDING_CACHE}, 容量={EMBEDDING_CACHE_SIZE}, TTL={EMBEDDING_CACHE_TTL}s")
+        
+        # 轮询客户端的近重复帧抑制
+        self.frame_dedup = None
+        if FRAME_DEDUP:
+            self.frame_dedup = FrameDeduplicator(FRAME_DEDUP_THRESHOLD, FRAME_DEDUP_MAX_AGE, FRAME_DEDUP_MAX_CLIENTS)
+
+    def _image_analysis(self, image_data: bytes) -> ImageAnalysis:
+        """按内容哈希查找缓存的分析结果；关闭缓存时每次返回新的条目"""
+        if self.embedding_cache is None:
+            return ImageAnalysis()
+        with span('cache_lookup'):
+            return self.embedding_cache.get(image_data)
+
+    @staticmethod
+    def _cache_slot(method: str, profile: DlibProfile):
+        """特征在缓存条目中的键：face_recognition 的特征依赖配置档，按配置档分别保存"""
+        if method == 'face_recognition':
+            return method, profile.cache_key()
+        return method
+
+    def _analyze(self, image_data: bytes, analysis: ImageAnalysis, methods: List[str], profile: DlibProfile,
+                 detection: Optional[FaceDetectionResult] = None):
+        """在分析结果上补齐指定算法的特征，返回 (特征, 失败的算法, 检测结果)
+
+        传入上一次返回的 detection 可以在同一请求内复用解码后的图片；图像处理失败时特征为 None。
+        """
+        slots = {method: self._cache_slot(method, profile) for method in methods}
+        with analysis.lock:
+            missing_slots = set(analysis.missing(list(slots.values())))
+            missing = [method for method in methods if slots[method] in missing_slots]
+            if missing and analysis.valid:
+                if detection is None:
+                    # 1. 图像预处理
+                    image = self._process_image(image_data)
+                    if image is None:
+                        analysis.valid = False
+                    elif analysis.faces is None:
+                        # 2. 共享的人脸检测（只运行一次），各算法基于同一结果并发提取特征
+                        detection = self._detect_faces(image)
+                        analysis.faces, analysis.det_size = detection.faces, detection.det_size
+                    else:
+                        detection = FaceDetectionResult(image, analysis.faces, analysis.det_size)
+                if analysis.valid:
+                    encodings, failed_methods = self._extract_encodings(detection.image, detection, missing, profile)
+                    analysis.encodings.update((slots[m], encoding) for m, encoding in encodings.items())
+                    analysis.failed.update(slots[m] for m in failed_methods)
+            
+            if not analysis.valid:
+                return None, list(methods), detection
+            encodings = {m: analysis.encodings[slots[m]] for m in methods if slots[m] in analysis.encodings}
+            return encodings, [m for m in methods if slots[m] in analysis.failed], detection
+
+    def extract_face_encodings(self, image_data: bytes,
+                               profile: Optional[str] = None) -> Tuple[Optional[Dict[str, np.ndarray]], List[str]]:
+        """解码图像、检测人脸并提取各算法特征（注册和批量导入共用，默认使用注册配置档），图像处理失败时返回 None"""
+        dlib_profile = register_profile(profile)
+        encodings, failed_methods, _ = self._analyze(
+            image_data, self._image_analysis(image_data), self.METHODS, dlib_profile)
+        return encodings, failed_methods
+
+    @timed_operation('register')
+    def register_face(self, image_data: bytes, user_data: Dict, profile: Optional[str] = None) -> Tuple[bool, str]:
         """优化的人脸注册流程"""
         try:
             if not image_data or not user_data.get('id') or not user_data.get('name'):
@@ -206,57 +549,25 @@ class MultiFaceService:
             
             user_id: str = str(user_data['id'])
             
-            # 1. 图像预处理
-            image = self._process_image(image_data)
-            if image is None:
+            # 1-2. 图像预处理、人脸检测和特征提取
+            encodings, failed_methods = self.extract_face_encodings(image_data, profile)
+            if encodings is None:
                 return False, "图像处理失败"
             
-            # 2. 执行所有算法的检测
-            encodings = {}
-            failed_methods = []
-            
-            # 2.1 InsightFace
-            print("\n尝试使用InsightFace检测人脸...")
-            insight_encoding = self._get_face_encoding_insightface(image)
-            if insight_encoding is not None:
-                encodings['insightface'] = insight_encoding
-                print("✓ InsightFace检测成功")
-            else:
-                failed_methods.append('insightface')
-                print("✗ InsightFace检测失败")
-            
-            # 2.2 face_recognition
-            print("\n尝试使用face_recognition检测人脸...")
-            face_rec_encoding = self._get_face_encoding_face_recognition(image)
-            if face_rec_encoding is not None:
-                encodings['face_recognition'] = face_rec_encoding
-                print("✓ face_recognition检测成功")
-            else:
-                failed_methods.append('face_recognition')
-                print("✗ face_recognition检测失败")
-            
-            # 2.4 FaceNet
-            print("\n尝试使用FaceNet检测人脸...")
-            facenet_encoding = self._get_face_encoding_facenet(image)
-            if facenet_encoding is not None:
-                encodings['facenet'] = facenet_encoding
-                print("✓ FaceNet检测成功")
-            else:
-                failed_methods.append('facenet')
-                print("✗ FaceNet检测失败")
-            
             # 3. 结果验证
             if len(encodings) == 0:
                 return False, "所有算法都未能检测到人脸，请确保\n1. 图片中有清晰的正面人脸\n2. 光线充足\n3. 人脸角度适中"
             
             # 4. 保存数据
             try:
-                db.save_user(user_data)
-                db.save_face_encodings_batch(user_id, encodings)
+                with span('store'):
+                    db.save_user(user_data)
+                    db.save_face_encodings_batch(user_id, encodings)
+                    self.gallery.add_user(user_data, encodings)
                 
                 # 5. 返回结果
                 success_count = len(encodings)
-                total_count = 3  # 总算数量更新为3
+                total_count = len(self.METHODS)
                 success_methods = list(encodings.keys())
                 result_msg = f"注册功 ({success_count}/{total_count} 算法成)\n"
                 result_msg += f"成功的算法: {', '.join(success_methods)}\n"
@@ -266,245 +577,533 @@ class MultiFaceService:
                 return True, result_msg
                 
             except Exception as e:
-                print(f"数保存失败: {str(e)}")
+                logger.error("数保存失败: %s", e)
                 raise
                 
         except Exception as e:
-            print(f"注册失败: {str(e)}")
+            logger.error("注册失败: %s", e)
             return False, str(e)
 
-    def recognize_face(self, image_data: bytes) -> Tuple[bool, Union[Dict, str]]:
-        """优化的人脸识别流程"""
+    def _synced_gallery(self) -> FaceGallery:
+        """实时特征库，先增量同步其他工作进程注册的用户（版本号未变化时只读取一次内存映射）"""
+        self.gallery.sync()
+        return self.gallery
+
+    @timed_operation('recognize')
+    def recognize_face(self, image_data: bytes, gallery=None,
+                       profile: Optional[str] = None) -> Tuple[bool, Union[Dict, str]]:
+        """优化的人脸识别流程（gallery 为空时使用实时特征库，批量识别时传入快照）"""
         try:
-            # 1. 图像预理
-            image = self._process_image(image_data)
-            if image is None:
-                return False, "图像处理失败"
+            gallery = gallery or self._synced_gallery()
             
-            # 2. 执行所有算法的检测
-            encodings = {}
-            failed_methods = []
+            dlib_profile = recognize_profile(profile)
+            analysis = self._image_analysis(image_data)
             
-            # 2.1 InsightFace
-            print("\n执行 InsightFace 识别...")
-            insight_encoding = self._get_face_encoding_insightface(image)
-            if insight_encoding is not None:
-                encodings['insightface'] = insight_encoding
-                print("✓ InsightFace 识别成功")
-            else:
-                failed_methods.append('insightface')
-                print("✗ InsightFace 识别失败")
-            
-            # 2.2 face_recognition
-            print("\n执行 face_recognition 识别...")
-            face_rec_encoding = self._get_face_encoding_face_recognition(image)
-            if face_rec_encoding is not None:
-                encodings['face_recognition'] = face_rec_encoding
-                print("✓ face_recognition 识别成功")
-            else:
-                failed_methods.append('face_recognition')
-                print("✗ face_recognition 识别失败")
-            
-            # 2.4 FaceNet
-            print("\n执行 FaceNet 识别...")
-            facenet_encoding = self._get_face_encoding_facenet(image)
-            if facenet_encoding is not None:
-                encodings['facenet'] = facenet_encoding
-                print("✓ FaceNet 识别成功")
-            else:
-                failed_methods.append('facenet')
-                print("✗ FaceNet 识别失败")
+            if CASCADE_VOTING:
+                if not gallery.user_ids:
+                    return False, "数库中没有注册用户"
+                return self._recognize_cascade(image_data, analysis, gallery, dlib_profile)
+            
+            # 1-2. 图像预处理、人脸检测和特征提取（相同图片直接使用缓存）
+            encodings, failed_methods, _ = self._analyze(image_data, analysis, self.METHODS, dlib_profile)
+            if encodings is None:
+                return False, "图像处理失败"
             
             if not encodings:
                 return False, "所有算法都未能检测到有效人脸"
             
-            # 3. 获取所有注册用户
-            users = db.get_users()
-            if not users:
+            # 3. 检查特征库
+            if not gallery.user_ids:
                 return False, "数库中没有注册用户"
             
-            # 4. 对每个算法进行身份匹配
+            # 4. 对每个算法进行身份匹配（一次矩阵-向量乘法）
             method_results = {}
-            all_matches = []
-            
             for method, encoding in encodings.items():
-                matches = []
-                print(f"\n{method} 开始匹配...")
-                
-                for user_id, user_data in users.items():
-                    stored_encoding = db.get_face_encoding(user_id, method)
-                    if stored_encoding is None:
-                        continue
-                    
-                    # 计算似度
-                    similarity = self._calculate_optimized_similarity(method, encoding, stored_encoding)
-                    threshold = self._get_method_threshold(method)
-                    
-                    print(f"与用户 {user_data['name']} 的相似度: {similarity:.4f} (阈值: {threshold})")
-                    
-                    if similarity > threshold:
-                        matches.append({
-                            'user_id': user_id,
-                            'name': user_data['name'],
-                            'similarity': similarity,
-                            'method': method
-                        })
-                
-                if matches:
-                    # 选择最佳匹配
-                    best_match = max(matches, key=lambda x: x['similarity'])
-                    method_results[method] = {
-                        'success': True,
-                        'match': best_match
+                logger.debug("%s 开始匹配...", method)
+                with span('match', method):
+                    candidates = gallery.search(method, encoding, top_k=1)
+                method_results[method] = self._match_result(method, candidates, gallery)
+            
+            # 5. 统计投票结果
+            with span('vote'):
+                return self._vote(method_results, len(encodings))
+            
+        except Exception as e:
+            logger.error("识别过程发生错误: %s", e)
+            return False, str(e)
+
+    def _detect_faces(self, image: np.ndarray, exhaustive: bool = False) -> FaceDetectionResult:
+        """共享的人脸检测阶段：每个请求只运行一次RetinaFace（多人脸场景使用 exhaustive，不在找到第一张脸后停止）"""
+        try:
+            with span('detect'):
+                detection = self.detector.detect(image, exhaustive)
+            count(detections_total)
+            count(detected_faces_total, amount=len(detection))
+            logger.debug("检测到 %d 个人脸 (检测分辨率: %s)", len(detection), detection.det_size)
+            return detection
+        except Exception as e:
+            logger.error("人脸检测错误: %s", e)
+            return FaceDetectionResult(image, [])
+
+    def _match_result(self, method: str, candidates: List[Tuple[str, float]], gallery) -> Dict:
+        """根据阈值判断单个算法的最佳匹配"""
+        threshold = self._get_method_threshold(method)
+        if candidates and candidates[0][1] > threshold:
+            # 选择最佳匹配
+            user_id, similarity = candidates[0]
+            best_match = {
+                'user_id': user_id,
+                'name': gallery.get_user(user_id)['name'],
+                'similarity': similarity,
+                'method': method
+            }
+            logger.debug("✓ %s 最佳匹配: %s (相似度: %.4f)", method, best_match['name'], similarity)
+            return {
+                'success': True,
+                'match': best_match
+            }
+        
+        logger.debug("✗ %s 未找到匹配", method)
+        return {
+            'success': False,
+            'message': '未找到匹配的人脸'
+        }
+
+    def _recognize_cascade(self, image_data: bytes, analysis: ImageAnalysis, gallery,
+                           profile: DlibProfile) -> Tuple[bool, Dict]:
+        """级联投票：按成本从低到高运行算法，每完成一批就匹配，多数结果已确定时跳过剩余算法
+
+        所有结果都带有 skipped_methods；失败时结果为 {'message', 'skipped_methods'}。
+        """
+        order = [m for m in CASCADE_ORDER if m in self.METHODS] + \
+                [m for m in self.METHODS if m not in CASCADE_ORDER]
+        # 不到半数的算法不可能确定多数结果，第一批直接一起运行
+        wave, pending = order[:len(order) // 2 + 1], order[len(order) // 2 + 1:]
+        
+        method_results = {}
+        votes: Dict[str, int] = {}
+        succeeded = 0
+        detection = None
+        while wave:
+            encodings, _, detection = self._analyze(image_data, analysis, wave, profile, detection)
+            if encodings is None:
+                return self._cascade_result(False, "图像处理失败", wave + pending)
+            for method in wave:
+                if method not in encodings:
+                    continue
+                succeeded += 1
+                with span('match', method):
+                    candidates = gallery.search(method, encodings[method], top_k=1)
+                method_results[method] = self._match_result(method, candidates, gallery)
+                if method_results[method]['success']:
+                    user_id = method_results[method]['match']['user_id']
+                    votes[user_id] = votes.get(user_id, 0) + 1
+            
+            if self._vote_settled(votes, succeeded, len(pending)):
+                break
+            wave, pending = pending[:1], pending[1:]
+        
+        if pending:
+            logger.debug("投票结果已确定，跳过: %s", pending)
+        if succeeded == 0:
+            return self._cascade_result(False, "所有算法都未能检测到有效人脸", pending)
+        
+        with span('vote'):
+            success, result = self._vote(method_results, succeeded)
+        return self._cascade_result(success, result, pending)
+
+    @staticmethod
+    def _cascade_result(success: bool, result: Union[Dict, str], skipped: List[str]) -> Tuple[bool, Dict]:
+        """级联投票的返回结果，附带没有运行的算法"""
+        if not success:
+            result = {'message': result}
+        result['skipped_methods'] = skipped
+        return success, result
+
+    @staticmethod
+    def _vote_settled(votes: Dict[str, int], succeeded: int, remaining: int) -> bool:
+        """剩余算法无论结果如何都不会改变多数投票结果时返回 True"""
+        best = max(votes.values(), default=0)
+        # 剩余算法都提取成功但投给其他身份，最高票仍超过半数
+        if 2 * best > succeeded + remaining:
+            return True
+        # 剩余算法都投给同一身份，仍没有身份能超过半数
+        return 2 * best + remaining <= succeeded
+
+    def _vote(self, method_results: Dict[str, Dict], total_algorithms: int) -> Tuple[bool, Union[Dict, str]]:
+        """多算法投票：超过半数成功提取特征的算法匹配到同一身份才算识别成功"""
+        all_matches = [r['match'] for r in method_results.values() if r['success']]
+        
+        if all_matches:
+            vote_counts = {}
+            
+            for match in all_matches:
+                user_id = match['user_id']
+                if user_id not in vote_counts:
+                    vote_counts[user_id] = {
+                        'name': match['name'],
+                        'count': 0,
+                        'methods': [],
+                        'similarities': []
                     }
-                    all_matches.append(best_match)
-                    print(f"✓ {method} 最佳匹配: {best_match['name']} (相似度: {best_match['similarity']:.4f})")
+                vote_counts[user_id]['count'] += 1
+                vote_counts[user_id]['methods'].append(match['method'])
+                vote_counts[user_id]['similarities'].append(match['similarity'])
+            
+            # 找到得���多的身份
+            best_match = max(vote_counts.items(), key=lambda x: x[1]['count'])
+            user_id, match_info = best_match
+            
+            # 检查是否达到多数票（超过半数算法匹配）
+            if match_info['count'] <= total_algorithms / 2:
+                logger.debug("投票结果不足以确认身份: 总算法数=%d, 最高得票=%d, 投票算法=%s",
+                             total_algorithms, match_info['count'], match_info['methods'])
+                return False, "未找到可靠的身份配"
+            
+            # 均相似度
+            avg_similarity = sum(match_info['similarities']) / len(match_info['similarities'])
+            
+            result = {
+                'id': user_id,
+                'name': match_info['name'],
+                'vote_count': match_info['count'],
+                'total_algorithms': total_algorithms,
+                'voting_methods': match_info['methods'],
+                'average_similarity': avg_similarity,
+                'method_results': method_results
+            }
+            
+            logger.debug("身份识别成功: 用户=%s, 得票数=%d/%d, 投票算法=%s, 平均相似度=%.4f",
+                         result['name'], result['vote_count'], total_algorithms,
+                         result['voting_methods'], avg_similarity)
+            
+            return True, result
+        
+        return False, "未找到配的身份"
+
+    def recognize_client_frame(self, client_id: str, image_data: bytes,
+                               profile: Optional[str] = None) -> Tuple[bool, Union[Dict, str], bool]:
+        """轮询客户端的识别：与该客户端上次处理的帧几乎相同时直接返回上次结果，返回 (成功, 结果, 是否复用)"""
+        if self.frame_dedup is None or not client_id:
+            success, result = self.recognize_face(image_data, profile=profile)
+            return success, result, False
+        
+        # 同一客户端切换配置档时不复用之前的结果
+        client_key = f"{client_id}|{recognize_profile(profile).name}"
+        signature = frame_signature(image_data)
+        cached = self.frame_dedup.lookup(client_key, signature)
+        if cached is not None:
+            success, result = cached
+            return success, result, True
+        
+        success, result = self.recognize_face(image_data, profile=profile)
+        self.frame_dedup.store(client_key, signature, (success, result))
+        return success, result, False
+
+    def recognize_faces_batch(self, images: Iterable[Tuple[str, bytes]],
+                              profile: Optional[str] = None) -> Iterator[Dict]:
+        """批量识别：多张图片流水线处理，每完成一张就产出一条结果（完成顺序）"""
+        # 整批共用一个特征库快照
+        gallery = self.gallery.snapshot()
+        in_flight = {}
+        
+        def collect(done) -> Iterator[Dict]:
+            for future in done:
+                index, name = in_flight.pop(future)
+                try:
+                    success, result = future.result()
+                except Exception as e:
+                    success, result = False, str(e)
+                item = {'index': index, 'filename': name, 'success': success}
+                if success:
+                    item['data'] = result
+                elif isinstance(result, dict):
+                    # 级联投票失败时带有 message 和 skipped_methods
+                    item.update(result)
                 else:
-                    method_results[method] = {
-                        'success': False,
-                        'message': '未找到匹配的人脸'
-                    }
-                    print(f"✗ {method} 未找到匹配")
+                    item['message'] = result
+                yield item
+        
+        # 最多同时处理 BATCH_PIPELINE_WORKERS * 2 张，解码、检测和特征提取在不同图片间重叠，
+        # 并发的特征提取会被微批处理合并为批量推理
+        max_in_flight = BATCH_PIPELINE_WORKERS * 2
+        for index, (name, image_data) in enumerate(images):
+            future = self._batch_executor.submit(self.recognize_face, image_data, gallery, profile)
+            in_flight[future] = (index, name)
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                yield from collect(done)
+        
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            yield from collect(done)
+
+    @timed_operation('recognize_crowd')
+    def recognize_faces_in_frame(self, image_data: bytes, gallery=None,
+                                 profile: Optional[str] = None) -> Tuple[bool, Union[Dict, str]]:
+        """多人脸识别：画面中每张人脸批量提取特征，每个算法一次矩阵-矩阵乘法完成匹配"""
+        try:
+            gallery = gallery or self._synced_gallery()
+            dlib_profile = recognize_profile(profile)
             
-            # 5. 统计投票结果
-            if all_matches:
-                vote_counts = {}
-                total_algorithms = len(encodings)  # 成功提取特征的算法总数
-                
-                for match in all_matches:
-                    user_id = match['user_id']
-                    if user_id not in vote_counts:
-                        vote_counts[user_id] = {
-                            'name': match['name'],
-                            'count': 0,
-                            'methods': [],
-                            'similarities': []
-                        }
-                    vote_counts[user_id]['count'] += 1
-                    vote_counts[user_id]['methods'].append(match['method'])
-                    vote_counts[user_id]['similarities'].append(match['similarity'])
-                
-                # 找到得���多的身份
-                best_match = max(vote_counts.items(), key=lambda x: x[1]['count'])
-                user_id, match_info = best_match
-                
-                # 检查是否达到多数票（超过半数算法匹配）
-                if match_info['count'] <= total_algorithms / 2:
-                    print(f"""
-                    投票结果不足以确认身份:
-                    - 总算法数: {total_algorithms}
-                    - 最高得票: {match_info['count']}
-                    - 投票算法: {', '.join(match_info['methods'])}
-                    """)
-                    return False, "未找到可靠的身份配"
-                
-                # 均相似度
-                avg_similarity = sum(match_info['similarities']) / len(match_info['similarities'])
-                
-                result = {
-                    'id': user_id,
-                    'name': match_info['name'],
-                    'vote_count': match_info['count'],
-                    'total_algorithms': total_algorithms,
-                    'voting_methods': match_info['methods'],
-                    'average_similarity': avg_similarity,
-                    'method_results': method_results
+            # 1. 图像预处理和检测
+            image = self._process_image(image_data)
+            if image is None:
+                return False, "图像处理失败"
+            
+            faces = self._select_faces(self._detect_faces(image, exhaustive=True), image)
+            if not faces:
+                return False, "未检测到人脸"
+            
+            if not gallery.user_ids:
+                return False, "数库中没有注册用户"
+            
+            # 2. 批量提取特征、匹配并逐个人脸投票
+            results = []
+            for face, (success, identity) in zip(faces, self._identify_faces(image, faces, gallery, dlib_profile)):
+                item = {
+                    'bbox': [float(v) for v in face.bbox],
+                    'det_score': float(face.det_score),
+                    'success': success
                 }
-                
-                print(f"""
-                身份别成功:
-                - 用户: {result['name']}
-                - 得票数: {result['vote_count']}/{total_algorithms}
-                - 投票算法: {', '.join(result['voting_methods'])}
-                - 平均相似度: {avg_similarity:.4f}
-                """)
-                
-                return True, result
+                if success:
+                    item['identity'] = identity
+                else:
+                    item['message'] = identity
+                results.append(item)
             
-            return False, "未找到配的身份"
+            recognized = sum(1 for item in results if item['success'])
+            logger.debug("多人脸识别完成: 检测到 %d 个人脸, 识别成功 %d 个", len(results), recognized)
+            return True, {
+                'face_count': len(results),
+                'recognized_count': recognized,
+                'faces': results
+            }
             
         except Exception as e:
-            print(f"识别过程发生错误: {str(e)}")
+            logger.error("多人脸识别发生错误: %s", e)
             return False, str(e)
 
-    def _get_face_encoding_insightface(self, image: np.ndarray) -> Optional[np.ndarray]:
-        """统一的InsightFace特提取方法"""
+    def _select_faces(self, detection: FaceDetectionResult, image: np.ndarray) -> list:
+        """筛选质量合格的人脸，最多 CROWD_MAX_FACES 个"""
+        return [
+            face for face in detection.faces
+            if face.det_score >= 0.6 and to_dlib_location(face.bbox, image.shape) is not None
+        ][:CROWD_MAX_FACES]
+
+    def _identify_faces(self, image: np.ndarray, faces: list, gallery,
+                        profile: DlibProfile) -> List[Tuple[bool, Union[Dict, str]]]:
+        """对多张人脸批量提取特征、批量匹配，并逐个人脸投票"""
+        # 1. 各算法并发地对所有人脸做一次批量特征提取
+        futures = {
+            method: self._executor.submit(self._extract_crowd_embeddings, method, image, faces, profile)
+            for method in self.METHODS
+        }
+        embeddings = {}
+        for method, future in futures.items():
+            try:
+                embeddings[method] = future.result()
+                count(embeddings_total, method, 'success', amount=len(faces))
+            except Exception as e:
+                count(embeddings_total, method, 'failure', amount=len(faces))
+                logger.error("%s 批量特征提取错误: %s", method, e)
+        
+        # 2. 每个算法一次批量匹配
+        candidates = {}
+        for method, matrix in embeddings.items():
+            with span('match_batch', method):
+                candidates[method] = gallery.search_batch(method, matrix, top_k=1)
+        
+        # 3. 逐个人脸投票
+        results = []
+        with span('vote'):
+            for i in range(len(faces)):
+                method_results = {
+                    method: self._match_result(method, candidates[method][i], gallery)
+                    for method in candidates
+                }
+                results.append(self._vote(method_results, len(candidates)))
+        return results
+
+    def create_stream_tracker(self) -> FaceTracker:
+        """为一个视频流连接创建人脸跟踪器"""
+        return FaceTracker(
+            iou_threshold=TRACK_IOU_THRESHOLD,
+            max_misses=TRACK_MAX_MISSES,
+            detect_every=STREAM_DETECT_EVERY,
+            refresh_interval=STREAM_REFRESH_INTERVAL,
+            quality_gain=STREAM_QUALITY_GAIN
+        )
+
+    @timed_operation('recognize_stream')
+    def recognize_stream_frame(self, tracker: FaceTracker, image_data: bytes,
+                               profile: Optional[str] = None) -> Tuple[bool, Union[Dict, str]]:
+        """视频流识别：跟踪人脸，只对新出现、质量提升或超过刷新间隔的轨迹重新提取特征和匹配"""
         try:
-            print("InsightFace处理中...")
+            dlib_profile = recognize_profile(profile)
+            image = self._process_image(image_data)
+            if image is None:
+                return False, "图像处理失败"
             
-            # 1. 使用固定的配置
-            self.insight_model.prepare(
-                ctx_id=0,
-                det_thresh=0.6,      # 统一的阈值
-                det_size=(640, 640)  # 统一的尺寸
-            )
+            now = time.monotonic()
+            
+            # 1. 每 N 帧检测一次，其余帧沿用已有轨迹
+            detected = tracker.next_frame()
+            pending = []
+            if detected:
+                faces = self._select_faces(self._detect_faces(image, exhaustive=True), image)
+                tracks = tracker.update(faces, image.shape, now)
+                pending = [track for track in tracks if tracker.needs_recognition(track, now)]
+            
+            # 2. 只对需要的轨迹重新识别
+            if pending and self._synced_gallery().user_ids:
+                results = self._identify_faces(image, [track.face for track in pending], self.gallery, dlib_profile)
+                for track, result in zip(pending, results):
+                    tracker.record(track, result, now)
+            
+            return True, {
+                'frame': tracker.frame_index,
+                'detected': detected,
+                'reembedded': len(pending),
+                'tracks': [track.to_dict() for track in tracker.tracks if track.misses == 0]
+            }
+            
+        except Exception as e:
+            logger.error("视频流识别发生错误: %s", e)
+            return False, str(e)
+
+    def _extract_crowd_embeddings(self, method: str, image: np.ndarray, faces: list,
+                                  profile: DlibProfile) -> np.ndarray:
+        """对多张人脸做一次批量特征提取，返回 (人脸数, 特征维度) 的矩阵"""
+        with span('embed_batch', method):
+            if method == 'insightface':
+                size = self.insight_rec_model.input_size[0]
+                crops = [face_align.norm_crop(image, landmark=face.kps, image_size=size) for face in faces]
+                if 'insightface' in self._batchers:
+                    return np.stack(self._batchers['insightface'].submit_many(crops))
+                return self._arcface_forward(crops)
+        
+            if method == 'facenet':
+                tensors = [
+                    self._preprocess_facenet_face(self._crop_facenet_face(image, face.bbox.astype(int)))[0]
+                    for face in faces
+                ]
+                if 'facenet' in self._batchers:
+                    return np.stack(self._batchers['facenet'].submit_many(tensors))
+                return self._facenet_forward(tensors)
+        
+            if method == 'face_recognition':
+                region, locations = self._dlib_region(
+                    image, [to_dlib_location(face.bbox, image.shape) for face in faces], profile)
+                with self._model_slots[method]:
+                    encodings = face_recognition.face_encodings(
+                        region,
+                        known_face_locations=locations,
+                        num_jitters=profile.num_jitters,
+                        model=profile.landmark_model
+                    )
+                return np.stack(encodings)
+        
+            raise ValueError(f"未知的方法: {method}")
+
+    def _get_face_encoding_insightface(self, image: np.ndarray,
+                                       detection: FaceDetectionResult) -> Optional[np.ndarray]:
+        """统一的InsightFace特提取方法"""
+        try:
+            # 1. 使用共享检测结果中的最佳人脸
+            best_face = detection.best
+            if best_face is None:
+                logger.debug("InsightFace: 未检测到人脸")
+                return None
             
-            # 2. 直接检测
-            faces = self.insight_model.get(image)
+            if best_face.det_score < 0.6:  # 统一的质量阈值
+                logger.debug("InsightFace: 人脸质量得分过低: %.4f", best_face.det_score)
+                return None
             
-            if faces:
-                # 3. 选择最佳人脸
-                best_face = max(faces, key=lambda x: x.det_score)
-                if best_face.det_score < 0.6:  # 统一的质量阈值
-                    print(f"人质量得分过低: {best_face.det_score:.4f}")
-                    return None
-                    
-                # 4. 特征提取和归一化
-                embedding = best_face.embedding
-                embedding = embedding / np.linalg.norm(embedding)
-                
-                print(f"检测到高质量人脸，得分: {best_face.det_score:.4f}")
-                return embedding
+            # 2. 特征提取和归一化（只运行ArcFace识别模型）
+            embedding = self._embed_arcface(image, best_face)
+            embedding = embedding / np.linalg.norm(embedding)
             
-            print("未检测到人脸")
-            return None
+            logger.debug("InsightFace: 检测到高质量人脸，得分: %.4f", best_face.det_score)
+            return embedding
             
         except Exception as e:
-            print(f"InsightFace处理错误: {str(e)}")
+            logger.error("InsightFace处理错误: %s", e)
             return None
 
-    def _get_face_encoding_face_recognition(self, image: np.ndarray) -> Optional[np.ndarray]:
-        """统一的face_recognition特征提取方法"""
+    def _enhance_image(self, image: np.ndarray) -> np.ndarray:
+        """face_recognition 的图像预处理：转换为RGB并做直方图均衡化"""
+        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        
+        lab = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2LAB)
+        l, a, b = cv2.split(lab)
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        cl = clahe.apply(l)
+        enhanced_lab = cv2.merge((cl,a,b))
+        return cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2RGB)
+
+    def _dlib_region(self, image: np.ndarray, locations: list, profile: DlibProfile) -> Tuple[np.ndarray, list]:
+        """按配置档准备 face_recognition 的输入图像，返回 (RGB图像, 相对该图像的人脸位置)"""
+        if profile.enhance == 'full':
+            return self._enhance_image(image), locations
+        if profile.enhance == 'none' or not locations:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2RGB), locations
+        
+        # crop: 只对包含所有人脸的区域（四周各外扩半个人脸）做直方图均衡化，耗时与像素数成正比
+        height, width = image.shape[:2]
+        top = min(location[0] for location in locations)
+        right = max(location[1] for location in locations)
+        bottom = max(location[2] for location in locations)
+        left = min(location[3] for location in locations)
+        margin_y, margin_x = (bottom - top) // 2, (right - left) // 2
+        top, bottom = max(0, top - margin_y), min(height, bottom + margin_y)
+        left, right = max(0, left - margin_x), min(width, right + margin_x)
+        region = self._enhance_image(np.ascontiguousarray(image[top:bottom, left:right]))
+        return region, [(t - top, r - left, b - top, l - left) for t, r, b, l in locations]
+
+    def _get_face_encoding_face_recognition(self, image: np.ndarray, detection: FaceDetectionResult,
+                                            profile: Optional[DlibProfile] = None) -> Optional[np.ndarray]:
+        """统一的face_recognition特征提取方法（检测回退、图像增强、jitters 和关键点模型由配置档决定）"""
         try:
-            # 1. 图像预处理
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # 1.1 直方图均衡化
-            lab = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2LAB)
-            l, a, b = cv2.split(lab)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            cl = clahe.apply(l)
-            enhanced_lab = cv2.merge((cl,a,b))
-            enhanced_image = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2RGB)
-            
-            # 2. 人脸检测
-            # 2.1 使用CNN检测器
-            locations = face_recognition.face_locations(
-                enhanced_image,
-                model="cnn",
-                number_of_times_to_upsample=1
-            )
+            profile = profile or recognize_profile()
             
-            # 2.2 如果CNN失败，使用HOG检测器
-            if not locations:
-                print("CNN检测失败，尝试HOG检测器...")
-                locations = face_recognition.face_locations(
-                    enhanced_image,
-                    model="hog",
-                    number_of_times_to_upsample=2
-                )
+            # 1. 人脸位置
+            # 1.1 直接使用共享检测结果
+            locations = detection.dlib_locations()
+            
+            # 1.2 共享检测失败时按配置档依次回退到dlib自身的检测器（在整帧上运行）
+            if not locations and profile.fallback:
+                if profile.enhance == 'none':
+                    enhanced_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                else:
+                    enhanced_image = self._enhance_image(image)
+                for model, upsample in profile.fallback:
+                    logger.debug("共享检测未找到人脸，尝试 %s 检测器 (upsample=%d)...", model, upsample)
+                    locations = face_recognition.face_locations(
+                        enhanced_image,
+                        model=model,
+                        number_of_times_to_upsample=upsample
+                    )
+                    if locations:
+                        break
+                region_locations = locations
+            else:
+                # 2. 图像预处理（RGB + 直方图均衡化，整帧或只处理人脸区域）
+                enhanced_image, region_locations = self._dlib_region(image, locations, profile)
             
             if not locations:
-                print("未检测到人脸")
+                logger.debug("face_recognition: 未检测到人脸")
                 return None
             
             # 3. 选择最佳人脸
             best_location = None
+            best_region_location = None
             best_quality = 0
             
-            for location in locations:
-                top, right, bottom, left = location
+            for location, region_location in zip(locations, region_locations):
+                top, right, bottom, left = region_location
                 face_image = enhanced_image[top:bottom, left:right]
+                top, right, bottom, left = location
                 
                 # 3.1 计算质量分数
                 quality_score = self._evaluate_face_quality_score(face_image)
@@ -514,8 +1113,8 @@ class MultiFaceService:
                 size_score = min(face_size / (150 * 150), 1.0)
                 
                 # 3.3 计算位置分数
-                center_x = (left + right) / 2 / enhanced_image.shape[1]
-                center_y = (top + bottom) / 2 / enhanced_image.shape[0]
+                center_x = (left + right) / 2 / image.shape[1]
+                center_y = (top + bottom) / 2 / image.shape[0]
                 position_score = 1 - (abs(0.5 - center_x) + abs(0.5 - center_y))
                 
                 # 3.4 综合评分
@@ -528,21 +1127,22 @@ class MultiFaceService:
                 if total_score > best_quality:
                     best_quality = total_score
                     best_location = location
+                    best_region_location = region_location
             
             if best_quality < 0.5:
-                print(f"最佳人脸质量得分过低: {best_quality:.4f}")
+                logger.debug("face_recognition: 最佳人脸质量得分过低: %.4f", best_quality)
                 return None
             
             # 4. 特征提取
             encodings = face_recognition.face_encodings(
                 enhanced_image,
-                known_face_locations=[best_location],
-                num_jitters=5,     # 使用固定的抖动次数
-                model="large"      # 使用大模
+                known_face_locations=[best_region_location],
+                num_jitters=profile.num_jitters,
+                model=profile.landmark_model
             )
             
             if not encodings:
-                print("特征提取失败")
+                logger.debug("face_recognition: 特征提取失败")
                 return None
             
             encoding = encodings[0]
@@ -550,158 +1150,105 @@ class MultiFaceService:
             # 5. 特征归一化
             encoding = encoding / np.linalg.norm(encoding)
             
-            print(f"""
-            face_recognition特征提取成功:
-            - 质量得分: {best_quality:.4f}
-            - 人脸位置: {best_location}
-            - 人脸大小: {best_location[1]-best_location[3]}x{best_location[2]-best_location[0]}
-            """)
+            top, right, bottom, left = best_location
+            logger.debug("face_recognition特征提取成功: 质量得分=%.4f, 人脸位置=%s, 人脸大小=%dx%d",
+                         best_quality, best_location, right - left, bottom - top)
             
             return encoding
             
         except Exception as e:
-            print(f"face_recognition处理错误: {str(e)}")
+            logger.error("face_recognition处理错误: %s", e)
             return None
 
-    def _get_face_encoding_facenet(self, image: np.ndarray) -> Optional[np.ndarray]:
-        """完全重写的FaceNet特征提取方法"""
+    def _crop_facenet_face(self, image: np.ndarray, bbox: np.ndarray) -> np.ndarray:
+        """按检测框外扩30%裁剪人脸，并转换为RGB"""
+        x1, y1, x2, y2 = bbox
+        margin = int(min(x2-x1, y2-y1) * 0.3)
+        face_img = image[
+            max(0, y1-margin):min(image.shape[0], y2+margin),
+            max(0, x1-margin):min(image.shape[1], x2+margin)
+        ]
+        return cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
+
+    def _preprocess_facenet_face(self, face_img: np.ndarray) -> np.ndarray:
+        """优化的人脸预处理"""
         try:
-            print("\n=== FaceNet特征提取开始 ===")
+            # 1. 调整大小
+            face_resized = cv2.resize(face_img, (160, 160))
             
-            def preprocess_face(face_img: np.ndarray) -> torch.Tensor:
-                """优化的人脸预处理"""
-                try:
-                    print("\n1. 开始预处理...")
-                    # 1. 调整大小
-                    face_resized = cv2.resize(face_img, (160, 160))
-                    print(f"- 调整大小后: shape={face_resized.shape}")
-                    
-                    # 2. 转换为float32并归一化
-                    face_float = face_resized.astype(np.float32) / 255.0
-                    print(f"- 归一化后范围: [{face_float.min():.4f}, {face_float.max():.4f}]")
-                    
-                    # 3. 标准化
-                    mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-                    std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-                    face_normalized = (face_float - mean) / std
-                    print(f"- 标准化后范围: [{face_normalized.min():.4f}, {face_normalized.max():.4f}]")
-                    
-                    # 4. 转换为tensor
-                    face_tensor = torch.from_numpy(face_normalized).permute(2, 0, 1).unsqueeze(0)
-                    print(f"- 最终tensor: shape={face_tensor.shape}, dtype={face_tensor.dtype}")
-                    
-                    return face_tensor
-                except Exception as e:
-                    print(f"预处理错误: {str(e)}")
-                    raise
+            # 2. 转换为float32并归一化
+            face_float = face_resized.astype(np.float32) / 255.0
             
-            # 1. 使用 InsightFace 的检测器进行人脸检测
-            print("\n2. 人脸检测...")
-            faces = self.insight_model.get(image)
+            # 3. 标准化
+            mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+            std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+            face_normalized = (face_float - mean) / std
+            
+            # 4. 转换为 NCHW
+            face_tensor = np.ascontiguousarray(face_normalized.transpose(2, 0, 1)[None])
+            logger.debug("FaceNet 预处理: 输入 %s, 标准化后 %s", face_img.shape, ArrayStats(face_tensor))
+            
+            return face_tensor
+        except Exception as e:
+            logger.error("预处理错误: %s", e)
+            raise
+
+    def _get_face_encoding_facenet(self, image: np.ndarray,
+                                   detection: FaceDetectionResult) -> Optional[np.ndarray]:
+        """完全重写的FaceNet特征提取方法"""
+        try:
+            # 1. 使用共享的检测结果
+            faces = detection.faces
             
             if faces:
-                print(f"- 检测到 {len(faces)} 个人脸")
                 # 2. 选择最佳人脸
-                best_face = max(faces, key=lambda x: x.det_score)
+                best_face = detection.best
                 bbox = best_face.bbox.astype(int)
-                det_score = best_face.det_score
-                print(f"- 最佳人脸得分: {det_score:.4f}")
+                logger.debug("FaceNet: 检测到 %d 个人脸, 最佳人脸得分: %.4f", len(faces), best_face.det_score)
                 
-                # 3. 提取人脸区域
-                x1, y1, x2, y2 = bbox
-                margin = int(min(x2-x1, y2-y1) * 0.3)
-                face_img = image[
-                    max(0, y1-margin):min(image.shape[0], y2+margin),
-                    max(0, x1-margin):min(image.shape[1], x2+margin)
-                ]
-                print(f"- 提取的人脸区域: shape={face_img.shape}")
+                # 3. 提取人脸区域（RGB）
+                face_rgb = self._crop_facenet_face(image, bbox)
                 
-                # 4. 转换为RGB
-                face_rgb = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
+                # 4. 特征提取
+                face_tensor = self._preprocess_facenet_face(face_rgb)
+                embedding = self._embed_facenet(face_tensor)
+                logger.debug("FaceNet 原始特征 (%s): %s", self.facenet.name, ArrayStats(embedding))
                 
-                # 5. 特征提取
-                print("\n3. 开始特征提取...")
-                face_tensor = preprocess_face(face_rgb)
+                # 5. 归一化
+                embedding = embedding.flatten()
+                embedding = embedding / np.linalg.norm(embedding)
+                logger.debug("FaceNet 归一化后特征: %s", ArrayStats(embedding))
                 
-                with torch.no_grad():
-                    # 检查模型状态
-                    print(f"\n4. 模型息:")
-                    print(f"- 模型类型: {type(self.facenet)}")
-                    print(f"- 模型设备: {next(self.facenet.parameters()).device}")
-                    print(f"- 模型状态: {'eval' if self.facenet.training == False else 'train'}")
-                    
-                    # 提取特征
-                    embedding = self.facenet(face_tensor)
-                    print(f"\n5. 原始特征:")
-                    print(f"- shape: {embedding.shape}")
-                    print(f"- range: [{embedding.min().item():.4f}, {embedding.max().item():.4f}]")
-                    print(f"- mean: {embedding.mean().item():.4f}")
-                    print(f"- std: {embedding.std().item():.4f}")
-                    
-                    # 转换为numpy并归一化
-                    embedding = embedding.cpu().numpy().flatten()
-                    embedding = embedding / np.linalg.norm(embedding)
-                    
-                    print(f"\n6. 归一化后特征:")
-                    print(f"- shape: {embedding.shape}")
-                    print(f"- range: [{embedding.min():.4f}, {embedding.max():.4f}]")
-                    print(f"- mean: {embedding.mean():.4f}")
-                    print(f"- std: {embedding.std():.4f}")
-                    print(f"- norm: {np.linalg.norm(embedding):.4f}")
-                    
-                    return embedding
-            
-            print("未检测到人脸")
-            return None
+                return embedding
             
-        except Exception as e:
-            print(f"FaceNet处理错误: {str(e)}")
-            print(f"错误类型: {type(e)}")
-            print(f"错误位置: {e.__traceback__.tb_frame.f_code.co_filename}:{e.__traceback__.tb_lineno}")
+            logger.debug("FaceNet: 未检测到人脸")
             return None
-
-    def _rotate_tensor(self, tensor: torch.Tensor, angle: float) -> Optional[torch.Tensor]:
-        """辅助函数：旋转图像张量"""
-        try:
-            # 转换为PIL图像
-            image = transforms.ToPILImage()(tensor)
-            # 转
-            rotated = image.rotate(angle, expand=True)
-            # 转回tensor
-            return transforms.ToTensor()(rotated)
+            
         except Exception as e:
-            print(f"图像旋转失败: {str(e)}")
+            logger.error("FaceNet处理错误: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             return None
 
     def _compare_facenet_embeddings(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """深度优化的特征比对方法"""
         try:
-            print("\n=== 开始特征比对 ===")
-            
             # 1. 基础验证
             if embedding1 is None or embedding2 is None:
-                print("特征向量为空")
+                logger.warning("特征向量为空")
                 return 0.0
             
-            print(f"\n1. 特征向量信息:")
-            print(f"- 特征1: shape={embedding1.shape}, dtype={embedding1.dtype}")
-            print(f"- 特征2: shape={embedding2.shape}, dtype={embedding2.dtype}")
-            print(f"- 特征1范围: [{embedding1.min():.4f}, {embedding1.max():.4f}]")
-            print(f"- 特征2范围: [{embedding2.min():.4f}, {embedding2.max():.4f}]")
-            print(f"- 特征1均值: {embedding1.mean():.4f}")
-            print(f"- 特征2均值: {embedding2.mean():.4f}")
+            logger.debug("特征比对: 特征1 %s, 特征2 %s", ArrayStats(embedding1), ArrayStats(embedding2))
             
             if embedding1.shape != embedding2.shape:
-                print(f"特征维度不匹配")
+                logger.warning("特征维度不匹配: %s vs %s", embedding1.shape, embedding2.shape)
                 return 0.0
             
             # 2. 检查特征向量是否包含 NaN 或 Inf
             if np.any(np.isnan(embedding1)) or np.any(np.isnan(embedding2)):
-                print("特征向量包含 NaN")
+                logger.warning("特征向量包含 NaN")
                 return 0.0
             
             if np.any(np.isinf(embedding1)) or np.any(np.isinf(embedding2)):
-                print("特征向量包含 Inf")
+                logger.warning("特征向量包含 Inf")
                 return 0.0
             
             # 3. 确保特征向量已经归一化
@@ -709,37 +1256,27 @@ class MultiFaceService:
             norm2 = np.linalg.norm(embedding2)
             
             if norm1 == 0 or norm2 == 0:
-                print("特征向量范数为0")
+                logger.warning("特征向量范数为0")
                 return 0.0
             
             embedding1_norm = embedding1 / norm1
             embedding2_norm = embedding2 / norm2
             
-            print(f"\n2. 归一化后的特征:")
-            print(f"- 特征1范数: {np.linalg.norm(embedding1_norm):.4f}")
-            print(f"- 特征2范数: {np.linalg.norm(embedding2_norm):.4f}")
-            
-            # 4. 计算相似度
+            # 4. 计算相似度，并归一化到 [0,1] 范围
             cosine_sim = np.dot(embedding1_norm, embedding2_norm)
-            print(f"\n3. 原始余弦相似度: {cosine_sim:.4f}")
-            
-            # 5. 归一化到 [0,1] 范围
             similarity = (cosine_sim + 1) / 2
-            print(f"4. 最终相似度: {similarity:.4f}")
-            
-            # 6. 添加额外的相似度检查
-            l2_dist = np.linalg.norm(embedding1_norm - embedding2_norm)
-            print(f"5. L2距离: {l2_dist:.4f}")
             
-            # 7. 检查特征向量是否完全相同
-            is_identical = np.allclose(embedding1_norm, embedding2_norm, rtol=1e-5, atol=1e-8)
-            print(f"6. 特征向量是否完全相同: {is_identical}")
+            # 5. 额外的比对诊断（L2距离、是否完全相同）只在 DEBUG 级别计算
+            if logger.isEnabledFor(logging.DEBUG):
+                l2_dist = np.linalg.norm(embedding1_norm - embedding2_norm)
+                is_identical = np.allclose(embedding1_norm, embedding2_norm, rtol=1e-5, atol=1e-8)
+                logger.debug("余弦相似度=%.4f, 最终相似度=%.4f, L2距离=%.4f, 完全相同=%s",
+                             cosine_sim, similarity, l2_dist, is_identical)
             
             return float(similarity)
             
         except Exception as e:
-            print(f"特征比对错误: {str(e)}")
-            print(f"错误类型: {type(e)}")
+            logger.error("特征比对错误: %s", e)
             return 0.0
 
     def _evaluate_feature_quality(self, embedding: np.ndarray) -> float:
@@ -771,48 +1308,30 @@ class MultiFaceService:
             return float(quality_score)
             
         except Exception as e:
-            print(f"特征质量评估错误: {str(e)}")
+            logger.error("特征质量评估错误: %s", e)
             return 0.5  # 返回中等质量分数作为默认值
 
     def _match_face_facenet(self, encoding: np.ndarray, user_encodings: Dict[str, np.ndarray], 
                            threshold: float = 0.4) -> Tuple[bool, float]:
         """优化的FaceNet人脸匹配方法"""
         try:
-            print("\n=== 开始FaceNet匹配 ===")
-            
             if 'facenet' not in user_encodings:
-                print("用户特征中没有facenet特征")
+                logger.debug("用户特征中没有facenet特征")
                 return False, 0.0
             
             stored_encoding = user_encodings['facenet']
             
             # 1. 基本验证
             if encoding is None or stored_encoding is None:
-                print("特征向量为空")
+                logger.warning("特征向量为空")
                 return False, 0.0
             
-            # 2. 打印特征信息
-            print(f"""
-            当前特征:
-            - shape: {encoding.shape}
-            - range: [{encoding.min():.4f}, {encoding.max():.4f}]
-            - mean: {encoding.mean():.4f}
-            - std: {encoding.std():.4f}
-            - norm: {np.linalg.norm(encoding):.4f}
-            """)
-            
-            print(f"""
-            存储特征:
-            - shape: {stored_encoding.shape}
-            - range: [{stored_encoding.min():.4f}, {stored_encoding.max():.4f}]
-            - mean: {stored_encoding.mean():.4f}
-            - std: {stored_encoding.std():.4f}
-            - norm: {np.linalg.norm(stored_encoding):.4f}
-            """)
+            # 2. 特征信息（统计量只在 DEBUG 级别输出时计算）
+            logger.debug("FaceNet匹配: 当前特征 %s, 存储特征 %s", ArrayStats(encoding), ArrayStats(stored_encoding))
             
             # 3. 维度检查
             if encoding.shape != stored_encoding.shape:
-                print(f"特征维度不匹配: {encoding.shape} vs {stored_encoding.shape}")
+                logger.warning("特征维度不匹配: %s vs %s", encoding.shape, stored_encoding.shape)
                 return False, 0.0
             
             # 4. 计算相似度
@@ -825,20 +1344,13 @@ class MultiFaceService:
             # 6. 置信度评估
             is_match = similarity > adjusted_threshold
             
-            print(f"""
-            匹配结果:
-            - 原始相似度: {similarity:.4f}
-            - 特征质量: {quality_score:.4f}
-            - 基准阈值: {threshold:.4f}
-            - 调整后阈值: {adjusted_threshold:.4f}
-            - 匹配结果: {'✓' if is_match else '✗'}
-            """)
+            logger.debug("FaceNet匹配结果: 原始相似度=%.4f, 特征质量=%.4f, 基准阈值=%.4f, 调整后阈值=%.4f, 匹配=%s",
+                         similarity, quality_score, threshold, adjusted_threshold, is_match)
             
             return is_match, similarity
             
         except Exception as e:
-            print(f"FaceNet匹配错误: {str(e)}")
-            print(f"错误类型: {type(e)}")
+            logger.error("FaceNet匹配错误: %s", e)
             return False, 0.0
 
     def _calculate_feature_quality(self, embedding: np.ndarray) -> float:
@@ -870,8 +1382,8 @@ class MultiFaceService:
             return float(quality_score)
             
         except Exception as e:
-            print(f"特征质量评估错误: {str(e)}")
+            logger.error("特征质量评估错误: %s", e)
             return 0.0
 
-# 在文件最后添加这行代码
+# 模型在 load() / load_in_background() 中加载
 face_service = MultiFaceService()
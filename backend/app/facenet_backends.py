@@ -0,0 +1,153 @@
+import os
+import numpy as np
+from typing import Optional
+
+# FaceNet（InceptionResnetV1, VGGFace2）的输入尺寸
+FACENET_INPUT_SIZE = 160
+FACENET_EMBEDDING_DIM = 512
+
+
+def load_eager_facenet(weights_path: Optional[str] = None):
+    """加载 PyTorch 版 FaceNet（只有 eager / torchscript 后端和导出脚本需要 torch）
+
+    优先使用本地权重文件，不存在时由 facenet_pytorch 下载（或读取 torch hub 缓存）。
+    """
+    from facenet_pytorch import InceptionResnetV1
+    if weights_path and os.path.exists(weights_path):
+        import torch
+        model = InceptionResnetV1(classify=False, device='cpu')
+        state_dict = torch.load(weights_path, map_location='cpu', weights_only=True)
+        # 本地权重包含分类层（classify=True 时保存），提取特征时不需要
+        model.load_state_dict({k: v for k, v in state_dict.items() if not k.startswith('logits.')})
+        return model.float().eval()
+    print(f"本地 FaceNet 权重不存在: {weights_path}，使用 facenet_pytorch 预训练权重")
+    return InceptionResnetV1(pretrained='vggface2', classify=False, device='cpu').float().eval()
+
+
+class FaceNetBackend:
+    """FaceNet 推理后端：输入 (N, 3, 160, 160) float32，输出 (N, 512) 未归一化特征"""
+
+    name = ''
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def set_threads(self, threads: int):
+        """调整推理线程数（多进程模式下 fork 之后调用）"""
+        pass
+
+
+class EagerFaceNetBackend(FaceNetBackend):
+    """PyTorch eager 推理"""
+
+    name = 'eager'
+
+    def __init__(self, threads: Optional[int] = None, model=None, weights_path: Optional[str] = None):
+        import torch
+        self._torch = torch
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = model if model is not None else load_eager_facenet(weights_path)
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        with self._torch.no_grad():
+            return self.model(self._torch.from_numpy(np.ascontiguousarray(batch))).numpy()
+
+    def set_threads(self, threads: int):
+        self._torch.set_num_threads(threads)
+
+
+class TorchScriptFaceNetBackend(FaceNetBackend):
+    """TorchScript（trace + freeze）推理，没有 Python 层的调度开销"""
+
+    name = 'torchscript'
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        import torch
+        self._torch = torch
+        if threads:
+            torch.set_num_threads(threads)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"TorchScript 模型不存在: {path}，请先运行 scripts/export_facenet.py")
+        self.model = torch.jit.load(path, map_location='cpu').eval()
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        with self._torch.no_grad():
+            return self.model(self._torch.from_numpy(np.ascontiguousarray(batch))).numpy()
+
+    def set_threads(self, threads: int):
+        self._torch.set_num_threads(threads)
+
+
+class OnnxFaceNetBackend(FaceNetBackend):
+    """ONNX Runtime 推理，不需要加载 torch"""
+
+    name = 'onnx'
+
+    def __init__(self, path: str, threads: Optional[int] = None, session_options=None):
+        import onnxruntime
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"ONNX 模型不存在: {path}，请先运行 scripts/export_facenet.py")
+        options = session_options
+        if options is None:
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if threads:
+                options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, sess_options=options,
+                                                    providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+
+
+def create_facenet_backend(name: str, onnx_path: str, torchscript_path: str,
+                           threads: Optional[int] = None, session_options=None,
+                           weights_path: Optional[str] = None) -> FaceNetBackend:
+    """按名称创建后端；导出的模型文件不存在时退回 eager（session_options 只用于 onnx 后端）"""
+    try:
+        if name == 'onnx':
+            return OnnxFaceNetBackend(onnx_path, threads, session_options)
+        if name == 'torchscript':
+            return TorchScriptFaceNetBackend(torchscript_path, threads)
+        if name != 'eager':
+            print(f"未知的 FaceNet 后端: {name}，使用 eager")
+    except FileNotFoundError as e:
+        print(f"{str(e)}，使用 eager")
+    return EagerFaceNetBackend(threads, weights_path=weights_path)
+
+
+def export_torchscript(model, save_path: str):
+    """trace 并 freeze 为 TorchScript"""
+    import torch
+    dummy_input = torch.randn(1, 3, FACENET_INPUT_SIZE, FACENET_INPUT_SIZE)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, dummy_input)
+        frozen = torch.jit.freeze(traced)
+    frozen.save(save_path)
+    print(f"TorchScript 模型已保存到: {save_path}")
+
+
+def export_onnx(model, save_path: str):
+    """导出 ONNX（与 scripts/convert_models.py 相同的导出参数，batch 维度可变）"""
+    import torch
+    import onnx
+    dummy_input = torch.randn(1, 3, FACENET_INPUT_SIZE, FACENET_INPUT_SIZE)
+    torch.onnx.export(
+        model,
+        dummy_input,
+        save_path,
+        export_params=True,
+        opset_version=11,
+        do_constant_folding=True,
+        input_names=['input'],
+        output_names=['output'],
+        dynamic_axes={
+            'input': {0: 'batch_size'},
+            'output': {0: 'batch_size'}
+        }
+    )
+    onnx_model = onnx.load(save_path)
+    onnx.checker.check_model(onnx_model)
+    print(f"ONNX 模型已保存到: {save_path}")
@@ -0,0 +1,66 @@
+import threading
+import time
+import cv2
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+def frame_signature(image_data: bytes, size: int = 32) -> Optional[np.ndarray]:
+    """帧的低分辨率灰度缩略图：JPEG 按 1/4 尺寸解码后再缩放，对噪声和压缩伪影不敏感"""
+    nparr = np.frombuffer(image_data, np.uint8)
+    gray = cv2.imdecode(nparr, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        return None
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+class FrameDeduplicator:
+    """按客户端记录最近一次实际处理的帧和结果，新帧与它几乎相同时复用结果
+
+    比较对象是上一次处理的帧而不是上一次收到的帧，缓慢的变化会累积并最终触发重新识别；
+    结果超过 max_age 秒后也会重新识别（例如期间有新用户注册）。
+    """
+
+    def __init__(self, threshold: float = 3.0, max_age: float = 5.0, max_clients: int = 1024):
+        self.threshold = threshold
+        self.max_age = max_age
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.suppressed = 0
+        self.processed = 0
+
+    def lookup(self, client_id: str, signature: Optional[np.ndarray]) -> Optional[Any]:
+        """帧没有明显变化时返回上次的结果，否则返回 None"""
+        if signature is None:
+            return None
+        with self._lock:
+            item = self._clients.get(client_id)
+            if item is not None:
+                last_signature, result, processed_at = item
+                # 平均每像素灰度差
+                if time.monotonic() - processed_at <= self.max_age and \
+                        np.mean(np.abs(signature - last_signature)) < self.threshold:
+                    self._clients.move_to_end(client_id)
+                    self.suppressed += 1
+                    return result
+            self.processed += 1
+            return None
+
+    def store(self, client_id: str, signature: Optional[np.ndarray], result: Any):
+        """记录一次实际处理的帧和结果"""
+        if signature is None:
+            return
+        with self._lock:
+            self._clients[client_id] = (signature, result, time.monotonic())
+            self._clients.move_to_end(client_id)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+
+    def stats(self):
+        return {
+            'clients': len(self._clients),
+            'processed': self.processed,
+            'suppressed': self.suppressed
+        }
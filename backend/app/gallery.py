@@ -0,0 +1,471 @@
+import os
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+from .ann_index import IVFIndex
+from .config import ANN_ENABLED, ANN_MIN_GALLERY_SIZE, ANN_NPROBE
+from .diagnostics import get_logger
+
+logger = get_logger("gallery")
+
+
+def similarity_from_cosine(method: str, cosine: np.ndarray) -> np.ndarray:
+    """将余弦相似度转换为各算法使用的相似度（与 _calculate_optimized_similarity 保持一致）"""
+    if method == 'insightface':
+        # InsightFace 直接使用余弦相似度
+        return cosine
+    if method == 'face_recognition':
+        # 单位向量的欧氏距离: ||a - b|| = sqrt(2 - 2cos)
+        distance = np.sqrt(np.maximum(2.0 - 2.0 * cosine, 0.0))
+        return 1.0 / (1.0 + distance)
+    if method == 'facenet':
+        # 调整到 [0,1] 范围
+        return (cosine + 1.0) / 2.0
+    raise ValueError(f"未知的方法: {method}")
+
+
+def normalize_embedding(embedding: np.ndarray) -> Optional[np.ndarray]:
+    """转换为 float32 单位向量，无效特征返回 None"""
+    vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    if norm == 0 or not np.isfinite(norm):
+        return None
+    return vector / norm
+
+
+def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """得分最高的 top_k 个下标（降序），跳过被屏蔽（-inf）的行"""
+    k = min(top_k, scores.shape[0])
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(scores.shape[0])
+    top = top[np.argsort(-scores[top])]
+    return top[np.isfinite(scores[top])]
+
+
+class GalleryView:
+    """特征库在某一时刻的只读视图：内存映射的行块 + 行id + 有效行掩码（不复制特征数据）
+
+    同一用户重复注册时存储中会追加新行，旧行在掩码中标记为无效。
+    """
+
+    def __init__(self, method: str, blocks: List[np.ndarray], ids: np.ndarray,
+                 live: np.ndarray, has_dead: bool = False, ann: Optional[IVFIndex] = None):
+        self.method = method
+        self.blocks = blocks
+        self.ids = ids
+        self.live = live
+        self.has_dead = has_dead
+        self.ann = ann
+        self.count = ids.shape[0]
+        self.dim = blocks[0].shape[1] if blocks else None
+        self._offsets = np.cumsum([0] + [block.shape[0] for block in blocks])
+
+    def _cosine(self, vectors: np.ndarray) -> np.ndarray:
+        """vectors (m, dim) 与全部行的余弦相似度 (m, count)，每个分段一次矩阵乘法"""
+        if len(self.blocks) == 1:
+            return np.asarray(vectors @ self.blocks[0].T)
+        return np.hstack([np.asarray(vectors @ block.T) for block in self.blocks])
+
+    def gather(self, rows: np.ndarray) -> np.ndarray:
+        """按行号取特征"""
+        if len(self.blocks) == 1:
+            return np.asarray(self.blocks[0][rows])
+        block_ids = np.searchsorted(self._offsets, rows, side='right') - 1
+        result = np.empty((rows.shape[0], self.dim), dtype=np.float32)
+        for block_id in np.unique(block_ids):
+            mask = block_ids == block_id
+            result[mask] = self.blocks[block_id][rows[mask] - self._offsets[block_id]]
+        return result
+
+    def search(self, probe: np.ndarray, top_k: int = 1) -> List[Tuple[str, float]]:
+        """一次矩阵-向量乘法为所有用户打分，返回相似度最高的 top_k 个 (user_id, similarity)
+
+        有 ann 索引时只对候选行做精确打分。
+        """
+        if self.count == 0:
+            return []
+
+        vector = normalize_embedding(probe)
+        if vector is None or vector.shape[0] != self.dim:
+            logger.warning("%s 查询特征无效或维度不匹配", self.method)
+            return []
+
+        if self.ann is not None:
+            rows = self.ann.candidates(vector)
+            # 快照之后新加入索引的行不可见
+            rows = rows[rows < self.count]
+            rows = rows[self.live[rows]]
+            scores = similarity_from_cosine(self.method, self.gather(rows) @ vector)
+            return [(self.ids[rows[i]], float(scores[i])) for i in _top_k(scores, top_k)]
+
+        scores = similarity_from_cosine(self.method, self._cosine(vector[None])[0])
+        if self.has_dead:
+            scores[~self.live] = -np.inf
+        return [(self.ids[i], float(scores[i])) for i in _top_k(scores, top_k)]
+
+    def search_batch(self, probes: np.ndarray, top_k: int = 1) -> List[List[Tuple[str, float]]]:
+        """一次矩阵-矩阵乘法为多个查询特征打分，返回每个查询的 top_k 结果"""
+        if self.ann is not None:
+            # 每个查询的候选集合不同，逐个在候选行上打分
+            return [self.search(probe, top_k) for probe in probes]
+
+        probes = np.asarray(probes, dtype=np.float32)
+        if self.count == 0 or probes.shape[0] == 0:
+            return [[] for _ in range(probes.shape[0])]
+        if probes.shape[1] != self.dim:
+            logger.warning("%s 查询特征维度不匹配: %d vs %s", self.method, probes.shape[1], self.dim)
+            return [[] for _ in range(probes.shape[0])]
+
+        norms = np.linalg.norm(probes, axis=1, keepdims=True)
+        valid = (norms[:, 0] > 0) & np.isfinite(norms[:, 0])
+        probes = probes / np.where(valid[:, None], norms, 1.0)
+
+        scores = similarity_from_cosine(self.method, self._cosine(probes))
+        if self.has_dead:
+            scores[:, ~self.live] = -np.inf
+
+        results = []
+        for row in range(scores.shape[0]):
+            if not valid[row]:
+                results.append([])
+                continue
+            results.append([(self.ids[i], float(scores[row, i])) for i in _top_k(scores[row], top_k)])
+        return results
+
+
+class EmbeddingGallery:
+    """单个算法的特征库：直接内存映射特征存储中的分段文件（零拷贝），存储中的行已归一化"""
+
+    def __init__(self, method: str, segments, accept: Optional[Callable[[str], bool]] = None,
+                 initial_capacity: int = 1024):
+        self.method = method
+        self.segments = segments
+        # 过滤没有用户信息的孤立特征行
+        self._accept = accept
+        self._capacity = initial_capacity
+        self._blocks: List[np.ndarray] = []
+        self._ids = np.empty(initial_capacity, dtype=object)
+        # 有效行掩码只在刷新时整体替换（写时复制），已发出的视图不受影响
+        self._live = np.zeros(initial_capacity, dtype=bool)
+        self._rows: Dict[str, int] = {}
+        # 因暂时没有用户信息被忽略的行（其他进程先写特征、本进程后读到用户），之后刷新时重新检查
+        self._orphans: Dict[str, int] = {}
+        self._count = 0
+        self._dead = 0
+        self._generation = None
+        self._lock = threading.Lock()
+        # 近似最近邻索引：特征库超过 ANN_MIN_GALLERY_SIZE 后自动启用
+        self.ann: Optional[IVFIndex] = None
+        self.ann_path: Optional[str] = None
+        self._ann_ready = False
+        self._ann_building = False
+        self._ann_thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._rows
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self.segments.dim
+
+    def _grow(self, required: int):
+        """容量翻倍（摊还 O(1) 追加）"""
+        new_capacity = self._capacity
+        while new_capacity < required:
+            new_capacity *= 2
+        ids = np.empty(new_capacity, dtype=object)
+        ids[:self._count] = self._ids[:self._count]
+        live = np.zeros(new_capacity, dtype=bool)
+        live[:self._count] = self._live[:self._count]
+        self._ids, self._live, self._capacity = ids, live, new_capacity
+
+    def refresh(self) -> int:
+        """增量加载存储中新提交的行，返回新增行数；存储被压缩后整体重新加载"""
+        with self._lock:
+            total = self.segments.sync()
+            if self._generation != self.segments.generation:
+                # 压缩后行号全部变化，旧索引失效
+                self._generation = self.segments.generation
+                self._rows, self._orphans, self._count, self._dead = {}, {}, 0, 0
+                self._live = np.zeros(self._capacity, dtype=bool)
+                self.ann = None
+            adopted = self._adoptable_orphans()
+            if total <= self._count and not adopted:
+                return 0
+
+            start = self._count
+            if total > self._capacity:
+                self._grow(total)
+            live = self._live.copy()
+            for user_id, row in adopted:
+                del self._orphans[user_id]
+                self._accept_row(live, user_id, row)
+                self._dead -= 1
+            for row, user_id in enumerate(self.segments.row_ids(start, total), start):
+                self._ids[row] = user_id
+                if self._accept is not None and not self._accept(user_id):
+                    self._orphans[user_id] = row
+                    self._dead += 1
+                    continue
+                self._orphans.pop(user_id, None)
+                self._accept_row(live, user_id, row)
+
+            self._blocks = self.segments.blocks()
+            self._live = live
+            self._count = total
+            view = self._view()
+            if self.ann is not None and total > start:
+                rows = np.arange(start, total)
+                self.ann.add(rows, view.gather(rows))
+
+        self._maybe_build_ann()
+        return total - start
+
+    def _adoptable_orphans(self) -> List[Tuple[str, int]]:
+        """用户信息已经到达的孤立行"""
+        if not self._orphans or self._accept is None:
+            return []
+        return [(user_id, row) for user_id, row in self._orphans.items() if self._accept(user_id)]
+
+    def _accept_row(self, live: np.ndarray, user_id: str, row: int):
+        """标记有效行，同一用户的旧行失效"""
+        old = self._rows.get(user_id)
+        if old is not None:
+            live[old] = False
+            self._dead += 1
+        self._rows[user_id] = row
+        live[row] = True
+
+    def init_ann(self, path: str, background: bool = True):
+        """加载已训练的ANN聚类中心（不存在或规模已翻倍时重新训练），之后注册时增量更新
+
+        background=False 时在当前线程训练（多进程模式的主进程在 fork 之前不能启动线程）。
+        """
+        self.ann_path = path
+        self._ann_ready = True
+        if not ANN_ENABLED or self._count < ANN_MIN_GALLERY_SIZE:
+            return
+
+        # 复用已训练的聚类中心，只需重新分配各行；维度或规模不匹配时重新训练
+        view = self.snapshot()
+        index = IVFIndex.load(path)
+        if index is None or index.dim != self.dim or self._count >= 2 * index.trained_size:
+            self._maybe_build_ann(background)
+            return
+
+        index.nprobe = ANN_NPROBE
+        self._add_blocks(index, view)
+        self.ann = index
+        logger.info("%s ANN索引加载完成: %d 行, %d 个聚类", self.method, len(index), index.nlist)
+
+    @staticmethod
+    def _add_blocks(index: IVFIndex, view: GalleryView):
+        """逐个分段把视图中的所有行加入索引"""
+        for offset, block in zip(view._offsets, view.blocks):
+            index.add(np.arange(offset, offset + block.shape[0]), block)
+
+    def _maybe_build_ann(self, background: bool = True):
+        """特征库超过阈值时在后台线程构建索引，规模翻倍后重建（重新训练聚类中心）
+
+        构建期间查询继续使用暴力搜索（或旧索引），注册和识别请求不等待训练。
+        """
+        if not (ANN_ENABLED and self._ann_ready) or self._ann_building:
+            return
+        if self._count < ANN_MIN_GALLERY_SIZE:
+            return
+        if self.ann is not None and self._count < 2 * self.ann.trained_size:
+            return
+
+        with self._lock:
+            if self._ann_building:
+                return
+            self._ann_building = True
+        if not background:
+            self._build_ann()
+            return
+        self._ann_thread = threading.Thread(target=self._build_ann, name=f"ann-build-{self.method}", daemon=True)
+        self._ann_thread.start()
+
+    def wait_for_ann(self, timeout: Optional[float] = None):
+        """等待正在进行的后台索引构建完成（基准测试和脚本使用）"""
+        thread = self._ann_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _build_ann(self):
+        try:
+            # 在锁外构建，期间新追加的行在构建完成后补上
+            with self._lock:
+                view = self._view()
+                generation = self._generation
+            index = IVFIndex(self.dim, IVFIndex.default_nlist(view.count), ANN_NPROBE)
+            rng = np.random.default_rng(0)
+            sample_size = min(view.count, index.nlist * 64)
+            index.train(view.gather(np.sort(rng.choice(view.count, sample_size, replace=False))))
+            index.trained_size = view.count
+            self._add_blocks(index, view)
+            with self._lock:
+                if self._generation != generation:
+                    # 构建期间存储被压缩，行号已全部变化，丢弃本次结果
+                    return
+                if self._count > view.count:
+                    rows = np.arange(view.count, self._count)
+                    index.add(rows, self._view().gather(rows))
+                # 一次赋值切换到新索引，之后的视图才会使用它
+                self.ann = index
+            logger.info("%s ANN索引构建完成: %d 行, %d 个聚类", self.method, len(index), index.nlist)
+            if self.ann_path:
+                index.save(self.ann_path)
+        except Exception as e:
+            logger.warning("%s ANN索引构建失败: %s", self.method, e)
+        finally:
+            self._ann_building = False
+
+    def _view(self) -> GalleryView:
+        return GalleryView(self.method, self._blocks, self._ids[:self._count],
+                           self._live[:self._count], self._dead > 0, self.ann)
+
+    def snapshot(self) -> GalleryView:
+        """返回当前特征库的只读视图（不复制数据）"""
+        with self._lock:
+            return self._view()
+
+    def search(self, probe: np.ndarray, top_k: int = 1) -> List[Tuple[str, float]]:
+        """一次矩阵-向量乘法为所有用户打分，返回相似度最高的 top_k 个 (user_id, similarity)"""
+        return self.snapshot().search(probe, top_k)
+
+    def search_batch(self, probes: np.ndarray, top_k: int = 1) -> List[List[Tuple[str, float]]]:
+        """多个查询特征一次匹配"""
+        return self.snapshot().search_batch(probes, top_k)
+
+
+class FaceGallery:
+    """按算法划分的特征库集合；启动时只加载用户id，用户信息在首次匹配到时按id查询并缓存"""
+
+    def __init__(self, methods: List[str], store):
+        self.methods = list(methods)
+        self.store = store
+        self.user_ids = set()
+        # 已加载到的存储版本号和用户表 rowid，用于增量同步其他进程的注册
+        self._version = None
+        self._user_rowid = 0
+        self._users: Dict[str, Dict] = {}
+        self._database = None
+        self.galleries = {
+            method: EmbeddingGallery(method, store.segments(method), accept=self.user_ids.__contains__)
+            for method in self.methods
+        }
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def load(self, database, background_ann: bool = True) -> int:
+        """启动时加载所有用户id，并内存映射各算法的特征存储；background_ann=False 时同步构建ANN索引"""
+        self._database = database
+        # 先读版本号：加载期间其他进程提交的特征会在下次 sync() 时加载
+        self._version = self.store.version
+        self._load_user_ids()
+
+        for method, gallery in self.galleries.items():
+            gallery.refresh()
+            orphans = len(gallery.segments.latest_ids()) - len(gallery)
+            if orphans:
+                print(f"{method} 忽略 {orphans} 个没有用户信息的特征")
+
+        print(f"特征库加载完成: {len(self.user_ids)} 个用户, " +
+              ", ".join(f"{m}={len(g)}" for m, g in self.galleries.items()))
+
+        # 加载或构建ANN索引，与特征分段文件存放在同一目录
+        for method, gallery in self.galleries.items():
+            gallery.init_ann(os.path.join(gallery.segments.directory, 'ann.npz'), background_ann)
+        return len(self.user_ids)
+
+    def _load_user_ids(self):
+        rows = self._database.get_user_ids_since(self._user_rowid)
+        with self._lock:
+            self.user_ids.update(user_id for _, user_id in rows)
+            if rows:
+                self._user_rowid = max(self._user_rowid, rows[-1][0])
+
+    def sync(self) -> bool:
+        """存储版本号变化（其他进程注册了用户）时增量加载新用户和新特征行，未变化时只读取一次版本号"""
+        version = self.store.version
+        if version == self._version or self._database is None:
+            return False
+        with self._sync_lock:
+            version = self.store.version
+            if version == self._version:
+                return False
+            self._load_user_ids()
+            # 重新注册的用户信息可能已变化
+            with self._lock:
+                self._users.clear()
+            for gallery in self.galleries.values():
+                gallery.refresh()
+            self._version = version
+        return True
+
+    def add_user(self, user_data: Dict, encodings: Dict[str, np.ndarray]):
+        """注册后更新特征库：特征已由数据库写入存储，这里只需增量刷新"""
+        user_id = str(user_data['id'])
+        with self._lock:
+            self._users[user_id] = user_data
+            self.user_ids.add(user_id)
+        for method in encodings:
+            if method in self.galleries:
+                self.galleries[method].refresh()
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        user = self._users.get(user_id)
+        if user is None and user_id in self.user_ids and self._database is not None:
+            user = self._database.get_user(user_id)
+            if user is not None:
+                self._users[user_id] = user
+        return user
+
+    def snapshot(self) -> "GallerySnapshot":
+        """获取特征库快照，批量处理时整批只访问一次特征库"""
+        self.sync()
+        # 用户只增不删，视图中的每个id都能找到用户
+        views = {method: gallery.snapshot() for method, gallery in self.galleries.items()}
+        return GallerySnapshot(self, views)
+
+    def search(self, method: str, probe: np.ndarray, top_k: int = 1) -> List[Tuple[str, float]]:
+        gallery = self.galleries.get(method)
+        if gallery is None:
+            return []
+        return gallery.search(probe, top_k)
+
+    def search_batch(self, method: str, probes: np.ndarray, top_k: int = 1) -> List[List[Tuple[str, float]]]:
+        gallery = self.galleries.get(method)
+        if gallery is None:
+            return [[] for _ in range(len(probes))]
+        return gallery.search_batch(probes, top_k)
+
+
+class GallerySnapshot:
+    """特征库的只读快照：与 FaceGallery 接口相同，但不会看到之后新注册的用户"""
+
+    def __init__(self, gallery: FaceGallery, views: Dict[str, GalleryView]):
+        self.user_ids = gallery.user_ids
+        self._gallery = gallery
+        self._views = views
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        return self._gallery.get_user(user_id)
+
+    def search(self, method: str, probe: np.ndarray, top_k: int = 1) -> List[Tuple[str, float]]:
+        if method not in self._views:
+            return []
+        return self._views[method].search(probe, top_k)
+
+    def search_batch(self, method: str, probes: np.ndarray, top_k: int = 1) -> List[List[Tuple[str, float]]]:
+        if method not in self._views:
+            return [[] for _ in range(len(probes))]
+        return self._views[method].search_batch(probes, top_k)
@@ -0,0 +1,78 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from .config import INFERENCE_WORKERS, INFERENCE_QUEUE_MAX_DEPTH
+
+
+class QueueFullError(Exception):
+    """推理队列已满"""
+    pass
+
+
+class InferenceQueue:
+    """有界推理队列：同步推理在独立线程池中执行，不阻塞事件循环；超过容量直接拒绝"""
+
+    def __init__(self, max_workers: int, max_depth: int):
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='inference')
+        self._depth = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        """排队中 + 执行中的任务数"""
+        return self._depth
+
+    def acquire(self):
+        """占用一个队列名额，队列已满时抛出 QueueFullError；用完后必须调用 release()"""
+        with self._lock:
+            if self._depth >= self.max_depth:
+                self._rejected += 1
+                raise QueueFullError(f"推理队列已满 ({self._depth}/{self.max_depth})")
+            self._depth += 1
+
+    def release(self, _future=None):
+        """释放一个队列名额"""
+        with self._lock:
+            self._depth -= 1
+
+    def lease(self) -> Callable[[], None]:
+        """占用一个队列名额，返回只生效一次的释放函数，可以在多个退出路径上重复调用"""
+        self.acquire()
+        released = threading.Event()
+        
+        def release():
+            with self._lock:
+                if released.is_set():
+                    return
+                released.set()
+                self._depth -= 1
+        return release
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """提交一个推理任务并等待结果，队列已满时抛出 QueueFullError"""
+        self.acquire()
+        try:
+            future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self.release()
+            raise
+        # 任务真正结束（或在排队时被取消）后才释放名额，客户端断开不会导致计数错误
+        future.add_done_callback(self.release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict:
+        return {
+            'depth': self._depth,
+            'max_depth': self.max_depth,
+            'workers': self.max_workers,
+            'rejected': self._rejected
+        }
+
+
+inference_queue = InferenceQueue(INFERENCE_WORKERS, INFERENCE_QUEUE_MAX_DEPTH)
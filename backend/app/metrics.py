@@ -0,0 +1,234 @@
+import bisect
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from .config import METRICS_ENABLED
+
+# 延迟直方图的桶上界（秒），覆盖从哈希/投票（亚毫秒）到 dlib CNN 检测（秒级）的范围
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """单调递增计数器，按标签值分组"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in items]
+
+
+class Histogram:
+    """累积桶直方图（Prometheus 语义），按标签值分组"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数（非累积，最后一个是 +Inf）, 总和]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            item = self._values.get(labels)
+            if item is None:
+                item = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            item[0][index] += 1
+            item[1] += value
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        lines = []
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {total!r}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """抓取时才读取的指标（队列深度、缓存命中数等已有统计），回调返回 None 时不输出"""
+
+    def __init__(self, name: str, documentation: str, type: str, callback: Callable[[], Optional[float]]):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        value = self.callback()
+        if value is None:
+            return []
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Span:
+    """计时区间，退出时把耗时记入直方图"""
+
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class _NoopSpan:
+    """关闭指标时使用的空计时区间"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class MetricsRegistry:
+    """进程内指标注册表，以 Prometheus 文本格式（0.0.4）输出"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标已注册: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_callback(self, name: str, documentation: str, type: str,
+                          callback: Callable[[], Optional[float]]) -> CallbackMetric:
+        """注册抓取时读取的 gauge / counter；重复注册时替换回调（模型重新加载后缓存对象会变化）"""
+        metric = CallbackMetric(name, documentation, type, callback)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.collect()
+            except Exception as e:
+                print(f"指标 {metric.name} 读取失败: {str(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry(METRICS_ENABLED)
+
+# 识别流水线的指标
+stage_seconds = metrics.histogram(
+    'face_stage_duration_seconds', '各处理阶段耗时（秒），method 为空表示与算法无关的阶段', ('stage', 'method'))
+request_seconds = metrics.histogram(
+    'face_request_duration_seconds', '注册 / 识别请求端到端耗时（秒）', ('operation',))
+requests_total = metrics.counter(
+    'face_requests_total', '注册 / 识别请求数', ('operation', 'result'))
+detections_total = metrics.counter(
+    'face_detections_total', '人脸检测运行次数')
+detected_faces_total = metrics.counter(
+    'face_detected_faces_total', '检测到的人脸数')
+embeddings_total = metrics.counter(
+    'face_embeddings_total', '各算法特征提取次数', ('method', 'result'))
+
+
+def span(stage: str, method: str = ''):
+    """阶段计时：with span('detect'): ... / with span('embed', 'facenet'): ..."""
+    if not metrics.enabled:
+        return _NOOP_SPAN
+    return Span(stage_seconds, (stage, method))
+
+
+def count(counter: Counter, *labels: str, amount: float = 1.0):
+    """计数（关闭指标时不做任何事）"""
+    if metrics.enabled:
+        counter.inc(*labels, amount=amount)
+
+
+def timed_operation(operation: str):
+    """记录返回 (success, ...) 的请求方法的端到端耗时和结果"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            result = 'error'
+            try:
+                value = fn(*args, **kwargs)
+                result = 'success' if value[0] else 'failure'
+                return value
+            finally:
+                request_seconds.observe(time.perf_counter() - start, operation)
+                requests_total.inc(operation, result)
+        return wrapper
+    return decorator
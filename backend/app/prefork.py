@@ -0,0 +1,187 @@
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+# 工作进程启动后在该秒数内退出视为启动失败，不再重启
+MIN_WORKER_UPTIME = 10.0
+
+SMAPS_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def process_memory(pid: Optional[int] = None) -> Optional[Dict[str, float]]:
+    """进程内存占用（MB）：rss、pss（共享页按共享进程数分摊）、shared、private；仅支持 Linux"""
+    pid = pid or os.getpid()
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+            for line in f:
+                name, _, rest = line.partition(':')
+                if name in SMAPS_FIELDS:
+                    values[name] = int(rest.split()[0]) / 1024
+    except OSError:
+        return None
+    return {
+        'rss_mb': round(values.get('Rss', 0.0), 1),
+        'pss_mb': round(values.get('Pss', 0.0), 1),
+        'shared_mb': round(values.get('Shared_Clean', 0.0) + values.get('Shared_Dirty', 0.0), 1),
+        'private_mb': round(values.get('Private_Clean', 0.0) + values.get('Private_Dirty', 0.0), 1)
+    }
+
+
+class PreforkServer:
+    """主进程加载 dlib / torch 模型和特征库后 fork 多个工作进程，模型权重以写时复制方式共享
+
+    所有工作进程共用主进程创建的监听套接字；工作进程异常退出时由主进程重新 fork。
+    """
+
+    def __init__(self, app, host: str, port: int, workers: int, report_interval: float = 300.0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.report_interval = report_interval
+        self._socket: Optional[socket.socket] = None
+        self._ready_pipe = None
+        self._children: Dict[int, tuple] = {}  # pid -> (编号, 启动时间)
+        self._ready = set()
+        self._stopping = False
+
+    def run(self):
+        from .face_service import face_service
+
+        # 1. 主进程加载可共享的部分，不运行推理、不创建线程
+        start = time.perf_counter()
+        face_service.load_before_fork()
+        print(f"主进程加载完成，耗时 {time.perf_counter() - start:.1f}s")
+        # 已加载的对象移出GC跟踪，避免垃圾回收修改对象头导致共享页被复制
+        gc.freeze()
+
+        # 2. 创建监听套接字并 fork 工作进程
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(2048)
+        self._socket.set_inheritable(True)
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        self._ready_pipe = (read_fd, write_fd)
+        for slot in range(self.workers):
+            self._spawn(slot)
+        print(f"多进程服务已启动: http://{self.host}:{self.port}, 工作进程数={self.workers}")
+
+        # 3. 监控工作进程
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        next_report = None
+        while self._children:
+            self._collect_ready()
+            self._reap()
+            now = time.monotonic()
+            if next_report is None and len(self._ready) == self.workers:
+                self.report_memory()
+                next_report = now + self.report_interval if self.report_interval > 0 else float('inf')
+            elif next_report is not None and now >= next_report:
+                self.report_memory()
+                next_report = now + self.report_interval
+            time.sleep(0.5)
+        print("所有工作进程已退出")
+
+    def _spawn(self, slot: int):
+        # 缓冲区中未输出的内容会被子进程继承并重复输出
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker(slot)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 0
+            except BaseException as e:
+                print(f"工作进程 {slot} 异常退出: {str(e)}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self._children[pid] = (slot, time.monotonic())
+        print(f"工作进程 {slot} 已启动: pid={pid}")
+
+    def _run_worker(self, slot: int):
+        """工作进程：重新初始化推理运行时，就绪后在共享的套接字上提供服务"""
+        import uvicorn
+        from .face_service import face_service
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        os.close(self._ready_pipe[0])
+
+        face_service.after_fork()
+        os.write(self._ready_pipe[1], f"{slot}\n".encode())
+        os.close(self._ready_pipe[1])
+
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level="info")
+        uvicorn.Server(config).run(sockets=[self._socket])
+
+    def _collect_ready(self):
+        try:
+            data = os.read(self._ready_pipe[0], 4096)
+        except BlockingIOError:
+            return
+        for line in data.decode().split():
+            self._ready.add(int(line))
+            print(f"工作进程 {line} 已就绪")
+
+    def _reap(self):
+        """回收退出的工作进程，非停止状态下重新 fork"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            item = self._children.pop(pid, None)
+            if item is None:
+                continue
+            slot, started_at = item
+            self._ready.discard(slot)
+            if self._stopping:
+                continue
+            if time.monotonic() - started_at < MIN_WORKER_UPTIME:
+                print(f"工作进程 {slot} (pid={pid}) 启动后立即退出, 状态={status}，停止服务")
+                self._handle_stop(signal.SIGTERM, None)
+                continue
+            print(f"工作进程 {slot} (pid={pid}) 退出, 状态={status}，重新启动")
+            self._spawn(slot)
+
+    def _handle_stop(self, signum, frame):
+        """停止时把信号转发给所有工作进程，等待它们处理完当前请求后退出"""
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report_memory(self):
+        """输出主进程和各工作进程的内存占用；PSS 之和是实际占用的物理内存"""
+        rows = [('master', os.getpid())] + [
+            (f"worker {slot}", pid) for pid, (slot, _) in sorted(self._children.items(), key=lambda x: x[1][0])
+        ]
+        print("\n=== 内存占用 (MB) ===")
+        print(f"{'进程':>10} {'pid':>8} {'RSS':>9} {'PSS':>9} {'共享':>9} {'私有':>9}")
+        total_rss, total_pss = 0.0, 0.0
+        for name, pid in rows:
+            memory = process_memory(pid)
+            if memory is None:
+                print(f"{name:>10} {pid:>8} {'不可用':>9}")
+                continue
+            total_rss += memory['rss_mb']
+            total_pss += memory['pss_mb']
+            print(f"{name:>10} {pid:>8} {memory['rss_mb']:>9.1f} {memory['pss_mb']:>9.1f} "
+                  f"{memory['shared_mb']:>9.1f} {memory['private_mb']:>9.1f}")
+        print(f"RSS 之和: {total_rss:.1f} MB（不共享时的近似占用）, PSS 之和: {total_pss:.1f} MB（实际占用）")
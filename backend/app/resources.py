@@ -0,0 +1,118 @@
+import os
+from typing import Dict, Iterable, Optional
+from .config import (
+    INFERENCE_THREAD_BUDGET, INFERENCE_WORKERS, MODEL_CONCURRENCY, PARALLEL_EXTRACTION, MICRO_BATCHING,
+    MODEL_THREADS, ORT_GRAPH_OPTIMIZATION, ORT_MEMORY_ARENA, ORT_INTER_OP_THREADS
+)
+
+# 按计算量粗略加权：InsightFace 包含检测和识别两个网络，dlib 主要是单线程代码
+MODEL_WEIGHTS = {'insightface': 2, 'facenet': 2, 'face_recognition': 1}
+
+GRAPH_OPTIMIZATION_LEVELS = ('disable', 'basic', 'extended', 'all')
+
+# dlib 链接的 BLAS / OpenMP 在库加载时读取的线程数环境变量
+NATIVE_THREAD_ENV = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def split_thread_budget(budget: int, methods: Iterable[str], concurrency: Dict[str, int], workers: int,
+                        parallel: bool = True, batched: Iterable[str] = ()) -> Dict[str, int]:
+    """把全局线程预算分给各模型
+
+    并发提取时各模型同时运行，按权重划分预算；再除以该模型同时运行的实例数
+    （不超过推理工作线程数，走微批处理的模型只有一个合批线程）。
+    """
+    methods = list(methods)
+    batched = set(batched)
+    total_weight = sum(MODEL_WEIGHTS.get(m, 1) for m in methods) or 1
+    threads = {}
+    for method in methods:
+        share = budget * MODEL_WEIGHTS.get(method, 1) / total_weight if parallel else budget
+        instances = 1 if method in batched else max(1, min(workers, concurrency.get(method, 1)))
+        threads[method] = max(1, int(share // instances))
+    return threads
+
+
+class ModelResources:
+    """单个模型的推理资源配置"""
+
+    def __init__(self, threads: int, inter_op_threads: int = 1,
+                 graph_optimization: str = 'all', memory_arena: bool = True):
+        if graph_optimization not in GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"未知的图优化级别: {graph_optimization}，可选 {', '.join(GRAPH_OPTIMIZATION_LEVELS)}")
+        self.threads = threads
+        self.inter_op_threads = inter_op_threads
+        self.graph_optimization = graph_optimization
+        self.memory_arena = memory_arena
+
+    def session_options(self):
+        """对应的 ONNX Runtime SessionOptions"""
+        import onnxruntime
+        levels = {
+            'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = self.inter_op_threads
+        options.execution_mode = (onnxruntime.ExecutionMode.ORT_PARALLEL if self.inter_op_threads > 1
+                                  else onnxruntime.ExecutionMode.ORT_SEQUENTIAL)
+        options.graph_optimization_level = levels[self.graph_optimization]
+        options.enable_cpu_mem_arena = self.memory_arena
+        return options
+
+    def describe(self) -> str:
+        return (f"线程={self.threads}, 算子间线程={self.inter_op_threads}, "
+                f"图优化={self.graph_optimization}, 内存池={'开' if self.memory_arena else '关'}")
+
+
+class ResourcePlan:
+    """所有模型共享一个CPU线程预算，避免 ONNX Runtime、torch 和 dlib 的线程池互相抢占"""
+
+    def __init__(self, budget: int, models: Dict[str, ModelResources]):
+        self.budget = budget
+        self.models = models
+
+    @classmethod
+    def from_config(cls) -> "ResourcePlan":
+        automatic = split_thread_budget(
+            INFERENCE_THREAD_BUDGET, MODEL_THREADS, MODEL_CONCURRENCY, INFERENCE_WORKERS,
+            parallel=PARALLEL_EXTRACTION, batched=('facenet',) if MICRO_BATCHING else ()
+        )
+        models = {
+            method: ModelResources(
+                threads=MODEL_THREADS[method] or automatic[method],
+                inter_op_threads=ORT_INTER_OP_THREADS,
+                graph_optimization=ORT_GRAPH_OPTIMIZATION.get(method, 'all'),
+                memory_arena=ORT_MEMORY_ARENA.get(method, True)
+            )
+            for method in MODEL_THREADS
+        }
+        return cls(INFERENCE_THREAD_BUDGET, models)
+
+    def __getitem__(self, method: str) -> ModelResources:
+        return self.models[method]
+
+    def apply_native_thread_limits(self):
+        """设置 dlib 使用的 BLAS / OpenMP 线程数，必须在导入 face_recognition 之前调用（已显式设置的环境变量不覆盖）"""
+        for name in NATIVE_THREAD_ENV:
+            os.environ.setdefault(name, str(self.models['face_recognition'].threads))
+
+    def describe(self) -> str:
+        lines = [f"推理线程预算: {self.budget}"]
+        for method, resources in self.models.items():
+            lines.append(f"  {method}: {resources.describe()}")
+        return "\n".join(lines)
+
+
+def rebuild_sessions(models: Iterable, options, providers: Optional[list] = None):
+    """用给定的 SessionOptions 重建已加载模型的推理会话（insightface 的 model_zoo 不透传 sess_options）"""
+    import onnxruntime
+    for model in models:
+        model.session = onnxruntime.InferenceSession(
+            model.model_file, sess_options=options, providers=providers or ['CPUExecutionProvider']
+        )
+
+
+resource_plan = ResourcePlan.from_config()
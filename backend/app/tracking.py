@@ -0,0 +1,142 @@
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+
+def face_quality(face, image_shape: Tuple[int, ...]) -> float:
+    """轻量的人脸质量估计：检测得分 × 人脸尺寸因子（边长达到112像素即满分）"""
+    x1, y1, x2, y2 = face.bbox
+    side = np.sqrt(max(x2 - x1, 0) * max(y2 - y1, 0))
+    return float(face.det_score) * min(side / 112.0, 1.0)
+
+
+def bbox_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """计算两组 (x1, y1, x2, y2) 检测框的IoU矩阵"""
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def landmark_similarity(kps_a: Optional[np.ndarray], kps_b: Optional[np.ndarray], bbox: np.ndarray) -> float:
+    """关键点平均距离相对人脸对角线的相似度，快速移动导致IoU偏低时作为补充"""
+    if kps_a is None or kps_b is None:
+        return 0.0
+    diagonal = np.hypot(bbox[2] - bbox[0], bbox[3] - bbox[1])
+    distance = np.linalg.norm(kps_a - kps_b, axis=1).mean()
+    return float(max(0.0, 1.0 - distance / max(diagonal, 1e-6)))
+
+
+class FaceTrack:
+    """一条人脸轨迹及其最近一次识别结果"""
+
+    def __init__(self, track_id: int, face, quality: float, now: float):
+        self.track_id = track_id
+        self.face = face
+        self.quality = quality
+        self.hits = 1
+        self.misses = 0
+        self.updated_at = now
+        self.seen_in_frame = True
+        # 最近一次识别
+        self.result: Optional[Tuple[bool, object]] = None
+        self.recognized_at: Optional[float] = None
+        self.recognized_quality = 0.0
+
+    def to_dict(self) -> Dict:
+        item = {
+            'track_id': self.track_id,
+            'bbox': [float(v) for v in self.face.bbox],
+            'det_score': float(self.face.det_score),
+            'quality': self.quality,
+            'recognized': self.result is not None and self.result[0]
+        }
+        if self.result is not None:
+            success, identity = self.result
+            if success:
+                item['identity'] = identity
+            else:
+                item['message'] = identity
+        return item
+
+
+class FaceTracker:
+    """基于IoU/关键点的贪心人脸跟踪器，决定哪些轨迹需要重新提取特征和匹配"""
+
+    def __init__(self, iou_threshold: float = 0.3, max_misses: int = 5, detect_every: int = 1,
+                 refresh_interval: float = 3.0, quality_gain: float = 0.1):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.detect_every = max(1, detect_every)
+        self.refresh_interval = refresh_interval
+        self.quality_gain = quality_gain
+        self.tracks: List[FaceTrack] = []
+        self.frame_index = 0
+        self._next_id = 1
+
+    def next_frame(self) -> bool:
+        """进入下一帧，返回这一帧是否需要运行检测"""
+        self.frame_index += 1
+        for track in self.tracks:
+            track.seen_in_frame = False
+        return (self.frame_index - 1) % self.detect_every == 0
+
+    def update(self, faces: list, image_shape: Tuple[int, ...], now: float) -> List[FaceTrack]:
+        """用当前帧的检测结果更新轨迹，返回本帧出现的轨迹"""
+        matched_tracks, matched_faces = set(), set()
+        if self.tracks and faces:
+            track_boxes = np.array([t.face.bbox for t in self.tracks], dtype=np.float32)
+            face_boxes = np.array([f.bbox for f in faces], dtype=np.float32)
+            scores = bbox_iou(track_boxes, face_boxes)
+            for i, track in enumerate(self.tracks):
+                for j, face in enumerate(faces):
+                    if scores[i, j] < self.iou_threshold:
+                        scores[i, j] = max(scores[i, j], landmark_similarity(track.face.kps, face.kps, face.bbox))
+
+            # 贪心匹配：分数从高到低
+            for flat in np.argsort(-scores, axis=None):
+                i, j = np.unravel_index(flat, scores.shape)
+                if scores[i, j] < self.iou_threshold:
+                    break
+                if i in matched_tracks or j in matched_faces:
+                    continue
+                track = self.tracks[i]
+                track.face = faces[j]
+                track.quality = face_quality(faces[j], image_shape)
+                track.hits += 1
+                track.misses = 0
+                track.updated_at = now
+                track.seen_in_frame = True
+                matched_tracks.add(i)
+                matched_faces.add(j)
+
+        # 未匹配的轨迹计数丢失，超过上限则删除
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        # 未匹配的人脸创建新轨迹
+        for j, face in enumerate(faces):
+            if j not in matched_faces:
+                self.tracks.append(FaceTrack(self._next_id, face, face_quality(face, image_shape), now))
+                self._next_id += 1
+
+        return [t for t in self.tracks if t.seen_in_frame]
+
+    def needs_recognition(self, track: FaceTrack, now: float) -> bool:
+        """新轨迹、质量明显提升或超过刷新间隔时才需要重新识别"""
+        if track.result is None:
+            return True
+        if track.quality >= track.recognized_quality + self.quality_gain:
+            return True
+        return now - track.recognized_at >= self.refresh_interval
+
+    def record(self, track: FaceTrack, result: Tuple[bool, object], now: float):
+        track.result = result
+        track.recognized_at = now
+        track.recognized_quality = track.quality
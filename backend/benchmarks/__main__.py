@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from benchmarks.fixtures import GALLERY_METHODS, load_images, synthetic_images, fingerprint
+
+# 注意：app 模块在 run() 中设置好环境变量之后才导入
+STAGES = ('image', 'detect', 'embed', 'gallery', 'e2e')
+
+
+def git_state():
+    """当前提交和是否有未提交的修改"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BACKEND_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def config_snapshot() -> dict:
+    """影响性能的配置（路径类配置除外）"""
+    from app import config
+    snapshot = {}
+    for key, value in vars(config).items():
+        if not key.isupper() or any(part in key for part in ('DIR', 'PATH', 'URL')):
+            continue
+        try:
+            json.dumps(value)
+        except TypeError:
+            continue
+        snapshot[key] = value
+    return snapshot
+
+
+def run(args) -> int:
+    workdir = tempfile.mkdtemp(prefix='face-benchmark-')
+    # 必须在导入 app 之前设置：数据写入临时目录，关闭特征缓存使重复图片每次都完整计算
+    os.environ['DATA_DIR'] = os.path.join(workdir, 'data')
+    os.environ['EMBEDDING_CACHE'] = 'false'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from benchmarks.fixtures import populate_database
+    from benchmarks.suite import BenchmarkSuite
+
+    if args.images:
+        images = load_images(args.images)
+        if not images:
+            print(f"目录中没有图片: {args.images}")
+            return 1
+        source = os.path.abspath(args.images)
+    else:
+        images = synthetic_images()
+        source = 'synthetic'
+        print("未指定 --images，使用合成图片（不含人脸：检测和端到端结果只反映未检测到人脸的路径）")
+
+    commit, dirty = git_state()
+    meta = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'images': {'source': source, 'count': len(images), 'fingerprint': fingerprint(images)},
+        'repeats': args.repeats,
+        'config': config_snapshot()
+    }
+
+    suite = BenchmarkSuite(images, args.repeats, args.warmup, workdir)
+    start = time.perf_counter()
+    try:
+        if 'e2e' in args.stages:
+            # 端到端识别使用的特征库，需要在加载模型（和特征库）之前写入
+            from app.database import db
+            populate_database(db, args.e2e_gallery, GALLERY_METHODS, seed=100)
+        for stage in args.stages:
+            print(f"\n=== {stage} ===")
+            if stage == 'image':
+                suite.bench_image()
+            elif stage == 'detect':
+                suite.bench_detect()
+            elif stage == 'embed':
+                suite.bench_embed()
+            elif stage == 'gallery':
+                suite.bench_gallery(args.gallery_sizes, args.gallery_methods)
+            elif stage == 'e2e':
+                suite.bench_e2e(args.e2e_gallery)
+    finally:
+        if not args.keep_workdir:
+            import shutil
+            shutil.rmtree(workdir, ignore_errors=True)
+    meta['seconds'] = round(time.perf_counter() - start, 1)
+
+    output = args.output or f"benchmark_{(commit or 'unknown')[:10]}{'-dirty' if dirty else ''}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'schema': 1, 'meta': meta, 'results': suite.results}, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入: {output}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="识别流水线的离线基准测试（需要先运行 scripts/download_models.py）")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="运行基准测试并把结果写入JSON")
+    run_parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    run_parser.add_argument("--images", help="测试图片目录（默认使用固定种子生成的合成图片）")
+    run_parser.add_argument("--repeats", type=int, default=20, help="每项的重复次数（对每张图片）")
+    run_parser.add_argument("--warmup", type=int, default=2)
+    run_parser.add_argument("--gallery-sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    run_parser.add_argument("--gallery-methods", nargs="+", choices=GALLERY_METHODS, default=list(GALLERY_METHODS))
+    run_parser.add_argument("--e2e-gallery", type=int, default=1000, help="端到端测试的特征库规模")
+    run_parser.add_argument("--output", help="结果文件，默认 benchmark_<提交>.json")
+    run_parser.add_argument("--keep-workdir", action="store_true", help="保留临时数据目录")
+
+    compare_parser = commands.add_parser('compare', help="比较两次运行的结果")
+    compare_parser.add_argument("base", help="基准结果（例如主分支）")
+    compare_parser.add_argument("head", help="对比结果（例如当前修改）")
+    compare_parser.add_argument("--metric", default="p50_ms", choices=["mean_ms", "p50_ms", "p90_ms", "p99_ms", "min_ms"])
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="相对变化超过该值才标记")
+    compare_parser.add_argument("--fail-on-regression", action="store_true", help="有变慢的项时以状态码1退出")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        return run(args)
+
+    from benchmarks.compare import compare
+    regressions, _ = compare(args.base, args.head, args.metric, args.threshold)
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import json
+from typing import Dict, List, Tuple
+
+
+def load_results(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _describe(meta: Dict) -> str:
+    commit = (meta.get('commit') or 'unknown')[:10]
+    return f"{commit}{' (有未提交修改)' if meta.get('dirty') else ''}"
+
+
+def environment_differences(base: Dict, head: Dict) -> List[str]:
+    """可能影响可比性的环境差异：图片集、机器、配置"""
+    differences = []
+    for key in ('images', 'cpu_count', 'platform', 'python', 'numpy'):
+        if base.get(key) != head.get(key):
+            differences.append(f"{key}: {base.get(key)} -> {head.get(key)}")
+    base_config, head_config = base.get('config', {}), head.get('config', {})
+    for key in sorted(set(base_config) | set(head_config)):
+        if base_config.get(key) != head_config.get(key):
+            differences.append(f"config.{key}: {base_config.get(key)} -> {head_config.get(key)}")
+    return differences
+
+
+def compare(base_path: str, head_path: str, metric: str = 'p50_ms', threshold: float = 0.10) -> Tuple[int, int]:
+    """逐项比较两次运行的结果，返回 (变慢的项数, 变快的项数)
+
+    变化超过 threshold（相对值）才标记；两次都存在的项才参与比较。
+    """
+    base, head = load_results(base_path), load_results(head_path)
+    print(f"基准: {_describe(base['meta'])}  对比: {_describe(head['meta'])}  指标: {metric}  阈值: {threshold:.0%}")
+    differences = environment_differences(base['meta'], head['meta'])
+    if differences:
+        print("\n注意：两次运行的环境不同，结果可能不可比")
+        for line in differences:
+            print(f"  - {line}")
+
+    regressions, improvements = 0, 0
+    print(f"\n{'名称':<52} {'基准':>10} {'对比':>10} {'变化':>8}")
+    for name in sorted(set(base['results']) & set(head['results'])):
+        before, after = base['results'][name][metric], head['results'][name][metric]
+        change = (after - before) / before if before > 0 else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '变慢'
+            regressions += 1
+        elif change < -threshold:
+            flag = '变快'
+            improvements += 1
+        print(f"{name:<52} {before:>10.3f} {after:>10.3f} {change:>+8.1%} {flag}")
+
+    only_base = sorted(set(base['results']) - set(head['results']))
+    only_head = sorted(set(head['results']) - set(base['results']))
+    if only_base:
+        print(f"\n只在基准中存在: {', '.join(only_base)}")
+    if only_head:
+        print(f"只在对比中存在: {', '.join(only_head)}")
+    print(f"\n变慢 {regressions} 项, 变快 {improvements} 项")
+    return regressions, improvements
@@ -0,0 +1,79 @@
+import hashlib
+import os
+from typing import Dict, List, Sequence, Tuple
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+# 合成图片的尺寸：摄像头帧、高清帧、手机原图（需要缩小）
+SYNTHETIC_SIZES = ((640, 480), (1280, 720), (1920, 1080), (4032, 3024))
+
+# 各算法的特征维度
+EMBEDDING_DIMS = {'insightface': 512, 'facenet': 512, 'face_recognition': 128}
+GALLERY_METHODS = tuple(EMBEDDING_DIMS)
+
+
+def load_images(image_dir: str) -> List[Tuple[str, bytes]]:
+    """按文件名顺序读取目录中的图片（原始字节，解码也计入测量）"""
+    images = []
+    for name in sorted(os.listdir(image_dir)):
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+            with open(os.path.join(image_dir, name), 'rb') as f:
+                images.append((name, f.read()))
+    return images
+
+
+def synthetic_images(seed: int = 0) -> List[Tuple[str, bytes]]:
+    """固定种子生成的 JPEG 图片（不含人脸），用于没有测试图片时测量解码、缩放和检测的开销"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for width, height in SYNTHETIC_SIZES:
+        # 低频色块 + 高频噪声，压缩率接近真实照片
+        coarse = rng.integers(0, 256, size=(height // 32 + 1, width // 32 + 1, 3), dtype=np.uint8)
+        image = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+        noise = rng.integers(-12, 13, size=image.shape, dtype=np.int16)
+        image = np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if not ok:
+            raise RuntimeError(f"合成图片编码失败: {width}x{height}")
+        images.append((f"synthetic_{width}x{height}.jpg", encoded.tobytes()))
+    return images
+
+
+def fingerprint(images: Sequence[Tuple[str, bytes]]) -> str:
+    """图片集的内容指纹，比较两次结果时用于确认输入相同"""
+    digest = hashlib.sha256()
+    for name, data in images:
+        digest.update(name.encode('utf-8'))
+        digest.update(hashlib.sha256(data).digest())
+    return digest.hexdigest()[:16]
+
+
+def clustered_embeddings(size: int, dim: int, seed: int = 0, per_cluster: int = 50) -> np.ndarray:
+    """带聚类结构的归一化特征（模拟真实人脸特征的分布）"""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, size // per_cluster)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, n_clusters, size)] + rng.normal(scale=0.8, size=(size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def noisy_queries(vectors: np.ndarray, n: int, noise: float = 0.05, seed: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """对随机抽取的已注册特征加噪声作为查询（模拟同一个人的另一张照片），返回 (行号, 查询)"""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(vectors.shape[0], min(n, vectors.shape[0]), replace=False)
+    queries = vectors[rows] + rng.normal(scale=noise, size=(rows.size, vectors.shape[1])).astype(np.float32)
+    return rows, queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def populate_database(database, size: int, methods: Sequence[str], seed: int = 0) -> Dict[str, np.ndarray]:
+    """通过 Database / EmbeddingStore 写入 size 个合成用户及其各算法特征，返回写入的特征"""
+    user_ids = [f"bench-{i:06d}" for i in range(size)]
+    database.save_users_batch({'id': user_id, 'name': user_id} for user_id in user_ids)
+    vectors = {}
+    for offset, method in enumerate(methods):
+        vectors[method] = clustered_embeddings(size, EMBEDDING_DIMS[method], seed + offset)
+        database.store.segments(method).append_batch(user_ids, vectors[method])
+    database.store.bump_version()
+    return vectors
@@ -0,0 +1,239 @@
+import itertools
+import os
+import shutil
+import time
+from typing import Dict, List, Sequence, Tuple
+import cv2
+import numpy as np
+from app.config import IMAGE_MAX_SIZE
+from app.database import Database
+from app.gallery import FaceGallery
+from .fixtures import populate_database, noisy_queries
+from .timing import measure, measure_each, summarize
+
+
+class BenchmarkSuite:
+    """识别流水线各阶段的基准测试，结果以 名称 -> 统计量 的形式收集"""
+
+    def __init__(self, images: Sequence[Tuple[str, bytes]], repeats: int, warmup: int, workdir: str):
+        self.images = list(images)
+        self.repeats = repeats
+        self.warmup = warmup
+        self.workdir = workdir
+        self.results: Dict[str, Dict] = {}
+        self._service = None
+
+    def record(self, name: str, stats: Dict, **params):
+        if params:
+            stats = {**stats, 'params': params}
+        self.results[name] = stats
+        print(f"{name:<52} p50={stats['p50_ms']:>10.3f} ms  p90={stats['p90_ms']:>10.3f} ms  n={stats['n']}")
+
+    # ---------- 模型 ----------
+
+    def service(self):
+        """加载模型（含预热）和 DATA_DIR 中的合成特征库，只加载一次"""
+        if self._service is None:
+            from app.face_service import face_service
+            start = time.perf_counter()
+            face_service.load()
+            if face_service.load_error:
+                raise RuntimeError(f"模型加载失败: {face_service.load_error}")
+            print(f"模型加载完成: {time.perf_counter() - start:.1f}s")
+            self._service = face_service
+        return self._service
+
+    def _frames(self) -> List[Tuple[str, np.ndarray]]:
+        """解码并缩放后的图片（与服务的预处理相同）"""
+        service = self.service()
+        return [(name, service._process_image(data)) for name, data in self.images]
+
+    def _faces(self) -> Tuple[List[Tuple[np.ndarray, object]], str]:
+        """每张图片检测到的最佳人脸；所有图片都没有人脸时在第一张图片中央构造一个（只用于测量模型耗时）"""
+        from app.detection import Face
+        from insightface.utils import face_align
+        service = self.service()
+        faces = []
+        for _, image in self._frames():
+            best = service.detector.detect(image).best
+            if best is not None:
+                faces.append((image, best))
+        if faces:
+            return faces, 'detected'
+
+        image = self._frames()[0][1]
+        height, width = image.shape[:2]
+        side = min(height, width) // 2
+        x1, y1 = (width - side) // 2, (height - side) // 2
+        kps = face_align.arcface_dst * (side / 112.0) + np.array([x1, y1], dtype=np.float32)
+        face = Face(bbox=np.array([x1, y1, x1 + side, y1 + side], dtype=np.float32), kps=kps,
+                    det_score=np.float32(1.0))
+        return [(image, face)], 'synthetic'
+
+    # ---------- 阶段 ----------
+
+    def bench_image(self):
+        """解码和缩放（与 _process_image 相同的参数）"""
+        for name, data in self.images:
+            buffer = np.frombuffer(data, np.uint8)
+            image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+            if image is None:
+                print(f"跳过无法解码的图片: {name}")
+                continue
+            height, width = image.shape[:2]
+            params = {'width': width, 'height': height, 'bytes': len(data)}
+            self.record(f"image/decode/{name}", measure(
+                lambda: cv2.imdecode(buffer, cv2.IMREAD_COLOR), self.repeats, self.warmup), **params)
+            if max(height, width) > IMAGE_MAX_SIZE:
+                scale = IMAGE_MAX_SIZE / max(height, width)
+                size = (int(width * scale), int(height * scale))
+                self.record(f"image/resize/{name}", measure(
+                    lambda: cv2.resize(image, size, interpolation=cv2.INTER_AREA), self.repeats, self.warmup),
+                    **params)
+
+    def bench_detect(self):
+        """共享的 RetinaFace 检测（自适应分辨率和每个固定分辨率）以及 dlib 的 HOG / CNN 检测器"""
+        from app import face_service as service_module
+        service = self.service()
+        frames = [image for _, image in self._frames()]
+        detector = service.detector
+        found = sum(1 for image in frames if detector.detect(image).best is not None)
+        params = {'images': len(frames), 'with_faces': found}
+
+        self.record("detect/retinaface/adaptive",
+                    measure_each(detector.detect, frames, self.repeats, self.warmup), **params)
+        for size in detector.sizes:
+            self.record(f"detect/retinaface/{size}", measure_each(
+                lambda image: detector.det_model.detect(image, input_size=(size, size), max_num=0, metric='default'),
+                frames, self.repeats, self.warmup), **params)
+
+        # dlib 检测器（balanced / accurate 配置档的回退路径）在直方图均衡化后的RGB图像上运行
+        enhanced = [service._enhance_image(image) for image in frames]
+        face_recognition = service_module.face_recognition
+        self.record("detect/dlib_hog", measure_each(
+            lambda image: face_recognition.face_locations(image, model="hog", number_of_times_to_upsample=2),
+            enhanced, self.repeats, self.warmup), **params)
+        # CNN 检测器在 CPU 上很慢，减少重复次数
+        self.record("detect/dlib_cnn", measure_each(
+            lambda image: face_recognition.face_locations(image, model="cnn", number_of_times_to_upsample=1),
+            enhanced, max(1, self.repeats // 10), 1), **params)
+
+    def bench_embed(self):
+        """各算法的预处理、单张 / 批量前向推理，以及完整的特征提取方法"""
+        from app import face_service as service_module
+        from app.detection import FaceDetectionResult, to_dlib_location
+        from app.dlib_profiles import DLIB_PROFILES
+        from insightface.utils import face_align
+        service = self.service()
+        faces, source = self._faces()
+        params = {'faces': len(faces), 'source': source}
+
+        # 1. InsightFace (ArcFace)
+        size = service.insight_rec_model.input_size[0]
+        self.record("embed/insightface/align", measure_each(
+            lambda item: face_align.norm_crop(item[0], landmark=item[1].kps, image_size=size),
+            faces, self.repeats, self.warmup), **params)
+        crops = [face_align.norm_crop(image, landmark=face.kps, image_size=size) for image, face in faces]
+        self.record("embed/insightface/forward", measure_each(
+            lambda crop: service._arcface_forward([crop]), crops, self.repeats, self.warmup), **params)
+        self.record("embed/insightface/forward_batch8", measure(
+            lambda: service._arcface_forward((crops * 8)[:8]), self.repeats, self.warmup), **params)
+
+        # 2. FaceNet
+        self.record("embed/facenet/preprocess", measure_each(
+            lambda item: service._preprocess_facenet_face(service._crop_facenet_face(item[0], item[1].bbox.astype(int))),
+            faces, self.repeats, self.warmup), **params)
+        tensors = [service._preprocess_facenet_face(service._crop_facenet_face(image, face.bbox.astype(int)))[0]
+                   for image, face in faces]
+        self.record("embed/facenet/forward", measure_each(
+            lambda tensor: service._facenet_forward([tensor]), tensors, self.repeats, self.warmup),
+            backend=service.facenet.name, **params)
+        self.record("embed/facenet/forward_batch8", measure(
+            lambda: service._facenet_forward((tensors * 8)[:8]), self.repeats, self.warmup),
+            backend=service.facenet.name, **params)
+
+        # 3. face_recognition (dlib)：每个配置档的图像增强和特征提取
+        face_recognition = service_module.face_recognition
+        located = [(image, to_dlib_location(face.bbox, image.shape)) for image, face in faces]
+        located = [item for item in located if item[1] is not None]
+        for name, profile in DLIB_PROFILES.items():
+            profile_params = {**params, 'profile': profile.cache_key()}
+            self.record(f"embed/face_recognition/enhance/{name}", measure_each(
+                lambda item: service._dlib_region(item[0], [item[1]], profile), located, self.repeats, self.warmup),
+                **profile_params)
+            regions = [service._dlib_region(image, [location], profile) for image, location in located]
+            if regions:
+                self.record(f"embed/face_recognition/encode/{name}", measure_each(
+                    lambda item: face_recognition.face_encodings(
+                        item[0], known_face_locations=item[1], num_jitters=profile.num_jitters,
+                        model=profile.landmark_model),
+                    regions, self.repeats, self.warmup), **profile_params)
+
+        # 4. 服务中完整的特征提取方法（含质量筛选和归一化）
+        detections = [FaceDetectionResult(image, [face]) for image, face in faces]
+        for method in service.METHODS:
+            if method == 'face_recognition':
+                continue
+            self.record(f"embed/{method}/extract", measure_each(
+                lambda detection: service._run_extractor(method, detection.image, detection),
+                detections, self.repeats, self.warmup), **params)
+        for name, profile in DLIB_PROFILES.items():
+            self.record(f"embed/face_recognition/extract/{name}", measure_each(
+                lambda detection: service._run_extractor('face_recognition', detection.image, detection, profile),
+                detections, self.repeats, self.warmup), profile=profile.cache_key(), **params)
+
+    def bench_gallery(self, sizes: Sequence[int], methods: Sequence[str], queries: int = 64):
+        """合成特征库（通过 EmbeddingStore 写入临时目录）上的加载、单个查询和批量查询"""
+        for size in sizes:
+            root = os.path.join(self.workdir, f"gallery_{size}")
+            database = Database(root)
+            vectors = populate_database(database, size, methods)
+            gallery = FaceGallery(list(methods), database.store)
+            start = time.perf_counter()
+            gallery.load(database)
+            self.record(f"gallery/load/{size}", summarize([(time.perf_counter() - start) * 1000]),
+                        size=size, methods=list(methods))
+            # ANN 索引在后台线程构建，等待完成后再测量查询
+            start = time.perf_counter()
+            for method in methods:
+                gallery.galleries[method].wait_for_ann()
+            self.record(f"gallery/ann_build/{size}", summarize([(time.perf_counter() - start) * 1000]),
+                        size=size, methods=list(methods))
+
+            for method in methods:
+                rows, probes = noisy_queries(vectors[method], queries)
+                expected = [f"bench-{row:06d}" for row in rows]
+                hits = sum(1 for probe, user_id in zip(probes, expected)
+                           if gallery.search(method, probe, top_k=1)[0][0] == user_id)
+                params = {'size': size, 'dim': int(probes.shape[1]), 'recall_at_1': round(hits / len(expected), 4),
+                          'ann': gallery.galleries[method].ann is not None}
+                self.record(f"gallery/{method}/{size}/search", measure_each(
+                    lambda probe: gallery.search(method, probe, top_k=1), probes, self.repeats, self.warmup),
+                    **params)
+                batches = [probes[i:i + 8] for i in range(0, len(probes) - 7, 8)]
+                self.record(f"gallery/{method}/{size}/search_batch8", measure_each(
+                    lambda batch: gallery.search_batch(method, batch, top_k=1), batches, self.repeats, self.warmup),
+                    **params)
+            database.close()
+            shutil.rmtree(root, ignore_errors=True)
+
+    def bench_e2e(self, gallery_size: int):
+        """端到端的注册和识别（特征缓存已关闭，每次都完整计算；使用默认的注册 / 识别配置档）"""
+        service = self.service()
+        params = {'images': len(self.images), 'gallery_size': gallery_size}
+        ids = itertools.count()
+
+        registered = []
+        def register(item):
+            user_id = f"e2e-{next(ids):06d}"
+            success, _ = service.register_face(item[1], {'id': user_id, 'name': item[0]})
+            registered.append(success)
+        self.record("e2e/register_face", measure_each(register, self.images, self.repeats, self.warmup),
+                    success_rate=round(sum(registered) / len(registered), 4), **params)
+
+        recognized = []
+        def recognize(item):
+            success, _ = service.recognize_face(item[1])
+            recognized.append(success)
+        self.record("e2e/recognize_face", measure_each(recognize, self.images, self.repeats, self.warmup),
+                    success_rate=round(sum(recognized) / len(recognized), 4), **params)
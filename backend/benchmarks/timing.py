@@ -0,0 +1,58 @@
+import gc
+import time
+from typing import Callable, Dict, Sequence
+import numpy as np
+
+
+def summarize(samples_ms) -> Dict[str, float]:
+    """耗时样本（毫秒）的统计量"""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'n': int(samples.size),
+        'mean_ms': round(float(samples.mean()), 4),
+        'p50_ms': round(float(np.percentile(samples, 50)), 4),
+        'p90_ms': round(float(np.percentile(samples, 90)), 4),
+        'p99_ms': round(float(np.percentile(samples, 99)), 4),
+        'min_ms': round(float(samples.min()), 4),
+        'max_ms': round(float(samples.max()), 4),
+        'stdev_ms': round(float(samples.std()), 4)
+    }
+
+
+def measure(fn: Callable[[], object], repeats: int, warmup: int = 1) -> Dict[str, float]:
+    """先预热，再逐次计时运行 fn；计时期间关闭GC，避免回收停顿混入样本"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(max(1, repeats)):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return summarize(samples)
+
+
+def measure_each(fn: Callable[[object], object], inputs: Sequence, repeats: int, warmup: int = 1) -> Dict[str, float]:
+    """对每个输入逐次计时运行 fn(input)，样本覆盖所有输入（输入之间的差异计入分布）"""
+    for item in inputs[:1] * warmup:
+        fn(item)
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(max(1, repeats)):
+            for item in inputs:
+                start = time.perf_counter()
+                fn(item)
+                samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return summarize(samples)
@@ -1,7 +1,18 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
+from typing import List, Optional
 from app.face_service import face_service
+from app.inference_queue import inference_queue, QueueFullError
+from app.prefork import process_memory
+from app.metrics import metrics
+from app.dlib_profiles import DLIB_PROFILES
+from app.config import INFERENCE_RETRY_AFTER
 import json
+import io
+import os
+import zipfile
 
 # 创建FastAPI应用实例，添加文档配置
 app = FastAPI(
@@ -12,6 +23,28 @@ app = FastAPI(
     redoc_url="/redoc"  # ReDoc 地址，默认为 /redoc
 )
 
+@app.on_event("startup")
+async def load_models():
+    """在后台加载模型，进程启动后立即可以响应（模型就绪前推理接口返回503）"""
+    face_service.load_in_background()
+
+def loading_response() -> JSONResponse:
+    """模型尚未加载完成时快速返回503"""
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "message": "模型加载中，请稍后重试"},
+        headers={"Retry-After": str(INFERENCE_RETRY_AFTER)}
+    )
+
+# 在 CORS 之前注册，使 CORS 中间件位于外层，503响应同样带有跨域头
+@app.middleware("http")
+async def require_models(request: Request, call_next):
+    """模型就绪前拒绝推理请求，/api/ready 除外"""
+    if request.url.path.startswith("/api/") and request.url.path != "/api/ready" \
+            and not face_service.ready.is_set():
+        return loading_response()
+    return await call_next(request)
+
 # 配置 CORS
 app.add_middleware(
     CORSMiddleware,
@@ -21,37 +54,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def busy_response() -> JSONResponse:
+    """推理队列已满时快速返回503"""
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "message": "服务繁忙，请稍后重试"},
+        headers={"Retry-After": str(INFERENCE_RETRY_AFTER)}
+    )
+
+def profile_error(profile: Optional[str]) -> Optional[str]:
+    """请求指定了未知的 face_recognition 配置档时返回错误信息"""
+    if profile and profile not in DLIB_PROFILES:
+        return f"未知的配置档: {profile}，可选: {', '.join(DLIB_PROFILES)}"
+    return None
+
+def profile_error_response(message: str) -> JSONResponse:
+    return JSONResponse(status_code=400, content={"success": False, "message": message})
+
 @app.post("/api/register")
 async def register(
     image: UploadFile = File(...),
     name: str = Form(...),
-    id: str = Form(...)
+    id: str = Form(...),
+    profile: Optional[str] = Form(None)
 ):
     """
     人脸注册接口
     - **image**: 人脸图片文件
     - **name**: 用户姓名
     - **id**: 用户ID
+    - **profile**: face_recognition 配置档 fast / balanced / accurate（缺省使用 DLIB_PROFILE_REGISTER）
     """
+    error = profile_error(profile)
+    if error:
+        return profile_error_response(error)
     contents = await image.read()
     user_data = {
         "name": name,
         "id": id
     }
-    success, message = face_service.register_face(contents, user_data)
+    try:
+        success, message = await inference_queue.run(face_service.register_face, contents, user_data, profile)
+    except QueueFullError:
+        return busy_response()
     return {"success": success, "message": message}
 
 @app.post("/api/recognize")
-async def recognize(image: UploadFile = File(...)):
+async def recognize(request: Request, image: UploadFile = File(...), profile: Optional[str] = Form(None)):
     """
     人脸识别接口
     - **image**: 人脸图片文件
+    - **profile**: face_recognition 配置档 fast / balanced / accurate（缺省使用 DLIB_PROFILE_RECOGNIZE）
+    - 请求头 **X-Client-Id** 标识轮询的客户端，与该客户端上一帧几乎相同时直接返回上次结果并标记 cached；
+      没有该请求头时不做近重复帧抑制（同一 NAT / 反向代理后的不同客户端地址相同，不能共用上次结果）
     """
+    error = profile_error(profile)
+    if error:
+        return profile_error_response(error)
     contents = await image.read()
-    success, result = face_service.recognize_face(contents)
+    client_id = request.headers.get("X-Client-Id", "")
+    try:
+        success, result, cached = await inference_queue.run(face_service.recognize_client_frame, client_id,
+                                                            contents, profile)
+    except QueueFullError:
+        return busy_response()
     if success:
-        return {"success": True, "data": result}
-    return {"success": False, "message": result}
+        response = {"success": True, "data": result}
+    elif isinstance(result, dict):
+        # 级联投票失败时带有 message 和 skipped_methods
+        response = {"success": False, **result}
+    else:
+        response = {"success": False, "message": result}
+    if cached:
+        response["cached"] = True
+    return response
 
 @app.get("/")
 async def root():
@@ -60,6 +136,176 @@ async def root():
     """
     return {"status": "ok", "message": "Face Recognition API is running"}
 
+@app.post("/api/recognize/crowd")
+async def recognize_crowd(image: UploadFile = File(...), profile: Optional[str] = Form(None)):
+    """
+    多人脸识别接口，返回画面中每张人脸的身份和位置
+    - **image**: 包含多张人脸的图片文件
+    - **profile**: face_recognition 配置档（缺省使用 DLIB_PROFILE_RECOGNIZE）
+    """
+    error = profile_error(profile)
+    if error:
+        return profile_error_response(error)
+    contents = await image.read()
+    try:
+        success, result = await inference_queue.run(face_service.recognize_faces_in_frame, contents, None, profile)
+    except QueueFullError:
+        return busy_response()
+    if success:
+        return {"success": True, "data": result}
+    return {"success": False, "message": result}
+
+@app.websocket("/ws/recognize")
+async def recognize_stream(websocket: WebSocket):
+    """
+    视频流人脸识别（WebSocket）
+    - 客户端逐帧发送JPEG二进制数据，服务端对每帧返回一条JSON结果
+    - 同一连接内跟踪人脸，只在必要时重新提取特征
+    - 查询参数 **profile** 指定 face_recognition 配置档（缺省使用 DLIB_PROFILE_RECOGNIZE）
+    """
+    await websocket.accept()
+    if not face_service.ready.is_set():
+        await websocket.send_json({"success": False, "busy": True, "message": "模型加载中，请稍后重试"})
+        await websocket.close()
+        return
+    profile = websocket.query_params.get("profile")
+    error = profile_error(profile)
+    if error:
+        await websocket.send_json({"success": False, "message": error})
+        await websocket.close()
+        return
+    tracker = face_service.create_stream_tracker()
+    try:
+        while True:
+            frame = await websocket.receive_bytes()
+            try:
+                success, result = await inference_queue.run(face_service.recognize_stream_frame, tracker, frame, profile)
+            except QueueFullError:
+                # 队列已满时丢弃该帧，客户端继续发送下一帧即可
+                await websocket.send_json({"success": False, "busy": True, "message": "服务繁忙，已丢弃该帧"})
+                continue
+            if success:
+                await websocket.send_json({"success": True, "data": result})
+            else:
+                await websocket.send_json({"success": False, "message": result})
+    except WebSocketDisconnect:
+        pass
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+def iter_zip_images(data: bytes):
+    """逐个读取zip压缩包中的图片，不一次性解压全部内容"""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or os.path.splitext(info.filename)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            yield info.filename, archive.read(info)
+
+@app.post("/api/recognize/batch")
+async def recognize_batch(
+    images: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    profile: Optional[str] = Form(None)
+):
+    """
+    批量人脸识别接口，以NDJSON流式返回，每完成一张图片输出一行
+    - **images**: 多个人脸图片文件
+    - **archive**: 包含人脸图片的zip压缩包
+    - **profile**: face_recognition 配置档（缺省使用 DLIB_PROFILE_RECOGNIZE）
+    """
+    error = profile_error(profile)
+    if error:
+        return profile_error_response(error)
+    uploads = [(image.filename, await image.read()) for image in images or []]
+    archive_data = await archive.read() if archive is not None else None
+    if not uploads and archive_data is None:
+        return JSONResponse(status_code=400, content={"success": False, "message": "没有上传图片"})
+    if archive_data is not None and not zipfile.is_zipfile(io.BytesIO(archive_data)):
+        return JSONResponse(status_code=400, content={"success": False, "message": "压缩包格式错误"})
+
+    # 整批占用一个推理队列名额
+    try:
+        release = inference_queue.lease()
+    except QueueFullError:
+        return busy_response()
+
+    def iter_images():
+        yield from uploads
+        if archive_data is not None:
+            yield from iter_zip_images(archive_data)
+
+    def stream():
+        try:
+            for item in face_service.recognize_faces_batch(iter_images(), profile):
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            release()
+
+    # 客户端在响应体开始前断开时生成器从未执行，finally 不会运行；响应结束后再释放一次（只生效一次）
+    return StreamingResponse(stream(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
+@app.get("/api/ready")
+async def ready():
+    """
+    就绪检查接口，返回模型加载状态、推理队列深度和特征缓存命中情况；模型未就绪或队列已满时返回503
+    """
+    if not face_service.ready.is_set():
+        return JSONResponse(
+            status_code=503,
+            content={
+                "ready": False,
+                "models": face_service.load_status,
+                "error": face_service.load_error
+            }
+        )
+    stats = inference_queue.stats()
+    is_ready = stats['depth'] < stats['max_depth']
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "ready": is_ready,
+            "queue": stats,
+            "models": face_service.load_status,
+            "load_seconds": face_service.load_seconds,
+            "process": {"pid": os.getpid(), "memory": process_memory()},
+            "embedding_cache": face_service.embedding_cache.stats() if face_service.embedding_cache else None,
+            "frame_dedup": face_service.frame_dedup.stats() if face_service.frame_dedup else None
+        }
+    )
+
+def _component_stat(owner: str, key: str):
+    """读取特征缓存 / 帧去重的统计值，未启用时不输出该指标"""
+    def read():
+        component = getattr(face_service, owner, None)
+        return component.stats()[key] if component is not None else None
+    return read
+
+# 抓取时读取的已有统计
+metrics.register_callback('face_models_ready', '模型是否加载完成', 'gauge',
+                          lambda: 1 if face_service.ready.is_set() else 0)
+metrics.register_callback('face_inference_queue_depth', '推理队列中排队 + 执行中的任务数', 'gauge',
+                          lambda: inference_queue.depth)
+metrics.register_callback('face_inference_queue_max_depth', '推理队列容量', 'gauge',
+                          lambda: inference_queue.max_depth)
+metrics.register_callback('face_inference_queue_rejected_total', '推理队列已满被拒绝的请求数', 'counter',
+                          lambda: inference_queue.stats()['rejected'])
+metrics.register_callback('face_embedding_cache_hits_total', '特征缓存命中数', 'counter',
+                          _component_stat('embedding_cache', 'hits'))
+metrics.register_callback('face_embedding_cache_misses_total', '特征缓存未命中数', 'counter',
+                          _component_stat('embedding_cache', 'misses'))
+metrics.register_callback('face_embedding_cache_entries', '特征缓存条目数', 'gauge',
+                          _component_stat('embedding_cache', 'entries'))
+metrics.register_callback('face_frame_dedup_suppressed_total', '近重复帧直接复用结果的次数', 'counter',
+                          _component_stat('frame_dedup', 'suppressed'))
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Prometheus 指标（文本格式）：各阶段耗时直方图、请求 / 检测 / 特征提取计数、队列深度和缓存命中
+    - 多进程模式下每个工作进程单独统计，每次抓取返回处理该请求的工作进程的指标
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
     import logging
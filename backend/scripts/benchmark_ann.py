@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.ann_index import IVFIndex
+# 与 python -m benchmarks 共用同一套合成特征库，两者测量的是同一种数据分布
+from benchmarks.fixtures import clustered_embeddings, noisy_queries
+
+
+def benchmark(size: int, dim: int, n_queries: int, noise: float, nprobes):
+    print(f"\n=== 特征库规模: {size}, 维度: {dim}, 查询数: {n_queries} ===")
+    gallery = clustered_embeddings(size, dim)
+    _, queries = noisy_queries(gallery, n_queries, noise)
+    n_queries = queries.shape[0]
+
+    # 1. 精确搜索（暴力矩阵-向量乘法）
+    start = time.perf_counter()
+    exact = np.array([np.argmax(gallery @ q) for q in queries])
+    exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+    print(f"精确搜索: {exact_ms:.3f} ms/查询")
+
+    # 2. 构建索引
+    start = time.perf_counter()
+    index = IVFIndex(dim, IVFIndex.default_nlist(size))
+    index.build(gallery)
+    print(f"IVF构建: {time.perf_counter() - start:.2f} s, {index.nlist} 个聚类")
+
+    # 3. 不同 nprobe 下的召回率和速度
+    print(f"{'nprobe':>8} {'recall@1':>10} {'ms/查询':>10} {'加速比':>8} {'候选行数':>10}")
+    for nprobe in nprobes:
+        hits, n_candidates = 0, 0
+        start = time.perf_counter()
+        for q, truth in zip(queries, exact):
+            rows = index.candidates(q, nprobe)
+            n_candidates += rows.size
+            if rows.size and rows[np.argmax(gallery[rows] @ q)] == truth:
+                hits += 1
+        ann_ms = (time.perf_counter() - start) * 1000 / n_queries
+        print(f"{nprobe:>8} {hits / n_queries:>10.4f} {ann_ms:>10.3f} {exact_ms / ann_ms:>8.1f} "
+              f"{n_candidates // n_queries:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IVF近似最近邻索引基准测试：对比精确搜索的 recall@1 和速度")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.05, help="查询特征相对注册特征的噪声")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        benchmark(size, args.dim, args.queries, args.noise, args.nprobe)
@@ -0,0 +1,92 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import FACENET_ONNX_PATH, FACENET_TORCHSCRIPT_PATH, FACENET_WEIGHTS_PATH
+from app.facenet_backends import (
+    FACENET_INPUT_SIZE, EagerFaceNetBackend, TorchScriptFaceNetBackend, OnnxFaceNetBackend
+)
+
+
+def make_inputs(n: int, image_dir: str = None, seed: int = 0) -> np.ndarray:
+    """真实人脸图片（与服务相同的预处理）或随机输入"""
+    if image_dir:
+        import cv2
+        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+        std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+        batch = []
+        for name in sorted(os.listdir(image_dir))[:n]:
+            image = cv2.imread(os.path.join(image_dir, name))
+            if image is None:
+                continue
+            face = cv2.resize(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), (FACENET_INPUT_SIZE, FACENET_INPUT_SIZE))
+            batch.append(((face.astype(np.float32) / 255.0 - mean) / std).transpose(2, 0, 1))
+        if batch:
+            return np.ascontiguousarray(np.stack(batch))
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, 3, FACENET_INPUT_SIZE, FACENET_INPUT_SIZE)).astype(np.float32)
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def latency_ms(backend, inputs: np.ndarray, batch_size: int, repeats: int) -> float:
+    """每张人脸的平均推理耗时"""
+    batch = inputs[:batch_size]
+    backend.embed(batch)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeats):
+        backend.embed(batch)
+    return (time.perf_counter() - start) * 1000 / (repeats * batch.shape[0])
+
+
+def run(n: int, image_dir: str, batch_sizes, repeats: int, threads: int, atol: float):
+    inputs = make_inputs(n, image_dir)
+    reference_backend = EagerFaceNetBackend(threads, weights_path=FACENET_WEIGHTS_PATH)
+    backends = {'eager': reference_backend}
+    for name, factory in (
+        ('torchscript', lambda: TorchScriptFaceNetBackend(FACENET_TORCHSCRIPT_PATH, threads)),
+        ('onnx', lambda: OnnxFaceNetBackend(FACENET_ONNX_PATH, threads)),
+    ):
+        try:
+            backends[name] = factory()
+        except FileNotFoundError as e:
+            print(f"跳过 {name}: {str(e)}")
+
+    # 1. 数值一致性（以 eager 输出为基准）
+    reference = reference_backend.embed(inputs)
+    print(f"\n=== 数值一致性 (输入 {inputs.shape[0]} 张, 基准: eager) ===")
+    print(f"{'后端':>12} {'最大绝对误差':>14} {'最小余弦相似度':>16} {'结果':>6}")
+    failed = False
+    for name, backend in backends.items():
+        output = backend.embed(inputs)
+        max_error = float(np.max(np.abs(output - reference)))
+        min_cosine = float(np.min(np.sum(normalize(output) * normalize(reference), axis=1)))
+        ok = max_error <= atol and min_cosine >= 1 - 1e-5
+        failed |= not ok
+        print(f"{name:>12} {max_error:>14.2e} {min_cosine:>16.8f} {'通过' if ok else '失败':>6}")
+
+    # 2. 每个后端的推理耗时
+    print(f"\n=== 推理耗时 (ms/张, 线程数: {threads}) ===")
+    print(f"{'后端':>12} " + " ".join(f"{'batch=' + str(b):>10}" for b in batch_sizes))
+    for name, backend in backends.items():
+        timings = [latency_ms(backend, inputs, b, repeats) for b in batch_sizes]
+        print(f"{name:>12} " + " ".join(f"{t:>10.2f}" for t in timings))
+
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FaceNet 推理后端的数值一致性检查和速度对比")
+    parser.add_argument("--n", type=int, default=16, help="参与比较的输入数量")
+    parser.add_argument("--image-dir", help="已裁剪的人脸图片目录（默认使用随机输入）")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 16])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    parser.add_argument("--atol", type=float, default=1e-3, help="允许的最大绝对误差")
+    args = parser.parse_args()
+    sys.exit(0 if run(args.n, args.image_dir, args.batch_sizes, args.repeats, args.threads, args.atol) else 1)
@@ -0,0 +1,129 @@
+import argparse
+import itertools
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import MODEL_DIR, DETECTION_SIZES, FACENET_ONNX_PATH, FACENET_WEIGHTS_PATH, INFERENCE_WORKERS
+from app.facenet_backends import FACENET_INPUT_SIZE, EagerFaceNetBackend
+from app.resources import ModelResources, GRAPH_OPTIMIZATION_LEVELS
+
+INSIGHTFACE_DIR = MODEL_DIR / "insightface" / "models" / "buffalo_l"
+
+
+def make_onnx_runner(paths_and_shapes, resources: ModelResources):
+    """按给定配置创建会话，返回依次运行各模型一次的函数（同一组会话被所有并发线程共享，与服务一致）"""
+    import onnxruntime
+    options = resources.session_options()
+    steps = []
+    for path, shape in paths_and_shapes:
+        session = onnxruntime.InferenceSession(str(path), sess_options=options, providers=['CPUExecutionProvider'])
+        feed = {session.get_inputs()[0].name: np.random.default_rng(0).normal(size=shape).astype(np.float32)}
+        steps.append((session, feed))
+
+    def run():
+        for session, feed in steps:
+            session.run(None, feed)
+    return run
+
+
+def make_torch_runner(threads: int):
+    backend = EagerFaceNetBackend(threads, weights_path=FACENET_WEIGHTS_PATH)
+    batch = np.random.default_rng(0).normal(size=(1, 3, FACENET_INPUT_SIZE, FACENET_INPUT_SIZE)).astype(np.float32)
+    return lambda: backend.embed(batch)
+
+
+def measure(run, concurrency: int, repeats: int):
+    """concurrency 个线程同时调用，返回 (p50 ms, p95 ms, 每秒次数)"""
+    run()  # 预热
+    latencies = [[] for _ in range(concurrency)]
+
+    def worker(index):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            latencies[index].append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    flat = np.concatenate([np.asarray(l) for l in latencies])
+    return float(np.percentile(flat, 50)), float(np.percentile(flat, 95)), flat.size / elapsed
+
+
+def targets(models):
+    """可测试的模型: 名称 -> (ONNX 模型及输入形状, 或 None 表示 torch)"""
+    found = {}
+    if 'insightface' in models:
+        det, rec = INSIGHTFACE_DIR / "det_10g.onnx", INSIGHTFACE_DIR / "w600k_r50.onnx"
+        if det.exists() and rec.exists():
+            size = max(DETECTION_SIZES)
+            found['insightface'] = [(det, (1, 3, size, size)), (rec, (1, 3, 112, 112))]
+        else:
+            print(f"跳过 insightface: 模型文件不存在 ({INSIGHTFACE_DIR})")
+    if 'facenet' in models:
+        if os.path.exists(FACENET_ONNX_PATH):
+            found['facenet'] = [(FACENET_ONNX_PATH, (1, 3, FACENET_INPUT_SIZE, FACENET_INPUT_SIZE))]
+        else:
+            # 没有导出的 ONNX 模型时只扫描 torch 线程数
+            found['facenet'] = None
+    return found
+
+
+def run(models, thread_counts, graph_levels, arenas, concurrencies, repeats):
+    print("注意: dlib 的线程数在库加载时由 OMP_NUM_THREADS 等环境变量确定，无法在同一进程内扫描，"
+          "请用不同的 DLIB_THREADS 重启服务对比")
+    for name, graph in targets(models).items():
+        if graph is None:
+            configs = [ModelResources(t) for t in thread_counts]
+        else:
+            configs = [ModelResources(t, graph_optimization=g, memory_arena=a)
+                       for t, g, a in itertools.product(thread_counts, graph_levels, arenas)]
+
+        print(f"\n=== {name} ({'torch eager' if graph is None else 'ONNX Runtime'}, 每次 {repeats} 轮) ===")
+        print(f"{'线程':>4} {'图优化':>8} {'内存池':>6} {'并发':>4} {'p50 ms':>9} {'p95 ms':>9} {'次/秒':>9}")
+        best = {}
+        for resources in configs:
+            runner = make_torch_runner(resources.threads) if graph is None else make_onnx_runner(graph, resources)
+            for concurrency in concurrencies:
+                p50, p95, throughput = measure(runner, concurrency, repeats)
+                print(f"{resources.threads:>4} {resources.graph_optimization:>8} "
+                      f"{'开' if resources.memory_arena else '关':>6} {concurrency:>4} "
+                      f"{p50:>9.2f} {p95:>9.2f} {throughput:>9.1f}")
+                if concurrency not in best or throughput > best[concurrency][1]:
+                    best[concurrency] = (resources, throughput)
+
+        prefix = name.upper()
+        for concurrency, (resources, throughput) in sorted(best.items()):
+            print(f"并发 {concurrency} 时吞吐最高: {resources.describe()} ({throughput:.1f} 次/秒)")
+            suggestion = f"  {prefix}_THREADS={resources.threads}"
+            if graph is not None:
+                suggestion += (f" {prefix}_GRAPH_OPTIMIZATION={resources.graph_optimization}"
+                               f" {prefix}_MEMORY_ARENA={str(resources.memory_arena).lower()}")
+            print(suggestion)
+
+
+def parse_bool(value: str) -> bool:
+    return value.lower() in ('true', '1', 'on')
+
+
+if __name__ == "__main__":
+    cpu_count = os.cpu_count() or 1
+    default_threads = sorted({t for t in (1, 2, 4, cpu_count // 2, cpu_count) if 1 <= t <= cpu_count})
+    parser = argparse.ArgumentParser(description="在本机上扫描各模型的推理线程数、图优化级别和内存池设置")
+    parser.add_argument("--models", nargs="+", default=['insightface', 'facenet'], choices=['insightface', 'facenet'])
+    parser.add_argument("--threads", type=int, nargs="+", default=default_threads, help="每个会话的推理线程数")
+    parser.add_argument("--graph-optimization", nargs="+", default=['basic', 'all'], choices=GRAPH_OPTIMIZATION_LEVELS)
+    parser.add_argument("--memory-arena", type=parse_bool, nargs="+", default=[True, False])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=sorted({1, INFERENCE_WORKERS}),
+                        help="同时调用同一模型的请求数（对应 INFERENCE_WORKERS）")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    run(args.models, args.threads, args.graph_optimization, args.memory_arena, args.concurrency, args.repeats)
@@ -0,0 +1,161 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import numpy as np
+from typing import List, Set, Tuple
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import DATA_DIR
+from app.database import Database
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+# 工作进程内的识别服务实例
+_service = None
+
+
+def load_manifest(path: str) -> List[Tuple[str, str, str]]:
+    """读取 CSV 清单（列: id,name,image，图片路径相对清单所在目录）"""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    tasks = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            image = row['image'].strip()
+            tasks.append((row['id'].strip(), row['name'].strip(), os.path.join(base_dir, image)))
+    return tasks
+
+
+def scan_directory(path: str) -> List[Tuple[str, str, str]]:
+    """扫描图片目录，文件名为 {id}_{name}.jpg 或 {id}.jpg（此时姓名与id相同）"""
+    tasks = []
+    for name in sorted(os.listdir(path)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            continue
+        user_id, _, user_name = stem.partition('_')
+        tasks.append((user_id, user_name or user_id, os.path.join(path, name)))
+    return tasks
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """读取检查点中已处理（成功或失败）的用户id，并截断中断时写了一半的记录"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'rb') as f:
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    if end < len(data):
+        os.truncate(path, end)
+    for line in data[:end].splitlines():
+        done.add(json.loads(line)['id'])
+    return done
+
+
+def _set_worker_environment(threads: int):
+    """限制每个工作进程的推理线程数
+
+    必须在创建进程池之前设置：spawn 的子进程启动时会重新执行本模块顶层的 app.* 导入，
+    app.config 在那时就按继承到的环境变量确定线程预算。
+    """
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    # 每个进程串行处理图片，由 app/resources.py 在该预算内给各模型分配线程
+    os.environ['INFERENCE_THREAD_BUDGET'] = str(threads)
+    os.environ['INFERENCE_WORKERS'] = '1'
+
+
+def _init_worker():
+    """工作进程初始化：只加载特征提取模型（特征库和数据库写入都在主进程中）"""
+    global _service
+    from app.face_service import face_service
+    face_service.load_extractors()
+    _service = face_service
+
+
+def _extract(task: Tuple[str, str, str]):
+    """解码、检测并提取特征，返回 (id, name, encodings 或 None, 失败原因/失败的算法)"""
+    user_id, name, path = task
+    try:
+        with open(path, 'rb') as f:
+            image_data = f.read()
+        encodings, failed_methods = _service.extract_face_encodings(image_data)
+        if encodings is None:
+            return user_id, name, None, "图像处理失败"
+        if not encodings:
+            return user_id, name, None, "所有算法都未能检测到人脸"
+        encodings = {method: np.asarray(encoding, dtype=np.float32) for method, encoding in encodings.items()}
+        return user_id, name, encodings, failed_methods
+    except Exception as e:
+        return user_id, name, None, str(e)
+
+
+def _commit(db: Database, results: list, checkpoint_file):
+    """一批结果写入数据库（一个事务 + 每个算法一次追加），然后记录检查点"""
+    succeeded = [(user_id, name, encodings) for user_id, name, encodings, _ in results if encodings]
+    if succeeded:
+        db.save_users_batch({'id': user_id, 'name': name} for user_id, name, _ in succeeded)
+        db.save_face_encodings_bulk({user_id: encodings for user_id, _, encodings in succeeded})
+
+    for user_id, _, encodings, detail in results:
+        record = {'id': user_id, 'status': 'ok' if encodings else 'failed'}
+        if encodings:
+            record['methods'] = sorted(encodings)
+        else:
+            record['message'] = detail
+        checkpoint_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+    checkpoint_file.flush()
+    os.fsync(checkpoint_file.fileno())
+    return len(succeeded)
+
+
+def enroll(tasks: List[Tuple[str, str, str]], checkpoint: str, workers: int, batch_size: int, threads: int):
+    done = load_checkpoint(checkpoint)
+    pending = [task for task in tasks if task[0] not in done]
+    print(f"共 {len(tasks)} 人, 已完成 {len(tasks) - len(pending)} 人, 待处理 {len(pending)} 人")
+    if not pending:
+        return
+
+    db = Database()
+    succeeded, failed = 0, 0
+    # spawn: 每个工作进程独立加载模型，不继承父进程的数据库连接
+    context = multiprocessing.get_context('spawn')
+    # 主进程只写数据库，不做推理，修改自身的环境变量没有影响
+    _set_worker_environment(threads)
+    with context.Pool(workers, initializer=_init_worker) as pool, \
+            open(checkpoint, 'a', encoding='utf-8') as checkpoint_file:
+        batch = []
+        for result in tqdm(pool.imap_unordered(_extract, pending, chunksize=4), total=len(pending)):
+            batch.append(result)
+            if len(batch) >= batch_size:
+                count = _commit(db, batch, checkpoint_file)
+                succeeded, failed = succeeded + count, failed + len(batch) - count
+                batch = []
+        if batch:
+            count = _commit(db, batch, checkpoint_file)
+            succeeded, failed = succeeded + count, failed + len(batch) - count
+
+    print(f"导入完成: 成功 {succeeded} 人, 失败 {failed} 人（失败原因见检查点文件 {checkpoint}）")
+    print("正在运行的服务会在下次识别时自动加载新导入的用户")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量人脸注册：多进程提取特征，批量写入数据库，支持中断后继续")
+    parser.add_argument("source", help="图片目录（文件名 {id}_{name}.jpg）或 CSV 清单（列: id,name,image）")
+    parser.add_argument("--checkpoint", help="检查点文件，默认 data/enroll_<来源名>.checkpoint.jsonl")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--threads-per-worker", type=int, default=2, help="每个工作进程的推理线程数")
+    parser.add_argument("--batch-size", type=int, default=256, help="每批写入数据库的人数")
+    args = parser.parse_args()
+
+    source = os.path.abspath(args.source)
+    tasks = scan_directory(source) if os.path.isdir(source) else load_manifest(source)
+    checkpoint = args.checkpoint or os.path.join(
+        DATA_DIR,
+        f"enroll_{os.path.splitext(os.path.basename(source.rstrip(os.sep)))[0]}.checkpoint.jsonl"
+    )
+    enroll(tasks, checkpoint, args.workers, args.batch_size, args.threads_per_worker)
@@ -0,0 +1,32 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import DATA_DIR, EMBEDDING_SEGMENT_ROWS
+from app.embedding_store import EmbeddingStore
+
+
+def compact(root: str, min_dead_ratio: float):
+    """压缩特征存储：去掉重复注册留下的旧行"""
+    store = EmbeddingStore(root, EMBEDDING_SEGMENT_ROWS)
+    compacted = False
+    for method in store.methods():
+        segments = store.segments(method)
+        ratio = segments.dead_ratio()
+        print(f"{method}: {len(segments)} 行, 有效 {segments.live_count()} 行, 无效比例 {ratio:.1%}")
+        if ratio > 0 and ratio >= min_dead_ratio:
+            segments.compact()
+            compacted = True
+    if compacted:
+        # 通知运行中的服务重新加载
+        store.bump_version()
+
+
+if __name__ == "__main__":
+    default_root = os.path.join(DATA_DIR, 'embeddings')
+    parser = argparse.ArgumentParser(description="压缩特征存储（建议在服务停止或低峰时运行，运行中的服务会在下次识别时重新加载）")
+    parser.add_argument("--root", default=default_root)
+    parser.add_argument("--min-dead-ratio", type=float, default=0.0, help="无效行比例达到该值才压缩")
+    args = parser.parse_args()
+    compact(args.root, args.min_dead_ratio)
@@ -0,0 +1,33 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import FACENET_ONNX_PATH, FACENET_TORCHSCRIPT_PATH, FACENET_WEIGHTS_PATH
+from app.facenet_backends import load_eager_facenet, export_onnx, export_torchscript
+
+
+def export(formats, onnx_path: str, torchscript_path: str):
+    """导出 FaceNet（InceptionResnetV1, VGGFace2）的 TorchScript 和 ONNX 模型"""
+    model = load_eager_facenet(FACENET_WEIGHTS_PATH)
+
+    if 'torchscript' in formats:
+        print("导出 TorchScript 模型...")
+        os.makedirs(os.path.dirname(torchscript_path), exist_ok=True)
+        export_torchscript(model, torchscript_path)
+
+    if 'onnx' in formats:
+        print("导出 ONNX 模型...")
+        os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+        export_onnx(model, onnx_path)
+
+    print("导出完成，可运行 scripts/benchmark_facenet_backends.py 检查数值一致性和速度")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出 FaceNet 的 TorchScript / ONNX 模型")
+    parser.add_argument("--formats", nargs="+", choices=["torchscript", "onnx"], default=["torchscript", "onnx"])
+    parser.add_argument("--onnx-path", default=FACENET_ONNX_PATH)
+    parser.add_argument("--torchscript-path", default=FACENET_TORCHSCRIPT_PATH)
+    args = parser.parse_args()
+    export(args.formats, args.onnx_path, args.torchscript_path)
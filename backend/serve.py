@@ -0,0 +1,25 @@
+import argparse
+import os
+
+# 生产环境多进程服务：主进程加载模型和特征库后 fork 工作进程（开发时使用 python main.py）
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多进程人脸识别服务（Linux，模型权重在工作进程间写时复制共享）")
+    parser.add_argument("--workers", type=int, help="工作进程数，默认读取 SERVER_WORKERS")
+    parser.add_argument("--host", help="监听地址，默认读取 SERVER_HOST")
+    parser.add_argument("--port", type=int, help="监听端口，默认读取 SERVER_PORT")
+    args = parser.parse_args()
+    # 必须在导入 app 之前设置：每个工作进程的推理线程预算按工作进程数划分
+    if args.workers:
+        os.environ["SERVER_WORKERS"] = str(args.workers)
+
+    from app.config import SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_MEMORY_REPORT_INTERVAL
+    from app.prefork import PreforkServer
+    from main import app
+
+    PreforkServer(
+        app,
+        host=args.host or SERVER_HOST,
+        port=args.port or SERVER_PORT,
+        workers=SERVER_WORKERS,
+        report_interval=SERVER_MEMORY_REPORT_INTERVAL
+    ).run()